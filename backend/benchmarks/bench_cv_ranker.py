@@ -0,0 +1,74 @@
+"""
+BM25 ranking benchmark: query latency and index size as the CV corpus grows.
+
+Indexes synthetic CVs drawn from a Zipf-distributed vocabulary and times
+top-K queries with job-description-sized inputs at several corpus sizes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_cv_ranker.py --sizes 5000 20000 50000 --queries 20
+"""
+import argparse
+import itertools
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.cv_ranker import CVRanker
+
+
+def make_vocabulary(size: int):
+    return [f"term{i}" for i in range(size)]
+
+
+def make_text(rng: random.Random, vocabulary, cum_weights, words: int) -> str:
+    return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+
+def index_bytes(ranker: CVRanker) -> int:
+    postings = sum(
+        docs.itemsize * len(docs) + tfs.itemsize * len(tfs)
+        for docs, tfs in zip(ranker._postings_docs, ranker._postings_tfs)
+    )
+    return postings + ranker._doc_lengths.itemsize * len(ranker._doc_lengths)
+
+
+def main(args):
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(args.vocabulary)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    queries = [make_text(rng, vocabulary, cum_weights, 150) for _ in range(args.queries)]
+
+    ranker = CVRanker()
+    indexed = 0
+    for size in sorted(args.sizes):
+        start = time.perf_counter()
+        while indexed < size:
+            ranker.add_document(f"doc{indexed}", make_text(rng, vocabulary, cum_weights, args.words))
+            indexed += 1
+        build = time.perf_counter() - start
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            ranker.search(query, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        print(
+            f"docs={size:7d}  terms={len(ranker._term_ids):7d}  "
+            f"postings={index_bytes(ranker) / 1e6:7.1f} MB  build+={build:6.1f} s  "
+            f"query p50={statistics.median(latencies):7.2f} ms  max={max(latencies):7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000], help="corpus sizes to measure")
+    parser.add_argument("--queries", type=int, default=20, help="queries per corpus size")
+    parser.add_argument("--words", type=int, default=400, help="words per synthetic CV")
+    parser.add_argument("--vocabulary", type=int, default=30000, help="distinct terms")
+    parser.add_argument("--top-k", type=int, default=10)
+    main(parser.parse_args())
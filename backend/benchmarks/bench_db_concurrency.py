@@ -0,0 +1,108 @@
+"""
+Event-loop stall benchmark: sync Session vs AsyncSession inside async handlers.
+
+Runs the same batch of concurrent "requests" twice against a seeded SQLite file,
+once with the blocking SQLModel Session and once with the async engine, while a
+heartbeat task measures how late the event loop wakes it up.
+
+Usage (from the backend directory):
+    python benchmarks/bench_db_concurrency.py --requests 50 --rows 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HEARTBEAT_INTERVAL = 0.005
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    """Record how late each wake-up is relative to the requested interval"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append((time.perf_counter() - start - HEARTBEAT_INTERVAL) * 1000)
+
+
+def seed(rows: int):
+    from sqlmodel import Session
+    from database.model import engine, init_db, CVFile
+
+    init_db()
+    filler = "experienced engineer building data pipelines " * 100
+    with Session(engine) as session:
+        for i in range(rows):
+            session.add(CVFile(filename=f"cv_{i}.pdf", file_content=f"{filler} candidate {i}"))
+        session.commit()
+
+
+async def run_sync_requests(count: int):
+    from sqlmodel import Session, select
+    from database.model import engine, CVFile
+
+    async def handler():
+        # What the routes used to do: a blocking round trip inside `async def`
+        with Session(engine) as session:
+            session.exec(select(CVFile.id).where(CVFile.file_content.contains("needle"))).all()
+
+    await asyncio.gather(*(handler() for _ in range(count)))
+
+
+async def run_async_requests(count: int):
+    from sqlmodel import select
+    from database.model import async_session_factory, CVFile
+
+    async def handler():
+        async with async_session_factory() as session:
+            (await session.exec(select(CVFile.id).where(CVFile.file_content.contains("needle")))).all()
+
+    await asyncio.gather(*(handler() for _ in range(count)))
+
+
+async def measure(name: str, scenario, count: int):
+    stop = asyncio.Event()
+    lags = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(HEARTBEAT_INTERVAL * 2)
+
+    start = time.perf_counter()
+    await scenario(count)
+    wall = (time.perf_counter() - start) * 1000
+
+    stop.set()
+    await beat
+    lags = lags or [0.0]
+    ordered = sorted(lags)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{name:<14} wall={wall:8.1f} ms  heartbeats={len(lags):5d}  "
+        f"lag p50={statistics.median(lags):7.2f} ms  p99={p99:7.2f} ms  max={max(lags):7.2f} ms"
+    )
+
+
+async def main(args):
+    from database.model import dispose_engines
+
+    await measure("sync Session", run_sync_requests, args.requests)
+    await measure("AsyncSession", run_async_requests, args.requests)
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="concurrent requests per scenario")
+    parser.add_argument("--rows", type=int, default=5000, help="CVFile rows to seed")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="cv_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ.setdefault("DB_POOL_SIZE", "10")
+
+    seed(args.rows)
+    asyncio.run(main(args))
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import zlib
+from typing import Any, Optional
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, zlib is always available
+    zstandard = None
+
+# Stored values start with MAGIC + one format byte. MAGIC is a UTF-8 lead byte
+# and the format bytes are ASCII, so no valid UTF-8 text starts with the header:
+# anything without it is a legacy uncompressed value.
+MAGIC = b"\xc7"
+FORMAT_RAW = b"r"
+FORMAT_ZLIB = b"z"
+FORMAT_ZSTD = b"s"
+
+# Values shorter than this are stored raw; compression would not pay off
+MIN_COMPRESS_BYTES = 256
+
+
+def _default_codec() -> bytes:
+    configured = os.getenv("BLOB_COMPRESSION", "zstd" if zstandard else "zlib").lower()
+    if configured == "zstd" and zstandard is None:
+        logger.warning("BLOB_COMPRESSION=zstd but zstandard is not installed, using zlib")
+        configured = "zlib"
+    return {"zstd": FORMAT_ZSTD, "zlib": FORMAT_ZLIB, "none": FORMAT_RAW}.get(configured, FORMAT_ZLIB)
+
+
+CODEC = _default_codec()
+
+
+def compress(data: bytes, codec: Optional[bytes] = None) -> bytes:
+    """Encode bytes with a format header, compressing when worthwhile"""
+    codec = codec or CODEC
+    if codec == FORMAT_RAW or len(data) < MIN_COMPRESS_BYTES:
+        return MAGIC + FORMAT_RAW + data
+    if codec == FORMAT_ZSTD:
+        return MAGIC + FORMAT_ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+    return MAGIC + FORMAT_ZLIB + zlib.compress(data, 6)
+
+
+def decompress(blob: bytes) -> bytes:
+    """Decode a value written by `compress`; untagged values are returned as-is"""
+    if not is_encoded(blob):
+        return blob
+    codec, payload = blob[1:2], blob[2:]
+    if codec == FORMAT_RAW:
+        return payload
+    if codec == FORMAT_ZLIB:
+        return zlib.decompress(payload)
+    if codec == FORMAT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Value is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown compression format: {codec!r}")
+
+
+def is_encoded(blob: bytes) -> bool:
+    return blob[:1] == MAGIC and blob[1:2] in (FORMAT_RAW, FORMAT_ZLIB, FORMAT_ZSTD)
+
+
+class _RawBinary(LargeBinary):
+    """LargeBinary that leaves fetched values untouched (legacy rows may be TEXT)"""
+
+    def result_processor(self, dialect, coltype):
+        return None
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as a tagged, compressed blob"""
+
+    impl = _RawBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return compress(value.encode("utf-8"))
+
+    def process_result_value(self, value: Any, dialect) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        return decompress(bytes(value)).decode("utf-8")
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON document stored as a tagged, compressed blob"""
+
+    impl = _RawBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+    def process_result_value(self, value: Any, dialect) -> Any:
+        if value is None:
+            return None
+        if isinstance(value, (dict, list)):
+            return value
+        if isinstance(value, str):
+            return json.loads(value)
+        return json.loads(decompress(bytes(value)))
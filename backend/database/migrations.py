@@ -0,0 +1,363 @@
+import argparse
+import logging
+from sqlalchemy import inspect, text, bindparam, Integer, LargeBinary
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel
+
+from database.compression import compress, decompress, is_encoded
+from database.search import clear_statements, create_search_index, index_params, insert_statements
+
+logger = logging.getLogger(__name__)
+
+# Columns stored through CompressedText / CompressedJSON
+BLOB_COLUMNS = [("cvfile", "file_content"), ("analysisresult", "analysis")]
+
+
+def upgrade_schema(engine: Engine):
+    """Bring tables created by older versions up to the current models"""
+    rekey_text_ids(engine)
+    convert_blob_columns(engine)
+    add_missing_columns(engine)
+    normalize_user_emails(engine)
+    create_missing_indexes(engine)
+    if create_search_index(engine):
+        rebuild_search_index(engine)
+
+
+def add_missing_columns(engine: Engine):
+    """Add nullable columns introduced after a table was first created"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                ))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+
+def normalize_user_emails(engine: Engine):
+    """
+    Lowercase emails stored before they were normalized on write (Clerk syncs)
+
+    Rows whose lowercased email would collide with another row are left
+    alone and reported; they need a manual merge.
+    """
+    if "user" not in inspect(engine).get_table_names():
+        return
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            'UPDATE "user" SET email = lower(trim(email)) '
+            'WHERE email <> lower(trim(email)) AND ('
+            'SELECT count(*) FROM "user" AS other WHERE lower(trim(other.email)) = lower(trim("user".email))'
+            ') = 1'
+        ))
+        if result.rowcount:
+            logger.info(f"Lowercased {result.rowcount} user emails")
+        conflicts = conn.execute(text(
+            'SELECT email FROM "user" WHERE email <> lower(trim(email))'
+        )).scalars().all()
+        for email in conflicts:
+            logger.warning(f"User email {email} differs only in case from another account; not normalized")
+
+
+def create_missing_indexes(engine: Engine):
+    """Create indexes declared on the models that an existing table lacks"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for index in table.indexes:
+                missing = [col.name for col in index.columns if col.name not in existing_columns]
+                if missing:
+                    logger.warning(f"Skipping index {index.name}: missing column(s) {', '.join(missing)}")
+                    continue
+                index.create(conn, checkfirst=True)
+
+
+def rekey_text_ids(engine: Engine):
+    """
+    Convert integer primary keys of CVFile/AnalysisResult to text ids
+
+    Rows are written through the write-behind buffer with ids allocated up
+    front (ULIDs), so the key columns must hold strings. Existing integer ids
+    are kept as their decimal text.
+    """
+    inspector = inspect(engine)
+    if "cvfile" not in inspector.get_table_names():
+        return
+
+    id_column = next(col for col in inspector.get_columns("cvfile") if col["name"] == "id")
+    if not isinstance(id_column["type"], Integer):
+        return
+
+    logger.info("Migrating cvfile/analysisresult ids from INTEGER to text")
+    if engine.dialect.name == "sqlite":
+        _rekey_sqlite(engine, inspector)
+    elif engine.dialect.name == "postgresql":
+        _rekey_postgres(engine)
+    else:
+        raise RuntimeError(f"Automatic id migration is not supported on {engine.dialect.name}")
+
+
+def _rekey_sqlite(engine: Engine, inspector):
+    # SQLite cannot change a column type in place: rebuild both tables
+    tables = ["analysisresult", "cvfile"]
+    old_columns = {name: [col["name"] for col in inspector.get_columns(name)] for name in tables}
+    old_indexes = {name: [ix["name"] for ix in inspector.get_indexes(name)] for name in tables}
+
+    with engine.begin() as conn:
+        for name in tables:
+            for index_name in old_indexes[name]:
+                conn.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+            conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{name}_old"'))
+
+        for name in reversed(tables):
+            table = SQLModel.metadata.tables[name]
+            table.create(conn)
+
+            shared = [col for col in old_columns[name] if col in table.columns]
+            select_list = ", ".join(
+                f'CAST("{col}" AS TEXT)' if col in ("id", "cv_id") else f'"{col}"'
+                for col in shared
+            )
+            column_list = ", ".join(f'"{col}"' for col in shared)
+            conn.execute(text(
+                f'INSERT INTO "{name}" ({column_list}) SELECT {select_list} FROM "{name}_old"'
+            ))
+
+        for name in tables:
+            conn.execute(text(f'DROP TABLE "{name}_old"'))
+
+
+def _rekey_postgres(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE analysisresult DROP CONSTRAINT IF EXISTS analysisresult_cv_id_fkey'))
+        conn.execute(text(
+            'ALTER TABLE analysisresult '
+            'ALTER COLUMN id DROP DEFAULT, '
+            'ALTER COLUMN id TYPE VARCHAR USING id::text, '
+            'ALTER COLUMN cv_id TYPE VARCHAR USING cv_id::text'
+        ))
+        conn.execute(text(
+            'ALTER TABLE cvfile '
+            'ALTER COLUMN id DROP DEFAULT, '
+            'ALTER COLUMN id TYPE VARCHAR USING id::text'
+        ))
+        conn.execute(text(
+            'ALTER TABLE analysisresult ADD CONSTRAINT analysisresult_cv_id_fkey '
+            'FOREIGN KEY (cv_id) REFERENCES cvfile (id)'
+        ))
+        conn.execute(text('DROP SEQUENCE IF EXISTS analysisresult_id_seq'))
+        conn.execute(text('DROP SEQUENCE IF EXISTS cvfile_id_seq'))
+
+
+def convert_blob_columns(engine: Engine):
+    """
+    Change legacy text/JSON blob columns to bytea on Postgres
+
+    Existing values keep their UTF-8 bytes without a format header and are
+    still readable; run `compress-blobs` to compress them. SQLite columns are
+    dynamically typed and need no change.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column in BLOB_COLUMNS:
+            if table not in inspector.get_table_names():
+                continue
+            current = next(col for col in inspector.get_columns(table) if col["name"] == column)
+            if isinstance(current["type"], LargeBinary):
+                continue
+            conn.execute(text(
+                f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE BYTEA '
+                f'USING convert_to("{column}"::text, \'UTF8\')'
+            ))
+            logger.info(f"Converted {table}.{column} to BYTEA")
+
+
+def compress_existing_rows(engine: Engine, batch_size: int = 500):
+    """One-off rewrite of uncompressed blob values, in keyset-ordered batches"""
+    for table, column in BLOB_COLUMNS:
+        rewritten = bytes_before = bytes_after = 0
+        last_id = ""
+        update = text(
+            f'UPDATE "{table}" SET "{column}" = :value WHERE id = :id'
+        ).bindparams(bindparam("value", type_=LargeBinary))
+
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    f'SELECT id, "{column}" FROM "{table}" '
+                    f'WHERE id > :last_id AND "{column}" IS NOT NULL ORDER BY id LIMIT :limit'
+                ), {"last_id": last_id, "limit": batch_size}).all()
+                if not rows:
+                    break
+
+                for row_id, value in rows:
+                    raw = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+                    if is_encoded(raw):
+                        continue
+                    encoded = compress(raw)
+                    conn.execute(update, {"value": encoded, "id": row_id})
+                    rewritten += 1
+                    bytes_before += len(raw)
+                    bytes_after += len(encoded)
+                last_id = rows[-1][0]
+
+        logger.info(
+            f"Compressed {rewritten} values in {table}.{column}: "
+            f"{bytes_before} -> {bytes_after} bytes"
+        )
+
+
+def externalize_content(engine: Engine, batch_size: int = 500):
+    """
+    Move CV text and job descriptions of legacy rows into the content tables
+
+    Each cvfile.file_content / analysisresult.job_description is hashed,
+    upserted into cvcontent / jobdescription with its reference counted, and
+    cleared on the row; analysisresult.cv_hash is filled from its CV.
+    """
+    from database.model import CVContent, JobDescription, content_hash, dialect_insert
+
+    def upsert(conn, table, rows):
+        statement = dialect_insert(conn, table).values(rows)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=["hash"],
+            set_={"ref_count": table.ref_count + statement.excluded.ref_count},
+        ))
+
+    jobs = [
+        ("cvfile", "file_content", "content_hash", CVContent,
+         lambda key, value: {"hash": key, "content": value, "char_count": len(value)}),
+        ("analysisresult", "job_description", "jd_hash", JobDescription,
+         lambda key, value: {"hash": key, "text": value}),
+    ]
+    for table, column, hash_column, content_table, to_row in jobs:
+        moved = 0
+        last_id = ""
+        select_rows = text(
+            f'SELECT id, "{column}" FROM "{table}" '
+            f'WHERE id > :last_id AND "{column}" IS NOT NULL ORDER BY id LIMIT :limit'
+        )
+        clear = text(f'UPDATE "{table}" SET "{hash_column}" = :hash, "{column}" = NULL WHERE id = :id')
+
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(select_rows, {"last_id": last_id, "limit": batch_size}).all()
+                if not rows:
+                    break
+
+                contents, updates = {}, []
+                for row_id, value in rows:
+                    if isinstance(value, (bytes, memoryview)):
+                        value = decompress(bytes(value)).decode("utf-8")
+                    key = content_hash(value)
+                    contents.setdefault(key, {**to_row(key, value), "ref_count": 0})["ref_count"] += 1
+                    updates.append({"hash": key, "id": row_id})
+
+                upsert(conn, content_table, list(contents.values()))
+                conn.execute(clear, updates)
+                moved += len(rows)
+                last_id = rows[-1][0]
+
+        logger.info(f"Moved {moved} values from {table}.{column} into {content_table.__tablename__}")
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            'UPDATE analysisresult SET cv_hash = '
+            '(SELECT content_hash FROM cvfile WHERE cvfile.id = analysisresult.cv_id) '
+            'WHERE cv_hash IS NULL AND cv_id IS NOT NULL'
+        ))
+
+
+def rebuild_search_index(engine: Engine, batch_size: int = 500):
+    """(Re)index every analysis owned by a user, in keyset-ordered batches"""
+    from sqlmodel import Session, select
+    from database.model import AnalysisResult, CVContent, CVFile, JobDescription
+
+    dialect = engine.dialect.name
+    indexed = 0
+    last_id = ""
+    with engine.begin() as conn:
+        for statement in clear_statements(dialect):
+            conn.execute(statement)
+
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(
+                    AnalysisResult.id,
+                    AnalysisResult.user_id,
+                    AnalysisResult.analysis,
+                    AnalysisResult.job_description,
+                    JobDescription.text,
+                    CVFile.filename,
+                    CVFile.file_content,
+                    CVContent.content,
+                )
+                .select_from(AnalysisResult)
+                .outerjoin(JobDescription, JobDescription.hash == AnalysisResult.jd_hash)
+                .outerjoin(CVFile, CVFile.id == AnalysisResult.cv_id)
+                .outerjoin(CVContent, CVContent.hash == CVFile.content_hash)
+                .where(AnalysisResult.id > last_id, AnalysisResult.user_id.is_not(None))
+                .order_by(AnalysisResult.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            params = [
+                index_params(
+                    dialect,
+                    analysis_id=row[0],
+                    user_id=row[1],
+                    filename=row[5],
+                    job_description=row[3] or row[4],
+                    summary=(row[2] or {}).get("summary"),
+                    cv_text=row[6] or row[7],
+                )
+                for row in rows
+            ]
+            for statement in insert_statements(dialect):
+                session.execute(statement, params)
+            session.commit()
+            indexed += len(rows)
+            last_id = rows[-1][0]
+
+    logger.info(f"Indexed {indexed} analyses for full-text search")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="One-off database migrations")
+    parser.add_argument("command", choices=["compress-blobs", "dedup-content", "rebuild-search"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--vacuum", action="store_true", help="reclaim freed space afterwards (SQLite)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database.model import engine, init_db
+
+    init_db()
+    if args.command == "compress-blobs":
+        compress_existing_rows(engine, args.batch_size)
+    elif args.command == "dedup-content":
+        externalize_content(engine, args.batch_size)
+    elif args.command == "rebuild-search":
+        rebuild_search_index(engine, args.batch_size)
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
@@ -1,11 +1,96 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from datetime import datetime
 from sqlmodel import SQLModel, Field, create_engine, Session
-from sqlalchemy import Column, JSON as SA_JSON
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Column, Index
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import deferred
+from database.compression import CompressedText, CompressedJSON
+import hashlib
+import logging
 import os
+import re
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cv_checker.db")
-engine = create_engine(DATABASE_URL, echo=False)
+
+# Connection pool configuration (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Async drivers used for each sync dialect
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def _to_async_url(url: str) -> str:
+    """Map a sync DATABASE_URL to its async driver (aiosqlite/asyncpg)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _pool_options(url: str) -> Dict[str, Any]:
+    """Pool sizing for the engine; in-memory SQLite uses a single static connection"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, echo=False, **_pool_options(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **_pool_options(ASYNC_DATABASE_URL))
+async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+_CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def new_id() -> str:
+    """Allocate a time-ordered ULID (48-bit ms timestamp + 80 random bits)"""
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), "big")
+    chars = []
+    for _ in range(26):
+        value, remainder = divmod(value, 32)
+        chars.append(_CROCKFORD_BASE32[remainder])
+    return "".join(reversed(chars))
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_content(text: str) -> str:
+    """Canonical form used for content addressing: NFKC, collapsed whitespace"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form of User.email: stored and looked up lowercased"""
+    return email.strip().lower()
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the normalized text, the key of CVContent/JobDescription rows"""
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
 
 
 class User(SQLModel, table=True):
@@ -21,30 +106,182 @@ class User(SQLModel, table=True):
     updated_at: Optional[datetime] = None
 
 
+_cv_file_content = Column("file_content", CompressedText)
+_cv_content_text = Column("content", CompressedText)
+_analysis_document = Column("analysis", CompressedJSON)
+_section_findings = Column("findings", CompressedJSON)
+_webhook_payload = Column("payload", CompressedJSON)
+
+
+class CVContent(SQLModel, table=True):
+    """Extracted CV text stored once per distinct (normalized) content"""
+    __mapper_args__ = {"properties": {"content": deferred(_cv_content_text)}}
+
+    hash: str = Field(primary_key=True)
+    content: Optional[str] = Field(default=None, sa_column=_cv_content_text)
+    char_count: int = 0
+    ref_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class JobDescription(SQLModel, table=True):
+    """Job description text stored once per distinct (normalized) content"""
+    hash: str = Field(primary_key=True)
+    text: str
+    ref_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class CVFile(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        Index("ix_cvfile_user_uploaded_id", "user_id", "uploaded_at", "id"),
+    )
+    # Large text is compressed on write and only loaded when accessed
+    __mapper_args__ = {"properties": {"file_content": deferred(_cv_file_content)}}
+
+    id: str = Field(default_factory=new_id, primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     filename: str
     file_size: Optional[int] = None
     file_type: Optional[str] = None
-    file_content: Optional[str]
+    file_content: Optional[str] = Field(default=None, sa_column=_cv_file_content)  # legacy rows only
+    content_hash: Optional[str] = Field(default=None, foreign_key="cvcontent.hash", index=True)
+    file_hash: Optional[str] = Field(default=None, index=True)  # SHA-256 of the uploaded bytes
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class AnalysisResult(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        # Keyset pagination of a user's history: WHERE user_id = ? AND (created_at, id) < (?, ?)
+        Index("ix_analysisresult_user_created_id", "user_id", "created_at", "id", "overall_score"),
+        # Prior result lookup for identical CV/JD content
+        Index("ix_analysisresult_content_hashes", "cv_hash", "jd_hash", "created_at"),
+    )
+    __mapper_args__ = {"properties": {"analysis": deferred(_analysis_document)}}
+
+    id: str = Field(default_factory=new_id, primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
-    cv_id: Optional[int] = Field(default=None, foreign_key="cvfile.id")
-    job_description: Optional[str] = None
-    analysis: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(SA_JSON))
+    cv_id: Optional[str] = Field(default=None, foreign_key="cvfile.id")
+    job_description: Optional[str] = None  # legacy rows only
+    cv_hash: Optional[str] = Field(default=None, foreign_key="cvcontent.hash")
+    jd_hash: Optional[str] = Field(default=None, foreign_key="jobdescription.hash")
+    analysis: Optional[Dict[str, Any]] = Field(default=None, sa_column=_analysis_document)
     overall_score: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Usage accounting (tokens, cost and per-stage latency in milliseconds)
+    model: Optional[str] = Field(default=None, index=True)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
+    prompt_chars: Optional[int] = None
+    cache_hit: Optional[bool] = False
+    fallback: Optional[bool] = None  # local heuristics stood in for a failed or missing model
+    extraction_ms: Optional[float] = None
+    prompt_build_ms: Optional[float] = None
+    llm_ms: Optional[float] = None
+    parse_ms: Optional[float] = None
+    normalize_ms: Optional[float] = None
+    db_write_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+
+
+class RerankUsage(SQLModel, table=True):
+    """Usage accounting of one model re-ranking of /rank-cvs candidates"""
+    __table_args__ = (
+        Index("ix_rerankusage_user_created", "user_id", "created_at"),
+    )
+
+    id: str = Field(default_factory=new_id, primary_key=True)
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    candidates: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    model: Optional[str] = Field(default=None, index=True)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
+    prompt_chars: Optional[int] = None
+    llm_ms: Optional[float] = None
+    parse_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+
+
+class SectionFinding(SQLModel, table=True):
+    """Analysis findings for one CV section against one job description, per user"""
+    section_hash: str = Field(primary_key=True)
+    jd_hash: str = Field(primary_key=True)
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    findings: Dict[str, Any] = Field(sa_column=_section_findings)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class WebhookEvent(SQLModel, table=True):
+    """Raw Clerk webhook delivery, acknowledged on receipt and applied in the background"""
+    __table_args__ = (
+        Index("ix_webhookevent_pending", "processed_at", "event_timestamp"),
+        Index("ix_webhookevent_user", "clerk_user_id", "event_timestamp"),
+    )
+
+    delivery_id: str = Field(primary_key=True)  # svix-id; identical across retries
+    event_type: str
+    clerk_user_id: Optional[str] = None
+    event_timestamp: int = 0  # milliseconds; orders events of the same user
+    payload: Dict[str, Any] = Field(sa_column=_webhook_payload)
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+    processed_at: Optional[datetime] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+class ConsumerLease(SQLModel, table=True):
+    """Time-limited ownership of a background consumer shared by all workers"""
+    name: str = Field(primary_key=True)
+    owner: str
+    expires_at: datetime
+
+
+class UserStats(SQLModel, table=True):
+    """Per-user counters maintained in the same transaction that writes analyses"""
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    cv_count: int = 0
+    analysis_count: int = 0
+    score_count: int = 0  # analyses that produced an overall score
+    score_sum: int = 0
+    last_score: Optional[int] = None
+    previous_score: Optional[int] = None
+    last_analysis_at: Optional[datetime] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+def dialect_insert(bind, table):
+    """INSERT construct supporting ON CONFLICT for the bound dialect (SQLite/Postgres)"""
+    if bind.dialect.name == "postgresql":
+        return postgresql_insert(table)
+    if bind.dialect.name == "sqlite":
+        return sqlite_insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {bind.dialect.name}")
+
 
 def init_db():
     """Create database tables"""
+    from database.migrations import upgrade_schema
+
     SQLModel.metadata.create_all(engine)
+    upgrade_schema(engine)
 
 
 def get_session():
     return Session(engine)
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency yielding an AsyncSession that does not block the event loop"""
+    async with async_session_factory() as session:
+        yield session
+
+
+async def dispose_engines():
+    """Close pooled connections on application shutdown"""
+    await async_engine.dispose()
+    engine.dispose()
@@ -0,0 +1,253 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger(__name__)
+
+# SQLite: contentless FTS5 virtual table. Postgres: plain table with a weighted tsvector.
+# Neither stores the indexed text: hits are joined back to their analysis, and
+# excerpts are cut from the content-addressed CV and job description texts.
+SEARCH_TABLE = "analysis_fts"
+
+# SQLite only: maps FTS5 rowids to analysis ids (a contentless table cannot return them).
+# AUTOINCREMENT keeps a new analysis from taking over a removed one's postings.
+SEARCH_IDS_TABLE = "analysis_fts_ids"
+
+# Longest CV text indexed per analysis (Postgres caps a tsvector at 1MB)
+MAX_CV_CHARS = 100_000
+
+# Words around the first match in a search excerpt
+SNIPPET_WORDS = 16
+
+# contentless_delete=1 needs SQLite 3.43; without it a deleted analysis is
+# unlinked from the id map and its postings stay until the next rebuild
+_SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+        filename, job_description, summary, cv_text, owner,
+        content = '',
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TABLE {SEARCH_IDS_TABLE} (
+        rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+        analysis_id VARCHAR NOT NULL UNIQUE
+    )
+    """,
+]
+
+_POSTGRES_SCHEMA = [
+    f"""
+    CREATE TABLE {SEARCH_TABLE} (
+        analysis_id VARCHAR PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        document TSVECTOR NOT NULL
+    )
+    """,
+    f"CREATE INDEX ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)",
+    f"CREATE INDEX ix_{SEARCH_TABLE}_user_id ON {SEARCH_TABLE} (user_id)",
+]
+
+# Statements run in order with the same parameter list
+_INSERT = {
+    "sqlite": [
+        text(f"INSERT OR IGNORE INTO {SEARCH_IDS_TABLE} (analysis_id) VALUES (:analysis_id)"),
+        text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, filename, job_description, summary, cv_text, owner) "
+            f"SELECT ids.rowid, :filename, :job_description, :summary, :cv_text, :owner "
+            f"FROM {SEARCH_IDS_TABLE} AS ids WHERE ids.analysis_id = :analysis_id "
+            f"AND NOT EXISTS (SELECT 1 FROM {SEARCH_TABLE} WHERE rowid = ids.rowid)"
+        ),
+    ],
+    "postgresql": [
+        text(
+            f"INSERT INTO {SEARCH_TABLE} (analysis_id, user_id, document) "
+            "VALUES (:analysis_id, :user_id, "
+            "setweight(to_tsvector('english', coalesce(:job_description, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(:filename, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(:summary, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(:cv_text, '')), 'C')) "
+            "ON CONFLICT (analysis_id) DO NOTHING"
+        ),
+    ],
+}
+
+_DELETE = {
+    "sqlite": text(f"DELETE FROM {SEARCH_IDS_TABLE} WHERE analysis_id = :analysis_id"),
+    "postgresql": text(f"DELETE FROM {SEARCH_TABLE} WHERE analysis_id = :analysis_id"),
+}
+
+_CLEAR = {
+    "sqlite": [
+        text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('delete-all')"),
+        text(f"DELETE FROM {SEARCH_IDS_TABLE}"),
+    ],
+    "postgresql": [text(f"DELETE FROM {SEARCH_TABLE}")],
+}
+
+# Columns of a hit besides the rank, joined from the analysis and its CV row
+_HIT_COLUMNS = (
+    "r.created_at, r.overall_score, f.filename, r.jd_hash, "
+    "r.job_description AS legacy_job_description, f.content_hash AS cv_hash"
+)
+
+# bm25() weights follow the column order of the FTS5 table; owner only scopes
+_SEARCH = {
+    "sqlite": text(
+        f"SELECT ids.analysis_id, {_HIT_COLUMNS}, "
+        f"bm25({SEARCH_TABLE}, 2.0, 4.0, 2.0, 1.0, 0.0) AS rank "
+        f"FROM {SEARCH_TABLE} "
+        f"JOIN {SEARCH_IDS_TABLE} AS ids ON ids.rowid = {SEARCH_TABLE}.rowid "
+        "JOIN analysisresult AS r ON r.id = ids.analysis_id "
+        "LEFT JOIN cvfile AS f ON f.id = r.cv_id "
+        f"WHERE {SEARCH_TABLE} MATCH :match "
+        "ORDER BY rank LIMIT :limit OFFSET :offset"
+    ),
+    "postgresql": text(
+        f"SELECT s.analysis_id, {_HIT_COLUMNS}, "
+        "-ts_rank_cd(s.document, query) AS rank "
+        "FROM websearch_to_tsquery('english', :query) AS query, "
+        f"{SEARCH_TABLE} AS s "
+        "JOIN analysisresult AS r ON r.id = s.analysis_id "
+        "LEFT JOIN cvfile AS f ON f.id = r.cv_id "
+        "WHERE s.user_id = :user_id AND s.document @@ query "
+        "ORDER BY rank LIMIT :limit OFFSET :offset"
+    ),
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def search_dialect(bind) -> str:
+    name = bind.dialect.name
+    if name not in _INSERT:
+        raise NotImplementedError(f"Full-text search is not supported on {name}")
+    return name
+
+
+def create_search_index(engine: Engine) -> bool:
+    """
+    Create the search table if missing; True when it was just created
+
+    A table from an older version that stored the indexed text is dropped
+    and created again, so the caller rebuilds it.
+    """
+    dialect = engine.dialect.name
+    if dialect not in _INSERT:
+        logger.warning(f"Full-text search is not supported on {dialect}, index not created")
+        return False
+    inspector = inspect(engine)
+    if SEARCH_TABLE in inspector.get_table_names():
+        if _stores_text(engine, inspector):
+            logger.info(f"Dropping full-text search index {SEARCH_TABLE} that stores copies of the text")
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE {SEARCH_TABLE}"))
+                conn.execute(text(f"DROP TABLE IF EXISTS {SEARCH_IDS_TABLE}"))
+        else:
+            return False
+
+    with engine.begin() as conn:
+        for statement in _SQLITE_SCHEMA if dialect == "sqlite" else _POSTGRES_SCHEMA:
+            conn.execute(text(statement))
+    logger.info(f"Created full-text search index {SEARCH_TABLE} ({dialect})")
+    return True
+
+
+def _stores_text(engine: Engine, inspector) -> bool:
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            schema = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE name = :name"), {"name": SEARCH_TABLE}
+            ).scalar()
+        return "content = ''" not in (schema or "") or SEARCH_IDS_TABLE not in inspector.get_table_names()
+    return "job_description" in {column["name"] for column in inspector.get_columns(SEARCH_TABLE)}
+
+
+def index_params(
+    dialect: str,
+    analysis_id: str,
+    user_id: int,
+    filename: Optional[str],
+    job_description: Optional[str],
+    summary: Optional[str],
+    cv_text: Optional[str]
+) -> Dict[str, Any]:
+    """Bind parameters of one index row"""
+    return {
+        "analysis_id": analysis_id,
+        "user_id": user_id,
+        "owner": owner_token(user_id),
+        "filename": filename,
+        "job_description": job_description,
+        "summary": summary,
+        "cv_text": cv_text[:MAX_CV_CHARS] if cv_text else cv_text,
+    }
+
+
+def insert_statements(dialect: str) -> List[TextClause]:
+    return _INSERT[dialect]
+
+
+def delete_statement(dialect: str):
+    return _DELETE[dialect]
+
+
+def clear_statements(dialect: str) -> List[TextClause]:
+    return _CLEAR[dialect]
+
+
+def search_statement(dialect: str):
+    return _SEARCH[dialect]
+
+
+def owner_token(user_id: int) -> str:
+    # Indexed token scoping FTS5 matches to one user without a post-filter
+    return f"u{user_id}"
+
+
+def fts5_match(user_id: int, query: str) -> Optional[str]:
+    """
+    Safe FTS5 MATCH expression for free text, scoped to a user
+
+    Words are quoted (so operators and punctuation in the input are inert),
+    combined with AND, and the last word matches as a prefix.
+    """
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return f"owner:{owner_token(user_id)} AND ({' '.join(terms)})"
+
+
+def snippet(text_value: Optional[str], query: str, words: int = SNIPPET_WORDS) -> Optional[str]:
+    """
+    Excerpt around the first word matching the query, matches in [brackets]
+
+    A word matches when it starts with a query word, which approximates the
+    index's stemming ("engineer" finds "engineering"). None without a match.
+    """
+    if not text_value:
+        return None
+    terms = [token.lower() for token in _TOKEN.findall(query)]
+    parts = text_value.split()
+
+    def matches(word: str) -> bool:
+        token = _TOKEN.search(word)
+        return bool(token) and any(token.group().lower().startswith(term) for term in terms)
+
+    first = next((index for index, word in enumerate(parts) if matches(word)), None)
+    if first is None:
+        return None
+    start = max(0, first - words // 4)
+    window = parts[start:start + words]
+    excerpt = " ".join(
+        _TOKEN.sub(lambda match: f"[{match.group()}]", word, count=1) if matches(word) else word
+        for word in window
+    )
+    return ("…" if start > 0 else "") + excerpt + ("…" if start + words < len(parts) else "")
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -5,15 +6,17 @@ from fastapi.responses import JSONResponse
 import uvicorn
 
 from dotenv import load_dotenv
-from database.model import init_db
+from database.model import init_db, dispose_engines, async_session_factory
 import os
 import signal
 
 # Import routers
-from routes.cv_analysis import router as cv_router
-from routes.auth import router as auth_router
-from routes.webhooks import router as webhook_router
-from routes.users import router as users_router
+from routes.cv_analysis import router as cv_router, write_buffer, cv_ranker, embedding_index, bulk_analyzer, chunked_uploads
+from routes.auth import router as auth_router, auth_service
+from routes.webhooks import router as webhook_router, webhook_inbox
+from routes.users import router as users_router, clerk_jwt_verifier, clerk_service, clerk_http
+from routes.usage import router as usage_router
+from routes.ranking import router as ranking_router
 
 # Load environment variables
 load_dotenv()
@@ -21,13 +24,40 @@ load_dotenv()
 # Initialize database (create tables)
 init_db()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with async_session_factory() as session:
+        await auth_service.ensure_test_user(session)
+    await auth_service.revocations.start()
+    await write_buffer.start()
+    await webhook_inbox.start()
+    cv_ranker.start_loading()
+    embedding_index.start_loading()
+    await chunked_uploads.start()
+    await clerk_http.start()
+    clerk_jwt_verifier.start()
+    yield
+    # Flush queued analyses before releasing pooled database connections
+    await cv_ranker.stop()
+    await embedding_index.stop()
+    await chunked_uploads.stop()
+    await clerk_jwt_verifier.stop()
+    await clerk_http.stop()
+    await webhook_inbox.stop()
+    await write_buffer.stop()
+    auth_service.password_hasher.shutdown()
+    auth_service.revocations.close()
+    bulk_analyzer.shutdown()
+    await dispose_engines()
+
 # Create FastAPI app
 app = FastAPI(
     title="AI CV Checker API",
     description="Backend API for AI-powered CV analysis and optimization",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -44,6 +74,8 @@ app.include_router(cv_router, prefix="/api", tags=["CV Analysis"])
 app.include_router(auth_router, prefix="/api", tags=["Authentication"])
 app.include_router(webhook_router, prefix="/webhooks", tags=["Webhooks"])
 app.include_router(users_router, prefix="/api/users", tags=["Users"])
+app.include_router(usage_router, prefix="/api", tags=["Usage"])
+app.include_router(ranking_router, prefix="/api", tags=["Ranking"])
 
 # Health check endpoint
 @app.get("/")
@@ -53,7 +85,18 @@ async def root():
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy and working", "message": "API is running"}
+    return {
+        "status": "healthy and working",
+        "message": "API is running",
+        "write_behind": write_buffer.stats(),
+        "auth_cache": {
+            "tokens": clerk_jwt_verifier.token_cache.stats(),
+            "users": clerk_service.user_cache.stats()
+        },
+        "password_hashing": auth_service.password_hasher.stats(),
+        "auth_user_cache": auth_service.user_cache.stats(),
+        "clerk_http": clerk_http.stats()
+    }
 
 # Error handlers
 @app.exception_handler(HTTPException)
@@ -32,18 +32,56 @@ class CVAnalysisResponse(BaseModel):
 class AnalysisHistoryItem(BaseModel):
     """Model for analysis history items"""
     id: str = Field(..., description="Analysis ID")
+    cv_id: Optional[str] = Field(None, description="ID of the analyzed CV")
     timestamp: datetime = Field(..., description="When the analysis was performed")
-    filename: str = Field(..., description="Original CV filename")
-    overall_score: int = Field(..., description="Overall score from the analysis")
-    job_description: Optional[str] = Field(None, description="Job description used for analysis")
+    filename: Optional[str] = Field(None, description="Original CV filename")
+    overall_score: Optional[int] = Field(None, description="Overall score from the analysis")
+    job_description: Optional[str] = Field(None, description="Start of the job description used for analysis")
 
 class AnalysisHistoryResponse(BaseModel):
     """Response model for analysis history"""
     user_id: str = Field(..., description="User ID")
     analyses: List[AnalysisHistoryItem] = Field(..., description="List of analyses")
-    total: int = Field(..., description="Total number of analyses")
+    total: Optional[int] = Field(None, description="Total number of analyses")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, absent on the last page")
+    has_more: bool = Field(False, description="Whether more analyses follow this page")
+
+class AnalysisSearchHit(BaseModel):
+    """Model for one full-text search match"""
+    id: str = Field(..., description="Analysis ID")
+    timestamp: datetime = Field(..., description="When the analysis was performed")
+    filename: Optional[str] = Field(None, description="Original CV filename")
+    overall_score: Optional[int] = Field(None, description="Overall score from the analysis")
+    job_description: Optional[str] = Field(None, description="Job description excerpt, matches in [brackets]")
+    cv_snippet: Optional[str] = Field(None, description="CV text excerpt, matches in [brackets]")
+    rank: float = Field(..., description="Relevance, lower is better")
+
+class AnalysisSearchResponse(BaseModel):
+    """Response model for searching a user's analyses"""
+    user_id: str = Field(..., description="User ID")
+    query: str = Field(..., description="Search query")
+    results: List[AnalysisSearchHit] = Field(..., description="Matches, best first")
+    next_offset: Optional[int] = Field(None, description="Offset of the next page, absent on the last page")
+    has_more: bool = Field(False, description="Whether more matches follow this page")
 
 class DeleteAnalysisResponse(BaseModel):
     """Response model for deleting analysis"""
     message: str = Field(..., description="Success message")
     analysis_id: str = Field(..., description="ID of deleted analysis")
+
+class ChunkedUploadRequest(BaseModel):
+    """Request model for starting a resumable upload"""
+    filename: str = Field(..., description="Name of the CV file")
+    size: int = Field(..., gt=0, description="Total file size in bytes")
+    content_type: Optional[str] = Field(None, description="MIME type of the file")
+
+class ChunkedUploadStatus(BaseModel):
+    """State of a resumable upload"""
+    upload_id: str = Field(..., description="Upload session ID")
+    filename: str = Field(..., description="Sanitized file name")
+    size: int = Field(..., description="Total file size in bytes")
+    chunk_size: int = Field(..., description="Bytes per chunk; PUT offsets are multiples of this")
+    chunk_count: int = Field(..., description="Number of chunks")
+    received: Dict[int, str] = Field(..., description="SHA-256 of each stored chunk by index")
+    missing: List[int] = Field(..., description="Indexes of chunks still to upload")
+    expires_at: datetime = Field(..., description="When the unfinished upload is discarded")
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+class CVRankingRequest(BaseModel):
+    """Request model for ranking stored CVs against a job description"""
+    job_description: str = Field(..., min_length=1, description="Job description to rank CVs against")
+    top_k: int = Field(10, ge=1, le=100, description="Number of candidates to return")
+    mode: Literal["bm25", "semantic", "hybrid"] = Field(
+        "bm25", description="Keyword BM25, local embedding similarity, or both fused by reciprocal rank"
+    )
+    rerank: bool = Field(False, description="Re-rank the best candidates with the AI model")
+    rerank_top: int = Field(5, ge=1, le=20, description="How many of the best candidates to re-rank")
+
+class RankedCV(BaseModel):
+    """Model for one ranked CV"""
+    cv_hash: str = Field(..., description="Content hash of the CV text")
+    cv_id: Optional[str] = Field(None, description="Most recent upload of this CV")
+    user_id: Optional[int] = Field(None, description="User who uploaded it")
+    filename: Optional[str] = Field(None, description="Original CV filename")
+    score: float = Field(..., description="Ranking score for the chosen mode")
+    bm25_score: Optional[float] = Field(None, description="BM25 relevance score")
+    semantic_score: Optional[float] = Field(None, description="Cosine similarity of local embeddings")
+    rerank_score: Optional[int] = Field(None, description="AI fit score (0-100) when re-ranked")
+
+class CVRankingResponse(BaseModel):
+    """Response model for CV ranking"""
+    candidates: List[RankedCV] = Field(..., description="Candidates, best first")
+    corpus_size: int = Field(..., description="Number of distinct CVs the caller has uploaded")
+    index_ready: bool = Field(..., description="False while the index is still loading at startup")
+    reranked: bool = Field(False, description="Whether AI re-ranking was applied")
+    took_ms: float = Field(..., description="Time spent ranking")
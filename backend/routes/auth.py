@@ -7,7 +7,11 @@ from datetime import datetime, timedelta
 import os
 
 # Import services and models
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.model import get_async_session
 from services.auth_service import AuthService
+from services.password_hasher import PasswordHasherBusy
 from models.auth import UserLogin, UserRegister, UserResponse, TokenResponse
 
 # Setup logging
@@ -21,7 +25,10 @@ security = HTTPBearer()
 auth_service = AuthService()
 
 @router.post("/register", response_model=UserResponse)
-async def register_user(user_data: UserRegister):
+async def register_user(
+    user_data: UserRegister,
+    session: AsyncSession = Depends(get_async_session)
+):
     """
     Register a new user
     """
@@ -29,20 +36,32 @@ async def register_user(user_data: UserRegister):
         logger.info(f"User registration attempt for email: {user_data.email}")
         
         # Check if user already exists
-        if auth_service.user_exists(user_data.email):
+        if await auth_service.user_exists(session, user_data.email):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="User with this email already exists"
             )
         
         # Create new user
-        user = auth_service.create_user(user_data)
-        logger.info(f"User registered successfully: {user.email}")
+        user = await auth_service.create_user(session, user_data.model_dump())
+        logger.info(f"User registered successfully: {user['email']}")
         
         return user
         
     except HTTPException:
         raise
+    except IntegrityError:
+        # Registered concurrently, possibly on another worker
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="User with this email already exists"
+        )
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent sign-ups, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Error during user registration: {str(e)}")
         raise HTTPException(
@@ -51,7 +70,10 @@ async def register_user(user_data: UserRegister):
         )
 
 @router.post("/login", response_model=TokenResponse)
-async def login_user(user_credentials: UserLogin):
+async def login_user(
+    user_credentials: UserLogin,
+    session: AsyncSession = Depends(get_async_session)
+):
     """
     Authenticate user and return JWT token
     """
@@ -59,7 +81,7 @@ async def login_user(user_credentials: UserLogin):
         logger.info(f"Login attempt for email: {user_credentials.email}")
         
         # Authenticate user
-        user = auth_service.authenticate_user(user_credentials.email, user_credentials.password)
+        user = await auth_service.authenticate_user(session, user_credentials.email, user_credentials.password)
         
         if not user:
             raise HTTPException(
@@ -68,9 +90,9 @@ async def login_user(user_credentials: UserLogin):
             )
         
         # Generate JWT token
-        token = auth_service.create_access_token(data={"sub": user.email})
+        token = auth_service.create_access_token(data={"sub": user["email"]})
         
-        logger.info(f"User logged in successfully: {user.email}")
+        logger.info(f"User logged in successfully: {user['email']}")
         
         return {
             "access_token": token,
@@ -80,6 +102,12 @@ async def login_user(user_credentials: UserLogin):
         
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Error during user login: {str(e)}")
         raise HTTPException(
@@ -94,7 +122,7 @@ async def logout_user(credentials: HTTPAuthorizationCredentials = Depends(securi
     """
     try:
         token = credentials.credentials
-        auth_service.invalidate_token(token)
+        await auth_service.invalidate_token(token)
         
         return {"message": "Successfully logged out"}
         
@@ -106,13 +134,16 @@ async def logout_user(credentials: HTTPAuthorizationCredentials = Depends(securi
         )
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_session)
+):
     """
     Get current authenticated user information
     """
     try:
         token = credentials.credentials
-        user = auth_service.get_current_user(token)
+        user = await auth_service.get_current_user(session, token)
         
         if not user:
             raise HTTPException(
@@ -138,7 +169,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(secu
     """
     try:
         token = credentials.credentials
-        new_token = auth_service.refresh_token(token)
+        new_token = await auth_service.refresh_token(token)
         
         return {
             "access_token": new_token,
@@ -1,21 +1,42 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from typing import Optional
-import os
-import tempfile
-import shutil
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Form, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Dict, Optional
+import asyncio
 import logging
-from datetime import datetime
+import base64
+import json
+import time
+from datetime import datetime, timezone
+from sqlalchemy import delete, func, tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Import services
 from services.cv_processor import CVProcessor
 from services.ai_analyzer import AIAnalyzer
 from services.file_validator import FileValidator
+from services.upload_stream import UploadReceiver, UploadRejected
+from services.bulk_analysis import BulkAnalyzer
+from services.chunked_upload import ChunkedUploadStore, UploadSession
+from services.usage_tracker import AnalysisUsage
+from services.write_behind import AnalysisWriteBuffer
+from services.user_stats import UserStatsService
+from services.content_store import ContentStore
+from services.analysis_search import AnalysisSearch
+from services.cv_ranker import CVRanker
+from services.embeddings import EmbeddingIndex
+from services.cv_sections import split_sections
+from services.section_cache import SectionFindingCache
 
 # Import models
-from models.cv_analysis import CVAnalysisRequest, CVAnalysisResponse
-from database.model import get_session, CVFile, AnalysisResult, User
+from models.cv_analysis import (
+    CVAnalysisRequest, CVAnalysisResponse, AnalysisHistoryResponse, AnalysisSearchResponse,
+    ChunkedUploadRequest, ChunkedUploadStatus
+)
+from database.model import (
+    CVFile, AnalysisResult, JobDescription, User, UserStats, content_hash, get_async_session,
+    async_session_factory
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -27,42 +48,200 @@ router = APIRouter()
 cv_processor = CVProcessor()
 ai_analyzer = AIAnalyzer()
 file_validator = FileValidator()
+upload_receiver = UploadReceiver(file_validator)
+bulk_analyzer = BulkAnalyzer(file_validator)
+archive_receiver = UploadReceiver(bulk_analyzer.archive_validator, file_field="archive")
+chunked_uploads = ChunkedUploadStore(file_validator)
+user_stats_service = UserStatsService()
+content_store = ContentStore()
+analysis_search = AnalysisSearch()
+cv_ranker = CVRanker()
+embedding_index = EmbeddingIndex(ai_analyzer.embedder)
+section_cache = SectionFindingCache()
+write_buffer = AnalysisWriteBuffer()
+write_buffer.add_flush_hook(content_store.store_batch, before_insert=True)
+write_buffer.add_flush_hook(user_stats_service.record_batch)
+write_buffer.add_flush_hook(analysis_search.index_batch)
+write_buffer.add_commit_hook(cv_ranker.index_batch)
+write_buffer.add_commit_hook(embedding_index.index_batch)
 
-@router.post("/analyze-cv", response_model=CVAnalysisResponse)
+async def run_analysis(
+    session: AsyncSession,
+    cv_text: str,
+    job_description: str,
+    user_id: Optional[str],
+    usage: AnalysisUsage,
+    filename: str,
+    file_size: Optional[int],
+    file_type: Optional[str],
+    file_hash: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Analyze extracted CV text and queue the CV and result rows for writing
+
+    Shared by the upload routes once they have the CV text. Reuses a stored result for the same CV text and job
+    description, and per-section findings for a signed-in user.
+    """
+    cv_hash = content_hash(cv_text)
+    jd_hash = content_hash(job_description)
+    owner_id = int(user_id) if user_id and user_id.isdigit() else None
+    incremental = None
+    new_findings: Dict[str, Dict[str, Any]] = {}
+
+    prior_result = await content_store.find_prior_analysis(session, cv_hash, jd_hash, ai_analyzer.active_model)
+    if prior_result is not None:
+        logger.info(f"Reusing prior analysis for CV {cv_hash[:12]} and job description {jd_hash[:12]}")
+        analysis_result = {key: value for key, value in prior_result.items() if key != "metadata"}
+        usage.cache_hit = True
+    else:
+        sections = split_sections(cv_text) if section_cache.enabled and owner_id is not None else []
+        cached_findings = await section_cache.load(
+            session, owner_id, jd_hash, [section.hash for section in sections]
+        ) if len(sections) > 1 else {}
+        if len(sections) > 1:
+            # Analyzed section by section, so a revision only sends its changed sections
+            # to the model and is scored the same way as the first version
+            logger.info(f"Section analysis: {len(cached_findings)} of {len(sections)} sections cached")
+            analysis_result, new_findings = await ai_analyzer.analyze_sections(
+                cv_text, sections, job_description, cached_findings, usage
+            )
+            if cached_findings:
+                changed = [section for section in sections if section.hash not in cached_findings]
+                incremental = {
+                    "sections": len(sections),
+                    "reused": len(sections) - len(changed),
+                    "analyzed": len(changed),
+                    "changed": [section.title for section in changed],
+                }
+        else:
+            # Analyze CV with AI
+            logger.info("Starting AI analysis")
+            analysis_result = await ai_analyzer.analyze_cv(cv_text, job_description, usage)
+        if new_findings:
+            await section_cache.save(session, owner_id, jd_hash, new_findings)
+            await session.commit()
+
+    # Add metadata; skill matching and embeddings are CPU work, kept off the event loop
+    (matched_skills, missing_skills, _), similarity = await asyncio.gather(
+        asyncio.to_thread(ai_analyzer.skills.compare, cv_text, job_description),
+        asyncio.to_thread(ai_analyzer.semantic_similarity, cv_text, job_description)
+    )
+    analysis_result["metadata"] = {
+        "filename": filename,
+        "file_size": file_size,
+        "file_type": file_type,
+        "analysis_timestamp": datetime.utcnow().isoformat(),
+        "user_id": user_id,
+        "semantic_similarity": round(similarity, 4),
+        "skills": {"matched": matched_skills, "missing": missing_skills},
+        "usage": usage.to_metadata()
+    }
+    if incremental:
+        analysis_result["metadata"]["incremental"] = incremental
+
+    # Queue CV metadata and analysis for the write-behind buffer; ids are
+    # allocated here so the response can reference rows not yet written
+    cv_row = CVFile(
+        user_id=owner_id,
+        filename=filename,
+        file_size=file_size,
+        file_type=file_type,
+        content_hash=cv_hash,
+        file_hash=file_hash
+    )
+    analysis_row = AnalysisResult(
+        user_id=owner_id,
+        cv_id=cv_row.id,
+        cv_hash=cv_hash,
+        jd_hash=jd_hash,
+        analysis=analysis_result,
+        overall_score=analysis_result.get("overall_score"),
+        **usage.to_columns()
+    )
+    analysis_result["metadata"]["cv_id"] = cv_row.id
+    analysis_result["metadata"]["analysis_id"] = analysis_row.id
+
+    # The write stage ends when the buffer takes the rows (or, writing through, just
+    # before it serializes them); usage is finished then so the stored row and the
+    # response both account for it
+    write_started = time.perf_counter()
+
+    def finish_usage():
+        usage.add_timing("db_write", (time.perf_counter() - write_started) * 1000)
+        usage.finish()
+        analysis_row.db_write_ms = usage.timings_ms["db_write"]
+        analysis_row.total_ms = usage.total_ms
+        analysis_result["metadata"]["usage"] = usage.to_metadata()
+
+    await write_buffer.submit(cv_row, analysis_row, cv_text, job_description, before_write=finish_usage)
+
+    return analysis_result
+
+
+# Request body of /analyze-cv for the OpenAPI schema; the route parses it as a stream
+ANALYZE_CV_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["cv_file", "job_description"],
+                    "properties": {
+                        "cv_file": {"type": "string", "format": "binary"},
+                        "job_description": {"type": "string"},
+                        "user_id": {"type": "string"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/analyze-cv", response_model=CVAnalysisResponse, openapi_extra=ANALYZE_CV_FORM)
 async def analyze_cv(
-    cv_file: UploadFile = File(...),
-    job_description: str = Form(...),
-    user_id: Optional[str] = Form(None)
+    request: Request,
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Analyze a CV against a job description using AI
+
+    The upload is parsed as it streams in (see UploadReceiver) and rejected
+    as soon as it is too large or not a document. A file byte-identical to
+    an earlier upload reuses that upload's extracted text. CV text and job
+    description are stored content-addressed; when the same CV text was
+    already analyzed against the same job description, the stored result is
+    returned without calling the model. For a signed-in user, findings are
+    cached per CV section, so a revised CV only sends its changed sections
+    to the model.
     """
+    usage = AnalysisUsage()
+    upload = None
     try:
-        logger.info(f"Starting CV analysis for file: {cv_file.filename}")
-        
-        # Validate file
-        if not file_validator.is_valid_file(cv_file):
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid file type. Only PDF, DOCX, and DOC files are allowed."
-            )
-        
-        if not file_validator.is_valid_size(cv_file):
-            raise HTTPException(
-                status_code=400, 
-                detail="File size too large. Maximum size is 10MB."
-            )
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(cv_file.filename).suffix) as temp_file:
-            # Copy uploaded file to temp file
-            shutil.copyfileobj(cv_file.file, temp_file)
-            temp_file_path = temp_file.name
+        try:
+            with usage.stage("upload"):
+                upload = await upload_receiver.receive(request)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         
         try:
-            # Extract text from CV
-            logger.info("Extracting text from CV file")
-            cv_text = await cv_processor.extract_text(temp_file_path, cv_file.content_type)
+            job_description = upload.fields.get("job_description")
+            if not job_description:
+                raise HTTPException(status_code=422, detail="job_description is required")
+            user_id = upload.fields.get("user_id") or None
+            # The extractor follows the sniffed content, not the declared type
+            file_type = file_validator.mime_type_for(upload.detected_type)
+            logger.info(f"Starting CV analysis for file: {upload.filename}")
+            
+            cv_text = await content_store.find_text_by_file_hash(session, upload.sha256)
+            if cv_text is not None:
+                logger.info(f"Reusing extracted text of an identical upload {upload.sha256[:12]}")
+            else:
+                # Extract text from CV
+                logger.info("Extracting text from CV file")
+                with usage.stage("extraction"):
+                    cv_text = await cv_processor.extract_text(upload.path, file_type)
             
             if not cv_text or not cv_text.strip():
                 raise HTTPException(
@@ -70,58 +249,17 @@ async def analyze_cv(
                     detail="Could not extract text from the document. Please ensure it's a valid file."
                 )
             
-            # Analyze CV with AI
-            logger.info("Starting AI analysis")
-            analysis_result = await ai_analyzer.analyze_cv(cv_text, job_description)
-            
-            # Add metadata
-            analysis_result["metadata"] = {
-                "filename": cv_file.filename,
-                "file_size": cv_file.size,
-                "file_type": cv_file.content_type,
-                "analysis_timestamp": datetime.utcnow().isoformat(),
-                "user_id": user_id
-            }
-
-            # Persist CV metadata and analysis to the database
-            try:
-                with get_session() as session:
-                    cv_row = CVFile(
-                        user_id=int(user_id) if user_id and user_id.isdigit() else None,
-                        filename=cv_file.filename,
-                        file_size=cv_file.size,
-                        file_type=cv_file.content_type,
-                        file_content=cv_text
-                    )
-                    session.add(cv_row)
-                    session.commit()
-                    session.refresh(cv_row)
-
-                    analysis_row = AnalysisResult(
-                        user_id=int(user_id) if user_id and user_id.isdigit() else None,
-                        cv_id=cv_row.id,
-                        job_description=job_description,
-                        analysis=analysis_result,
-                        overall_score=analysis_result.get("overall_score")
-                    )
-                    session.add(analysis_row)
-                    session.commit()
-                    session.refresh(analysis_row)
-
-                    # attach persisted IDs to response metadata
-                    analysis_result["metadata"]["cv_id"] = cv_row.id
-                    analysis_result["metadata"]["analysis_id"] = analysis_row.id
-            except Exception as e:
-                logger.error(f"Failed to save analysis to DB: {str(e)}")
+            analysis_result = await run_analysis(
+                session, cv_text, job_description, user_id, usage,
+                upload.filename, upload.size, file_type, upload.sha256
+            )
             
             logger.info("CV analysis completed successfully")
             return analysis_result
             
         finally:
             # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
+            upload.cleanup()
     
     except HTTPException:
         raise
@@ -132,26 +270,336 @@ async def analyze_cv(
             detail=f"Internal server error during CV analysis: {str(e)}"
         )
 
-@router.get("/analysis-history/{user_id}")
-async def get_analysis_history(user_id: str, limit: int = 10):
+# Request body of /analyze-cv/bulk for the OpenAPI schema
+ANALYZE_CV_BULK_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["archive", "job_description"],
+                    "properties": {
+                        "archive": {"type": "string", "format": "binary"},
+                        "job_description": {"type": "string"},
+                        "user_id": {"type": "string"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/analyze-cv/bulk", openapi_extra=ANALYZE_CV_BULK_FORM)
+async def analyze_cv_bulk(request: Request):
+    """
+    Analyze every CV in a ZIP archive against one job description
+
+    The archive is streamed to a temporary file, then its members are
+    checked against the zip-bomb caps, decompressed and extracted on a
+    worker pool and analyzed with bounded concurrency (see BulkAnalyzer).
+    Results are streamed as NDJSON, one line per file in completion order
+    ({"index", "filename", "status": "ok", "result"} or {"index",
+    "filename", "status": "error", "error"}), then a {"summary"} line.
+    """
+    try:
+        upload = await archive_receiver.receive(request)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        job_description = upload.fields.get("job_description")
+        if not job_description:
+            raise HTTPException(status_code=422, detail="job_description is required")
+        user_id = upload.fields.get("user_id") or None
+        try:
+            entries = bulk_analyzer.list_entries(upload.path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        upload.cleanup()
+        raise
+
+    logger.info(f"Bulk analysis of {len(entries)} files from {upload.filename}")
+    semaphore = asyncio.Semaphore(bulk_analyzer.concurrency)
+
+    async def analyze_entry(entry) -> Dict[str, Any]:
+        line = {"index": entry.index, "filename": entry.name}
+        if entry.error:
+            return {**line, "status": "error", "error": entry.error}
+        usage = AnalysisUsage()
+        try:
+            async with semaphore:
+                with usage.stage("upload"):
+                    data, file_hash, detected_type = await bulk_analyzer.read_entry(upload.path, entry)
+                if detected_type is None:
+                    return {**line, "status": "error", "error": file_validator.content_error}
+                file_type = file_validator.mime_type_for(detected_type)
+
+                async with async_session_factory() as session:
+                    cv_text = await content_store.find_text_by_file_hash(session, file_hash)
+                    if cv_text is None:
+                        with usage.stage("extraction"):
+                            cv_text = await bulk_analyzer.extract(data, file_type)
+                    del data
+                    if not cv_text or not cv_text.strip():
+                        return {**line, "status": "error", "error": "Could not extract text from the document."}
+                    result = await run_analysis(
+                        session, cv_text, job_description, user_id, usage,
+                        entry.name, entry.size, file_type, file_hash
+                    )
+            return {**line, "status": "ok", "result": result}
+        except Exception as e:
+            logger.error(f"Error analyzing {entry.name} from archive: {str(e)}")
+            return {**line, "status": "error", "error": "Internal error during analysis"}
+
+    async def results():
+        started = time.perf_counter()
+        succeeded = 0
+        tasks = [asyncio.create_task(analyze_entry(entry)) for entry in entries]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                line = await next_result
+                succeeded += line["status"] == "ok"
+                yield json.dumps(line, default=str) + "\n"
+            yield json.dumps({"summary": {
+                "files": len(entries),
+                "succeeded": succeeded,
+                "failed": len(entries) - succeeded,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            }}) + "\n"
+        finally:
+            # Client gone or stream finished: stop pending work and drop the archive
+            for task in tasks:
+                task.cancel()
+            upload.cleanup()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+async def _upload_status(upload_session: UploadSession) -> ChunkedUploadStatus:
+    received = await asyncio.to_thread(chunked_uploads.received, upload_session)
+    return ChunkedUploadStatus(
+        upload_id=upload_session.upload_id,
+        filename=upload_session.filename,
+        size=upload_session.size,
+        chunk_size=upload_session.chunk_size,
+        chunk_count=upload_session.chunk_count,
+        received=received,
+        missing=[index for index in range(upload_session.chunk_count) if index not in received],
+        expires_at=datetime.fromtimestamp(upload_session.created_at + chunked_uploads.ttl, timezone.utc),
+    )
+
+
+@router.post("/uploads", response_model=ChunkedUploadStatus)
+async def create_chunked_upload(upload_request: ChunkedUploadRequest):
+    """
+    Start a resumable CV upload
+
+    The file is sent as chunks of `chunk_size` bytes with
+    PUT /uploads/{upload_id}?offset=N (optionally with an X-Chunk-SHA256
+    header), in any order and as often as needed; GET shows which chunks
+    are still missing. POST /uploads/{upload_id}/complete then analyzes it.
+    """
+    try:
+        upload_session = await asyncio.to_thread(
+            chunked_uploads.create, upload_request.filename, upload_request.content_type, upload_request.size
+        )
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    logger.info(f"Started chunked upload {upload_session.upload_id} for {upload_session.filename}")
+    return await _upload_status(upload_session)
+
+
+@router.get("/uploads/{upload_id}", response_model=ChunkedUploadStatus)
+async def get_chunked_upload(upload_id: str):
+    """Chunks received so far, for resuming an interrupted upload"""
+    try:
+        return await _upload_status(await asyncio.to_thread(chunked_uploads.get, upload_id))
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.put("/uploads/{upload_id}", response_model=ChunkedUploadStatus)
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of the chunk in the file"),
+    chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256")
+):
+    """Store one chunk of a resumable upload (the raw request body)"""
+    try:
+        upload_session = await asyncio.to_thread(chunked_uploads.get, upload_id)
+        data = bytearray()
+        async for part in request.stream():
+            data += part
+            if len(data) > upload_session.chunk_size:
+                raise UploadRejected(413, f"Chunks are at most {upload_session.chunk_size} bytes")
+        await asyncio.to_thread(chunked_uploads.write_chunk, upload_session, offset, bytes(data), chunk_sha256)
+        return await _upload_status(upload_session)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_chunked_upload(upload_id: str):
+    """Abandon a resumable upload and delete its chunks"""
+    try:
+        await asyncio.to_thread(chunked_uploads.get, upload_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await asyncio.to_thread(chunked_uploads.discard, upload_id)
+    return {"message": "Upload deleted", "upload_id": upload_id}
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=CVAnalysisResponse)
+async def complete_chunked_upload(
+    upload_id: str,
+    job_description: str = Form(...),
+    user_id: Optional[str] = Form(None),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Assemble a resumable upload and analyze it like /analyze-cv
+
+    The chunks are verified against their checksums and concatenated in
+    one pass that also computes the file hash, so a file identical to an
+    earlier upload reuses its extracted text. The upload is deleted once
+    analyzed or found invalid; after a missing or corrupt chunk (409) it
+    stays open for the client to resend.
+    """
+    usage = AnalysisUsage()
+    upload = None
+    try:
+        try:
+            upload_session = await asyncio.to_thread(chunked_uploads.get, upload_id)
+            with usage.stage("upload"):
+                upload = await asyncio.to_thread(chunked_uploads.assemble, upload_session)
+        except UploadRejected as e:
+            if e.status_code == 400:
+                await asyncio.to_thread(chunked_uploads.discard, upload_id)
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        file_type = file_validator.mime_type_for(upload.detected_type)
+        logger.info(f"Starting CV analysis for chunked upload {upload_id}: {upload.filename}")
+        try:
+            cv_text = await content_store.find_text_by_file_hash(session, upload.sha256)
+            if cv_text is None:
+                with usage.stage("extraction"):
+                    cv_text = await cv_processor.extract_text(upload.path, file_type)
+            if not cv_text or not cv_text.strip():
+                await asyncio.to_thread(chunked_uploads.discard, upload_id)
+                raise HTTPException(
+                    status_code=400,
+                    detail="Could not extract text from the document. Please ensure it's a valid file."
+                )
+
+            analysis_result = await run_analysis(
+                session, cv_text, job_description, user_id, usage,
+                upload.filename, upload.size, file_type, upload.sha256
+            )
+            await asyncio.to_thread(chunked_uploads.discard, upload_id)
+            return analysis_result
+        finally:
+            upload.cleanup()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during chunked upload analysis: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error during CV analysis: {str(e)}"
+        )
+
+
+# Characters of the job description returned in history listings
+HISTORY_SNIPPET_LENGTH = 200
+
+
+def _encode_cursor(created_at: datetime, analysis_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), analysis_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, analysis_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(analysis_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+@router.get("/analysis-history/{user_id}", response_model=AnalysisHistoryResponse)
+async def get_analysis_history(
+    user_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
     """
-    Get analysis history for a user
+    Get analysis history for a user, newest first
+
+    Uses keyset pagination on (user_id, created_at, id): pass the returned
+    `next_cursor` to fetch the following page. Only list columns are read,
+    never the analysis JSON or the CV text.
     """
+    if not user_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+
     try:
-        # This would typically query a database
-        # For now, return mock data
+        statement = (
+            select(
+                AnalysisResult.id,
+                AnalysisResult.cv_id,
+                AnalysisResult.created_at,
+                AnalysisResult.overall_score,
+                func.substr(
+                    func.coalesce(AnalysisResult.job_description, JobDescription.text), 1, HISTORY_SNIPPET_LENGTH
+                ).label("job_description"),
+                CVFile.filename,
+            )
+            .select_from(AnalysisResult)
+            .outerjoin(CVFile, CVFile.id == AnalysisResult.cv_id)
+            .outerjoin(JobDescription, JobDescription.hash == AnalysisResult.jd_hash)
+            .where(AnalysisResult.user_id == int(user_id))
+            .order_by(AnalysisResult.created_at.desc(), AnalysisResult.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            created_at, analysis_id = _decode_cursor(cursor)
+            statement = statement.where(
+                tuple_(AnalysisResult.created_at, AnalysisResult.id) < tuple_(created_at, analysis_id)
+            )
+
+        rows = (await session.exec(statement)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # Maintained counter instead of COUNT(*) over the whole history
+        stats = await session.get(UserStats, int(user_id))
+
         return {
             "user_id": user_id,
             "analyses": [
                 {
-                    "id": "1",
-                    "timestamp": "2024-01-15T10:30:00Z",
-                    "filename": "resume.pdf",
-                    "overall_score": 75
+                    "id": row.id,
+                    "cv_id": row.cv_id,
+                    "timestamp": row.created_at,
+                    "filename": row.filename,
+                    "overall_score": row.overall_score,
+                    "job_description": row.job_description
                 }
+                for row in rows
             ],
-            "total": 1
+            "total": stats.analysis_count if stats else None,
+            "next_cursor": _encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+            "has_more": has_more
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting analysis history: {str(e)}")
         raise HTTPException(
@@ -159,15 +607,99 @@ async def get_analysis_history(user_id: str, limit: int = 10):
             detail="Error retrieving analysis history"
         )
 
+@router.get("/analysis-search/{user_id}", response_model=AnalysisSearchResponse)
+async def search_analyses(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Full-text search over a user's analyses, best match first
+
+    Matches the job description, analysis summary, CV filename and CV text.
+    """
+    if not user_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+
+    try:
+        results, has_more = await analysis_search.search(session, int(user_id), q, limit, offset)
+        return {
+            "user_id": user_id,
+            "query": q,
+            "results": [
+                {
+                    "id": row["analysis_id"],
+                    "timestamp": row["created_at"],
+                    "filename": row["filename"],
+                    "overall_score": row["overall_score"],
+                    "job_description": row["job_description"],
+                    "cv_snippet": row["cv_snippet"],
+                    "rank": row["rank"]
+                }
+                for row in results
+            ],
+            "next_offset": offset + limit if has_more else None,
+            "has_more": has_more
+        }
+    except Exception as e:
+        logger.error(f"Error searching analyses: {str(e)}")
+        raise HTTPException(
+            status_code=500, 
+            detail="Error searching analyses"
+        )
+
 @router.delete("/analysis/{analysis_id}")
-async def delete_analysis(analysis_id: str, user_id: str):
+async def delete_analysis(
+    analysis_id: str,
+    user_id: str,
+    session: AsyncSession = Depends(get_async_session)
+):
     """
     Delete a specific analysis
+
+    Also removes its CV upload row and releases the references on the
+    deduplicated CV text and job description.
     """
+    if not user_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+
     try:
-        # This would typically delete from a database
+        analysis = await session.get(AnalysisResult, analysis_id)
+        if analysis is None or analysis.user_id != int(user_id):
+            raise HTTPException(status_code=404, detail="Analysis not found")
+
+        cv_row = await session.get(CVFile, analysis.cv_id) if analysis.cv_id else None
+        await session.delete(analysis)
+        await session.flush()
+
+        cv_hashes = []
+        if cv_row is not None:
+            still_used = (await session.exec(
+                select(AnalysisResult.id).where(AnalysisResult.cv_id == cv_row.id).limit(1)
+            )).first()
+            if still_used is None:
+                cv_hashes.append(cv_row.content_hash)
+                await session.delete(cv_row)
+                await session.flush()
+
+        deleted_cv_hashes = await content_store.release(session, cv_hashes=cv_hashes, jd_hashes=[analysis.jd_hash])
+        await analysis_search.remove(session, analysis_id)
+
+        # Rebuild the user's counters from aggregates
+        await session.execute(delete(UserStats).where(UserStats.user_id == int(user_id)))
+        await session.commit()
+        for cv_hash in deleted_cv_hashes:
+            cv_ranker.remove_document(cv_hash)
+            embedding_index.remove(cv_hash)
+        await user_stats_service.get_stats(session, int(user_id))
+
         return {"message": f"Analysis {analysis_id} deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
+        await session.rollback()
         logger.error(f"Error deleting analysis: {str(e)}")
         raise HTTPException(
             status_code=500, 
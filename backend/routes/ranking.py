@@ -0,0 +1,132 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+import logging
+import time
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.ranking import CVRankingRequest, CVRankingResponse
+from database.model import CVFile, RerankUsage, get_async_session
+from services.cv_ranker import fetch_texts
+from services.usage_tracker import AnalysisUsage
+from routes.cv_analysis import ai_analyzer, cv_ranker, embedding_index
+from routes.users import clerk_service, verify_clerk_token
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Reciprocal rank fusion constant for hybrid ranking
+RRF_K = 60
+
+
+@router.post("/rank-cvs", response_model=CVRankingResponse)
+async def rank_cvs(
+    request: CVRankingRequest,
+    clerk_user_id: str = Depends(verify_clerk_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Rank the caller's stored CVs against a job description
+
+    `bm25` uses the in-memory inverted index, `semantic` the local n-gram
+    embeddings of every CV, `hybrid` fuses both rankings (reciprocal rank
+    fusion). With `rerank` the best `rerank_top` candidates are re-ordered
+    by the AI model. The indexes are shared, but only CVs the caller
+    uploaded are scored.
+    """
+    start = time.perf_counter()
+    try:
+        user = await clerk_service.get_user_by_clerk_id(session, clerk_user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        owned = set((await session.exec(
+            select(CVFile.content_hash).where(CVFile.user_id == user.id, CVFile.content_hash.is_not(None))
+        )).all())
+
+        pool = request.top_k if request.mode != "hybrid" else request.top_k * 4
+        bm25 = dict(cv_ranker.search(request.job_description, pool, owned)) if request.mode != "semantic" else {}
+        semantic = dict(embedding_index.search(request.job_description, pool, owned)) if request.mode != "bm25" else {}
+
+        if request.mode == "bm25":
+            ranked = list(bm25.items())
+        elif request.mode == "semantic":
+            ranked = list(semantic.items())
+        else:
+            fused = {}
+            for scores in (bm25, semantic):
+                for rank, doc_hash in enumerate(scores):
+                    fused[doc_hash] = fused.get(doc_hash, 0.0) + 1 / (RRF_K + rank + 1)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:request.top_k]
+        hashes = [doc_hash for doc_hash, _ in ranked]
+
+        # The caller's latest upload of each CV text
+        uploads = {}
+        if hashes:
+            rows = (await session.exec(
+                select(CVFile.content_hash, CVFile.id, CVFile.user_id, CVFile.filename)
+                .where(CVFile.content_hash.in_(hashes), CVFile.user_id == user.id)
+                .order_by(CVFile.uploaded_at.desc())
+            )).all()
+            for row in rows:
+                uploads.setdefault(row.content_hash, row)
+
+        candidates = [
+            {
+                "cv_hash": doc_hash,
+                "cv_id": uploads[doc_hash].id if doc_hash in uploads else None,
+                "user_id": uploads[doc_hash].user_id if doc_hash in uploads else None,
+                "filename": uploads[doc_hash].filename if doc_hash in uploads else None,
+                "score": round(score, 4),
+                "bm25_score": round(bm25[doc_hash], 4) if doc_hash in bm25 else None,
+                "semantic_score": round(semantic[doc_hash], 4) if doc_hash in semantic else None,
+                "rerank_score": None
+            }
+            for doc_hash, score in ranked
+        ]
+
+        reranked = False
+        if request.rerank and candidates:
+            head = candidates[:request.rerank_top]
+            texts = await fetch_texts(session, [candidate["cv_hash"] for candidate in head])
+            usage = AnalysisUsage()
+            fit_scores = await ai_analyzer.rerank_candidates(request.job_description, texts, usage)
+            usage.finish()
+            if usage.model:
+                # Same token, cost and latency accounting as analyses, see /usage/summary
+                session.add(RerankUsage(user_id=user.id, candidates=len(texts), **usage.to_columns(RerankUsage)))
+                await session.commit()
+            if fit_scores:
+                for candidate in head:
+                    candidate["rerank_score"] = fit_scores.get(candidate["cv_hash"])
+                # Stable sort: ties and unscored CVs keep their BM25 order
+                head.sort(
+                    key=lambda candidate: -1 if candidate["rerank_score"] is None else candidate["rerank_score"],
+                    reverse=True
+                )
+                candidates[:request.rerank_top] = head
+                reranked = True
+
+        return {
+            "candidates": candidates,
+            "corpus_size": len(owned),
+            "index_ready": {
+                "bm25": cv_ranker.ready,
+                "semantic": embedding_index.ready,
+                "hybrid": cv_ranker.ready and embedding_index.ready,
+            }[request.mode],
+            "reranked": reranked,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error ranking CVs: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error ranking CVs"
+        )
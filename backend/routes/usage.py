@@ -0,0 +1,138 @@
+from fastapi import APIRouter, HTTPException, Query, Depends, status
+from typing import Optional, List
+import logging
+from datetime import datetime
+from sqlalchemy import func, case, literal, null, union_all
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import get_async_session, AnalysisResult, RerankUsage
+from routes.users import clerk_service, verify_clerk_token
+from services.usage_tracker import STAGES
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+GROUP_BY = ("user", "day", "model")
+
+def usage_rows():
+    """
+    Analyses and candidate re-rankings as one relation of model calls
+
+    Stage latencies are only averaged over analyses; a re-ranking's latency
+    is reported separately as rerank_ms.
+    """
+    analyses = select(
+        AnalysisResult.user_id,
+        AnalysisResult.created_at,
+        AnalysisResult.model,
+        literal("analysis").label("kind"),
+        AnalysisResult.prompt_tokens,
+        AnalysisResult.completion_tokens,
+        AnalysisResult.cost_usd,
+        AnalysisResult.prompt_chars,
+        AnalysisResult.cache_hit,
+        *[getattr(AnalysisResult, f"{stage}_ms").label(f"{stage}_ms") for stage in STAGES],
+        AnalysisResult.total_ms,
+        null().label("rerank_ms"),
+    )
+    reranks = select(
+        RerankUsage.user_id,
+        RerankUsage.created_at,
+        RerankUsage.model,
+        literal("rerank").label("kind"),
+        RerankUsage.prompt_tokens,
+        RerankUsage.completion_tokens,
+        RerankUsage.cost_usd,
+        RerankUsage.prompt_chars,
+        literal(False).label("cache_hit"),
+        *[null().label(f"{stage}_ms") for stage in STAGES],
+        null().label("total_ms"),
+        RerankUsage.total_ms.label("rerank_ms"),
+    )
+    return union_all(analyses, reranks).subquery("usage_rows")
+
+
+@router.get("/usage/summary")
+async def get_usage_summary(
+    group_by: List[str] = Query(["day", "model"]),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    clerk_user_id: str = Depends(verify_clerk_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Aggregate the caller's token, cost and latency accounting per day and per model
+
+    Covers analyses and model re-rankings of /rank-cvs candidates.
+    """
+    unknown = [name for name in group_by if name not in GROUP_BY]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid group_by value(s): {', '.join(unknown)}. "
+                   f"Allowed: {', '.join(GROUP_BY)}"
+        )
+
+    try:
+        user = await clerk_service.get_user_by_clerk_id(session, clerk_user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+
+        rows = usage_rows()
+        group_columns = {
+            "user": rows.c.user_id,
+            "day": func.date(rows.c.created_at),
+            "model": rows.c.model,
+        }
+        keys = [group_columns[name].label(name) for name in group_by]
+        statement = select(
+            *keys,
+            func.sum(case((rows.c.kind == "analysis", 1), else_=0)).label("analyses"),
+            func.sum(case((rows.c.kind == "rerank", 1), else_=0)).label("reranks"),
+            func.coalesce(func.sum(rows.c.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(rows.c.completion_tokens), 0).label("completion_tokens"),
+            func.coalesce(func.sum(rows.c.cost_usd), 0.0).label("cost_usd"),
+            func.avg(rows.c.prompt_chars).label("avg_prompt_chars"),
+            func.max(rows.c.prompt_chars).label("max_prompt_chars"),
+            func.sum(case((rows.c.cache_hit == True, 1), else_=0)).label("cache_hits"),
+            *[func.avg(rows.c[f"{stage}_ms"]).label(f"avg_{stage}_ms") for stage in STAGES],
+            func.avg(rows.c.total_ms).label("avg_total_ms"),
+            func.avg(rows.c.rerank_ms).label("avg_rerank_ms"),
+        ).where(rows.c.user_id == user.id)
+
+        if start is not None:
+            statement = statement.where(rows.c.created_at >= start)
+        if end is not None:
+            statement = statement.where(rows.c.created_at < end)
+        if keys:
+            statement = statement.group_by(*keys).order_by(*keys)
+
+        result = (await session.exec(statement)).all()
+
+        groups = []
+        for row in result:
+            item = dict(row._mapping)
+            item["total_tokens"] = item["prompt_tokens"] + item["completion_tokens"]
+            item["cost_usd"] = round(item["cost_usd"], 6)
+            for field, value in item.items():
+                if field.startswith("avg_") and value is not None:
+                    item[field] = round(value, 2)
+            groups.append(item)
+
+        return {"user_id": user.id, "group_by": group_by, "groups": groups}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting usage summary: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error retrieving usage summary"
+        )
@@ -2,26 +2,27 @@ from fastapi import APIRouter, HTTPException, Depends, status, Header
 from fastapi.responses import JSONResponse
 from typing import Optional, List
 import logging
-import requests
-import os
 from datetime import datetime
-from database.model import User, get_session
+from database.model import User, get_async_session
 from services.clerk_service import ClerkService
-from sqlmodel import select
+from services.http_client import HTTPClient
+from services.clerk_jwt import ClerkJWTVerifier, TokenVerificationError
+from services.user_stats import UserStatsService
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-clerk_service = ClerkService()
+# Pooled client for Clerk API calls, opened and closed in the app lifespan
+clerk_http = HTTPClient()
+clerk_service = ClerkService(http_client=clerk_http)
+clerk_jwt_verifier = ClerkJWTVerifier(http_client=clerk_http)
+user_stats_service = UserStatsService()
 
-# Clerk configuration
-CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY", "")
-CLERK_API_BASE = "https://api.clerk.com/v1"
-
-def verify_clerk_token(authorization: str = Header(None)) -> str:
-    """Verify Clerk JWT token and return user ID"""
+async def verify_clerk_token(authorization: str = Header(None)) -> str:
+    """Verify Clerk JWT token locally against the cached JWKS and return user ID"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -31,54 +32,30 @@ def verify_clerk_token(authorization: str = Header(None)) -> str:
     token = authorization.replace("Bearer ", "")
     
     try:
-        # Verify token with Clerk
-        headers = {
-            "Authorization": f"Bearer {CLERK_SECRET_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(
-            f"{CLERK_API_BASE}/tokens/verify",
-            headers=headers,
-            json={"token": token}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
-        
-        token_data = response.json()
-        return token_data.get("sub")  # Clerk user ID
+        claims = await clerk_jwt_verifier.verify(token)
+        return claims["sub"]  # Clerk user ID
         
-    except requests.RequestException:
+    except TokenVerificationError as e:
+        logger.info(f"Rejected Clerk token: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token verification failed"
+            detail="Invalid token"
         )
 
 @router.get("/me")
-async def get_current_user(clerk_user_id: str = Depends(verify_clerk_token)):
+async def get_current_user(
+    clerk_user_id: str = Depends(verify_clerk_token),
+    session: AsyncSession = Depends(get_async_session)
+):
     """Get current user information"""
     try:
-        user = clerk_service.get_user_by_clerk_id(clerk_user_id)
+        user = await clerk_service.get_user_by_clerk_id(session, clerk_user_id)
         
         if not user:
             # User doesn't exist in our database, sync from Clerk
-            headers = {
-                "Authorization": f"Bearer {CLERK_SECRET_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.get(
-                f"{CLERK_API_BASE}/users/{clerk_user_id}",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                clerk_user_data = response.json()
-                user = clerk_service.sync_user_from_clerk(clerk_user_data)
+            clerk_user_data = await clerk_service.fetch_user(clerk_user_id)
+            if clerk_user_data:
+                user = await clerk_service.sync_user_from_clerk(session, clerk_user_data)
             
             if not user:
                 raise HTTPException(
@@ -110,11 +87,12 @@ async def get_current_user(clerk_user_id: str = Depends(verify_clerk_token)):
 @router.put("/me")
 async def update_current_user(
     update_data: dict,
-    clerk_user_id: str = Depends(verify_clerk_token)
+    clerk_user_id: str = Depends(verify_clerk_token),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Update current user information"""
     try:
-        user = clerk_service.get_user_by_clerk_id(clerk_user_id)
+        user = await clerk_service.get_user_by_clerk_id(session, clerk_user_id)
         
         if not user:
             raise HTTPException(
@@ -122,21 +100,21 @@ async def update_current_user(
                 detail="User not found"
             )
         
-        with get_session() as session:
-            # Update allowed fields
-            allowed_fields = ["first_name", "last_name"]
-            updated = False
-            
-            for field in allowed_fields:
-                if field in update_data:
-                    setattr(user, field, update_data[field])
-                    updated = True
-            
-            if updated:
-                user.updated_at = datetime.utcnow()
-                session.add(user)
-                session.commit()
-                session.refresh(user)
+        # Update allowed fields
+        allowed_fields = ["first_name", "last_name"]
+        updated = False
+        
+        for field in allowed_fields:
+            if field in update_data:
+                setattr(user, field, update_data[field])
+                updated = True
+        
+        if updated:
+            user.updated_at = datetime.utcnow()
+            session.add(user)
+            await session.commit()
+            await session.refresh(user)
+            clerk_service.invalidate_user(clerk_user_id)
         
         return {
             "id": user.id,
@@ -160,10 +138,13 @@ async def update_current_user(
         )
 
 @router.get("/stats")
-async def get_user_stats(clerk_user_id: str = Depends(verify_clerk_token)):
+async def get_user_stats(
+    clerk_user_id: str = Depends(verify_clerk_token),
+    session: AsyncSession = Depends(get_async_session)
+):
     """Get user statistics (CV uploads, analyses, etc.)"""
     try:
-        user = clerk_service.get_user_by_clerk_id(clerk_user_id)
+        user = await clerk_service.get_user_by_clerk_id(session, clerk_user_id)
         
         if not user:
             raise HTTPException(
@@ -171,22 +152,12 @@ async def get_user_stats(clerk_user_id: str = Depends(verify_clerk_token)):
                 detail="User not found"
             )
         
-        with get_session() as session:
-            # Count user's CV uploads
-            from database.model import CVFile, AnalysisResult
-            
-            cv_count = len(session.exec(
-                select(CVFile).where(CVFile.user_id == user.id)
-            ).all())
-            
-            analysis_count = len(session.exec(
-                select(AnalysisResult).where(AnalysisResult.user_id == user.id)
-            ).all())
+        # Single primary-key read of the maintained counters
+        stats = await user_stats_service.get_stats(session, user.id)
         
         return {
             "user_id": user.id,
-            "cv_uploads": cv_count,
-            "analyses_completed": analysis_count,
+            **user_stats_service.to_response(stats),
             "member_since": user.created_at
         }
         
@@ -200,10 +171,13 @@ async def get_user_stats(clerk_user_id: str = Depends(verify_clerk_token)):
         )
 
 @router.delete("/me")
-async def delete_current_user(clerk_user_id: str = Depends(verify_clerk_token)):
+async def delete_current_user(
+    clerk_user_id: str = Depends(verify_clerk_token),
+    session: AsyncSession = Depends(get_async_session)
+):
     """Deactivate current user account"""
     try:
-        user = clerk_service.get_user_by_clerk_id(clerk_user_id)
+        user = await clerk_service.get_user_by_clerk_id(session, clerk_user_id)
         
         if not user:
             raise HTTPException(
@@ -211,11 +185,11 @@ async def delete_current_user(clerk_user_id: str = Depends(verify_clerk_token)):
                 detail="User not found"
             )
         
-        with get_session() as session:
-            user.is_active = False
-            user.updated_at = datetime.utcnow()
-            session.add(user)
-            session.commit()
+        user.is_active = False
+        user.updated_at = datetime.utcnow()
+        session.add(user)
+        await session.commit()
+        clerk_service.invalidate_user(clerk_user_id)
         
         return {"message": "User account deactivated successfully"}
         
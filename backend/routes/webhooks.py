@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Request, HTTPException, status
+from fastapi import APIRouter, Request, HTTPException, status, Depends
 from fastapi.responses import JSONResponse
 import logging
 import json
+import hashlib
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.model import get_async_session
 from services.clerk_service import ClerkService
+from services.webhook_inbox import WebhookInbox
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -10,16 +14,30 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 clerk_service = ClerkService()
+webhook_inbox = WebhookInbox(clerk_service)
 
 @router.post("/clerk")
-async def handle_clerk_webhook(request: Request):
+async def handle_clerk_webhook(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session)
+):
     """
     Handle Clerk webhook events
+
+    The signed event is stored in the webhook inbox and acknowledged right
+    away; users are created/updated/deactivated by the background consumer.
+    Retried deliveries (same svix-id) are acknowledged without being stored.
     """
     try:
         # Get raw body for signature verification
         body = await request.body()
         
+        if not clerk_service.verify_webhook(body, request.headers):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid webhook signature"
+            )
+        
         # Parse JSON
         try:
             event_data = json.loads(body.decode('utf-8'))
@@ -39,48 +57,22 @@ async def handle_clerk_webhook(request: Request):
                 detail="Missing event type"
             )
         
-        logger.info(f"Processing Clerk webhook: {event_type}")
-        
-        # Handle different event types
-        if event_type == 'user.created':
-            user = clerk_service.handle_user_created(event_data)
-            if user:
-                logger.info(f"User created successfully: {user.clerk_user_id}")
-                return {"message": "User created successfully", "user_id": user.id}
-            else:
-                logger.error("Failed to create user from webhook")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to create user"
-                )
-        
-        elif event_type == 'user.updated':
-            user = clerk_service.handle_user_updated(event_data)
-            if user:
-                logger.info(f"User updated successfully: {user.clerk_user_id}")
-                return {"message": "User updated successfully", "user_id": user.id}
-            else:
-                logger.error("Failed to update user from webhook")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to update user"
-                )
-        
-        elif event_type == 'user.deleted':
-            success = clerk_service.handle_user_deleted(event_data)
-            if success:
-                logger.info("User deleted successfully")
-                return {"message": "User deleted successfully"}
-            else:
-                logger.error("Failed to delete user from webhook")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to delete user"
-                )
+        # Unsigned local deliveries have no svix-id: key them by their content
+        delivery_id = request.headers.get("svix-id") or f"sha256:{hashlib.sha256(body).hexdigest()}"
+        delivered_at = request.headers.get("svix-timestamp")
         
+        stored = await webhook_inbox.receive(
+            session,
+            delivery_id,
+            event_data,
+            int(delivered_at) if delivered_at and delivered_at.isdigit() else None
+        )
+        if not stored:
+            logger.info(f"Duplicate Clerk webhook delivery skipped: {delivery_id}")
         else:
-            logger.info(f"Unhandled webhook event type: {event_type}")
-            return {"message": f"Event type {event_type} received but not processed"}
+            logger.info(f"Queued Clerk webhook: {event_type} ({delivery_id})")
+        
+        return {"message": "Event received", "delivery_id": delivery_id, "duplicate": not stored}
     
     except HTTPException:
         raise
@@ -96,4 +88,4 @@ async def webhook_health():
     """
     Health check endpoint for webhooks
     """
-    return {"status": "healthy", "service": "webhooks"}
+    return {"status": "healthy", "service": "webhooks", "inbox": webhook_inbox.stats()}
@@ -1,11 +1,17 @@
 import logging
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from openai import AsyncOpenAI
 from dotenv import load_dotenv, find_dotenv
 import json
 import re
 
+from services.usage_tracker import AnalysisUsage
+from services.embeddings import HashedNgramEmbedder
+from services.skills_taxonomy import SkillTaxonomy
+from services.cv_ranker import tokenize
+from services.cv_sections import CVSection
+
 # Load environment variables
 env_path = find_dotenv()
 if env_path:
@@ -15,12 +21,18 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# Findings of a reviewed section that are sent back to the model when it re-scores a revised CV
+SECTION_FINDING_FIELDS = ("score", "summary", "keywords", "grammar_suggestions", "ats_issues", "ats_suggestions")
+
 class AIAnalyzer:
     """Service for AI-powered CV analysis using OpenAI"""
     
     def __init__(self):
         self.openai_client = None
         self.api_key = os.getenv("OPENAI_API_KEY")
+        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.embedder = HashedNgramEmbedder()
+        self.skills = SkillTaxonomy()
         
         if self.api_key:
             try:
@@ -34,49 +46,84 @@ class AIAnalyzer:
                 self.openai_client = None
         else:
             logger.warning("No OpenAI API key found. Will use mock analysis.")
+
+    @property
+    def active_model(self) -> Optional[str]:
+        """Model that analyses are produced with now, None when only the mock runs"""
+        return self.model if self.openai_client else None
     
-    async def analyze_cv(self, cv_text: str, job_description: str) -> Dict[str, Any]:
+    async def analyze_cv(
+        self,
+        cv_text: str,
+        job_description: str,
+        usage: Optional[AnalysisUsage] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze a CV against a job description
+
+        Args:
+            cv_text: Extracted CV text
+            job_description: Job description to analyze against
+            usage: Optional accumulator for token counts and stage timings
+
+        Returns:
+            Normalized analysis result
+        """
+        usage = usage or AnalysisUsage()
         try:
             if self.openai_client:
                 logger.info("Using OpenAI for CV analysis")
-                return await self._analyze_with_openai(cv_text, job_description)
+                return await self._analyze_with_openai(cv_text, job_description, usage)
             else:
                 logger.info("Using mock analysis (no OpenAI API key)")
-                return self._analyze_with_mock(cv_text, job_description)
+                return self._run_mock(cv_text, job_description, usage)
         except Exception as e:
             logger.error(f"Error in CV analysis: {str(e)}")
-            return self._analyze_with_mock(cv_text, job_description)
+            usage.fallback = True
+            return self._run_mock(cv_text, job_description, usage)
     
-    async def _analyze_with_openai(self, cv_text: str, job_description: str) -> Dict[str, Any]:
+    async def _analyze_with_openai(
+        self,
+        cv_text: str,
+        job_description: str,
+        usage: AnalysisUsage
+    ) -> Dict[str, Any]:
         """Analyze CV using OpenAI GPT"""
+        response_text = None
         try:
-            prompt = self._create_analysis_prompt(cv_text, job_description)
+            with usage.stage("prompt_build"):
+                prompt = self._create_analysis_prompt(cv_text, job_description)
+                usage.prompt_chars = len(prompt)
             
             # ✅ Use new API
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",   # consider gpt-4o / gpt-4o-mini for cost/perf
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert CV/resume analyst and career coach. 
-                        analyse headhunter, linkedin, and another sites to find patterns in job requirements and keywords, 
-                        Provide detailed, actionable feedback in the exact JSON format requested."""
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,
-            )
+            with usage.stage("llm"):
+                response = await self.openai_client.chat.completions.create(
+                    model=self.model,   # consider gpt-4o / gpt-4o-mini for cost/perf
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": """You are an expert CV/resume analyst and career coach. 
+                            analyse headhunter, linkedin, and another sites to find patterns in job requirements and keywords, 
+                            Provide detailed, actionable feedback in the exact JSON format requested."""
+                        },
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.2,
+                )
+            usage.record_completion(self.model, response)
             
             response_text = response.choices[0].message.content
             
-            
             # Extract JSON
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if not json_match:
-                raise ValueError("No valid JSON found in response")
+            with usage.stage("parse"):
+                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+                if not json_match:
+                    raise ValueError("No valid JSON found in response")
+                
+                analysis_result = json.loads(json_match.group())
             
-            analysis_result = json.loads(json_match.group())
-            return self._normalize_analysis_result(analysis_result)
+            with usage.stage("normalize"):
+                return self._normalize_analysis_result(analysis_result)
         
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse OpenAI response: {str(e)}")
@@ -86,27 +133,302 @@ class AIAnalyzer:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
 
+    async def analyze_sections(
+        self,
+        cv_text: str,
+        sections: List[CVSection],
+        job_description: str,
+        cached_findings: Dict[str, Dict[str, Any]],
+        usage: Optional[AnalysisUsage] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """
+        Analyze a CV section by section, reusing findings of unchanged sections
+
+        One model call reviews the sections without cached findings and scores
+        the whole CV from the findings of every section, so a first version
+        and its revisions are scored the same way.
+
+        Args:
+            cv_text: Full extracted CV text (used by the local fallback)
+            sections: The CV split into sections
+            job_description: Job description to analyze against
+            cached_findings: Findings by section hash from earlier versions
+            usage: Optional accumulator for token counts and stage timings
+
+        Returns:
+            The analysis result and the findings the model produced for
+            changed sections (local checks standing in for the model are not
+            returned, so they are never cached)
+        """
+        usage = usage or AnalysisUsage()
+        changed = [section for section in sections if section.hash not in cached_findings]
+        if self.openai_client:
+            try:
+                logger.info(f"Analyzing {len(changed)} of {len(sections)} CV sections with OpenAI")
+                return await self._analyze_sections_with_openai(sections, changed, cached_findings, job_description, usage)
+            except Exception as e:
+                logger.error(f"Error in section analysis: {str(e)}")
+                usage.fallback = True
+        else:
+            usage.model = usage.model or "mock"
+
+        findings = {**cached_findings, **{section.hash: self._mock_section_findings(section) for section in changed}}
+        with usage.stage("normalize"):
+            result = self._merge_section_findings(cv_text, sections, findings, job_description, changed)
+        return result, {}
+
+    async def _analyze_sections_with_openai(
+        self,
+        sections: List[CVSection],
+        changed: List[CVSection],
+        cached_findings: Dict[str, Dict[str, Any]],
+        job_description: str,
+        usage: AnalysisUsage
+    ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """One model call reviewing the changed sections and scoring the whole CV"""
+        with usage.stage("prompt_build"):
+            ids = {section.hash: f"s{index}" for index, section in enumerate(changed)}
+            blocks = []
+            for section in sections:
+                if section.hash in ids:
+                    blocks.append(f"[{ids[section.hash]}] {section.title}\n{section.text}")
+                else:
+                    reviewed = {key: cached_findings[section.hash].get(key) for key in SECTION_FINDING_FIELDS}
+                    blocks.append(f"[reviewed] {section.title}\n{json.dumps(reviewed)}")
+            section_blocks = "\n\n".join(blocks)
+            prompt = f"""
+Analyze this CV against the job description. The CV is split into sections: review every section
+with an id in brackets on its own, then score the whole CV from the findings of all sections,
+including the [reviewed] ones, which were analyzed before and are given by their findings only.
+
+Job Description:
+{job_description[:1000]}
+
+CV Sections:
+{section_blocks}
+
+Respond with JSON only, with an entry under "sections" for every section id in brackets:
+{{
+  "sections": {{
+    "s0": {{
+      "grammar_suggestions": ["suggestion1"],
+      "ats_issues": ["issue1"],
+      "ats_suggestions": ["suggestion1"],
+      "keywords": ["job description keyword found in this section"],
+      "score": 75,
+      "summary": "One sentence on this section"
+    }}
+  }},
+  "grammar_suggestions": ["suggestion1", "suggestion2"],
+  "keyword_match": {{
+    "matched": ["keyword1", "keyword2"],
+    "missing": ["keyword3", "keyword4"],
+    "score": 75
+  }},
+  "ats_compatibility": {{
+    "score": 80,
+    "issues": ["issue1", "issue2"],
+    "suggestions": ["suggestion1", "suggestion2"]
+  }},
+  "should_learn_technologys": ["technology 1", "technology 2"],
+  "overall_score": 78,
+  "summary": "Brief summary of the analysis"
+}}"""
+            usage.prompt_chars = len(prompt)
+
+        with usage.stage("llm"):
+            response = await self.openai_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are an expert CV/resume analyst. Provide actionable feedback in the exact JSON format requested."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+            )
+        usage.record_completion(self.model, response)
+
+        with usage.stage("parse"):
+            json_match = re.search(r'\{.*\}', response.choices[0].message.content, re.DOTALL)
+            if not json_match:
+                raise ValueError("No valid JSON found in response")
+            analysis_result = json.loads(json_match.group())
+            by_id = analysis_result.pop("sections", None) or {}
+
+        findings = {}
+        for section in changed:
+            raw = by_id.get(ids[section.hash])
+            if not isinstance(raw, dict):
+                logger.warning(f"Missing findings for CV section '{section.title}'")
+                continue
+            findings[section.hash] = {
+                "title": section.title,
+                "chars": len(section.text),
+                "grammar_suggestions": [str(item) for item in raw.get("grammar_suggestions", [])],
+                "ats_issues": [str(item) for item in raw.get("ats_issues", [])],
+                "ats_suggestions": [str(item) for item in raw.get("ats_suggestions", [])],
+                "keywords": [str(item) for item in raw.get("keywords", [])],
+                "score": max(0, min(100, int(raw.get("score", 0)))),
+                "summary": str(raw.get("summary", "")),
+            }
+
+        with usage.stage("normalize"):
+            return self._normalize_analysis_result(analysis_result), findings
+
+    def _mock_section_findings(self, section: CVSection) -> Dict[str, Any]:
+        """Local heuristics for one section when the model is unavailable"""
+        text = section.text.lower()
+        grammar, issues, suggestions = [], [], []
+        score = 70
+        if "responsible for" in text:
+            grammar.append(f"{section.title}: replace 'responsible for' with an action verb")
+            score -= 10
+        results_section = any(word in section.title.lower() for word in ("experience", "employment", "work", "project", "achievement"))
+        if results_section and not re.search(r"\d", text):
+            suggestions.append(f"{section.title}: add quantifiable results (numbers, percentages)")
+            score -= 10
+        if any(len(line) > 300 for line in section.text.splitlines()):
+            issues.append(f"{section.title}: very long lines may not parse well in ATS systems")
+            score -= 10
+        return {
+            "title": section.title,
+            "chars": len(section.text),
+            "grammar_suggestions": grammar,
+            "ats_issues": issues,
+            "ats_suggestions": suggestions,
+            "score": max(0, score),
+            "summary": (grammar + issues + suggestions or [f"{section.title}: no issues found"])[0] + ".",
+        }
+
+    def _merge_section_findings(
+        self,
+        cv_text: str,
+        sections: List[CVSection],
+        findings: Dict[str, Dict[str, Any]],
+        job_description: str,
+        changed: List[CVSection]
+    ) -> Dict[str, Any]:
+        """Combine per-section findings and full-text keyword matching into one result"""
+        ordered = [findings[section.hash] for section in sections if section.hash in findings]
+
+        def collect(key: str, limit: int) -> List[str]:
+            items = []
+            for finding in ordered:
+                for item in finding.get(key, []):
+                    if item not in items:
+                        items.append(item)
+            return items[:limit]
+
+        matched, missing, required = self._match_keywords(cv_text, job_description)
+        keyword_score = min(100, int((len(matched) / max(len(required), 1)) * 100))
+
+        total_chars = sum(finding.get("chars", 1) for finding in ordered) or 1
+        ats_score = round(sum(finding["score"] * finding.get("chars", 1) for finding in ordered) / total_chars)
+
+        weakest = min(ordered, key=lambda finding: finding["score"]) if ordered else None
+        summary = f"Your CV matches {len(matched)} out of {len(required)} key terms from the job description."
+        if weakest and weakest.get("summary"):
+            summary += f" Weakest section: {weakest['summary']}"
+        if changed and len(changed) < len(sections):
+            summary += f" Re-analyzed the changed sections: {', '.join(section.title for section in changed)}."
+
+        return self._normalize_analysis_result({
+            "grammar_suggestions": collect("grammar_suggestions", 10) or ["No grammar suggestions available"],
+            "keyword_match": {"matched": matched[:10], "missing": missing[:10], "score": keyword_score},
+            "ats_compatibility": {
+                "score": ats_score,
+                "issues": collect("ats_issues", 10),
+                "suggestions": collect("ats_suggestions", 10),
+            },
+            "should_learn_technologys": self._should_learn(missing),
+            "overall_score": (keyword_score + ats_score) // 2,
+            "summary": summary,
+        })
+
+    def semantic_similarity(self, cv_text: str, job_description: str) -> float:
+        """Cosine similarity of local n-gram embeddings, no API call"""
+        return float(self.embedder.embed(cv_text) @ self.embedder.embed(job_description))
+
+    async def rerank_candidates(
+        self,
+        job_description: str,
+        candidates: Dict[str, str],
+        usage: Optional[AnalysisUsage] = None
+    ) -> Optional[Dict[str, int]]:
+        """
+        Score how well each candidate CV fits a job description (0-100)
+
+        Args:
+            job_description: Job description to rank against
+            candidates: CV text by candidate id
+            usage: Optional accumulator for token counts and stage timings
+
+        Returns:
+            Fit score by candidate id, or None when no model is available
+        """
+        if not self.openai_client or not candidates:
+            return None
+
+        usage = usage or AnalysisUsage()
+        cv_blocks = "\n\n".join(
+            f"[{candidate_id}]\n{text[:2000]}" for candidate_id, text in candidates.items()
+        )
+        prompt = f"""Rate how well each CV fits the job description on a 0-100 scale.
+
+Job Description:
+{job_description[:1000]}
+
+CVs:
+{cv_blocks}
+
+Respond with JSON only, mapping every CV id in brackets to its score:
+{{"scores": {{"<id>": 85}}}}"""
+        usage.prompt_chars = len(prompt)
+
+        try:
+            with usage.stage("llm"):
+                response = await self.openai_client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are an experienced technical recruiter. Answer in the exact JSON format requested."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0,
+                )
+            usage.record_completion(self.model, response)
+
+            with usage.stage("parse"):
+                json_match = re.search(r'\{.*\}', response.choices[0].message.content, re.DOTALL)
+                if not json_match:
+                    raise ValueError("No valid JSON found in response")
+                scores = json.loads(json_match.group()).get("scores", {})
+
+            return {
+                candidate_id: max(0, min(100, int(scores[candidate_id])))
+                for candidate_id in candidates
+                if isinstance(scores.get(candidate_id), (int, float))
+            }
+        except Exception as e:
+            logger.error(f"Error re-ranking candidates: {str(e)}")
+            return None
+
+    def _run_mock(self, cv_text: str, job_description: str, usage: AnalysisUsage) -> Dict[str, Any]:
+        """Run the mock analysis, accounting it as a zero-token model call"""
+        usage.model = usage.model or "mock"
+        with usage.stage("llm"):
+            return self._analyze_with_mock(cv_text, job_description)
+
     
     def _analyze_with_mock(self, cv_text: str, job_description: str) -> Dict[str, Any]:
         """Provide mock analysis when OpenAI is not available"""
         logger.info("Providing mock analysis")
-        
-        # Simple keyword matching
-        cv_lower = cv_text.lower()
-        job_lower = job_description.lower()
-        
-        # Extract potential keywords from job description
-        job_words = set(word.lower() for word in job_lower.split() if len(word) > 3)
-        
-        # Find matches and missing keywords
-        matched_keywords = [word for word in job_words if word in cv_lower]
-        missing_keywords = list(job_words - set(matched_keywords))[:10]  # Limit to 10
-        
+
+        matched_keywords, missing_keywords, required = self._match_keywords(cv_text, job_description)
+
         # Calculate scores
-        keyword_score = min(100, int((len(matched_keywords) / max(len(job_words), 1)) * 100))
+        keyword_score = min(100, int((len(matched_keywords) / max(len(required), 1)) * 100))
         ats_score = max(50, keyword_score - 10)  # ATS score slightly lower
         overall_score = (keyword_score + ats_score) // 2
-        
+
         return {
             "grammar_suggestions": [
                 "Consider using more action verbs at the beginning of bullet points",
@@ -116,7 +438,7 @@ class AIAnalyzer:
             ],
             "keyword_match": {
                 "matched": matched_keywords[:10],
-                "missing": missing_keywords,
+                "missing": missing_keywords[:10],
                 "score": keyword_score
             },
             "ats_compatibility": {
@@ -134,17 +456,36 @@ class AIAnalyzer:
                     "Avoid complex formatting and graphics"
                 ]
             },
-            "improved_bullet_points": [
-                "Developed and maintained 5+ web applications using React and Node.js, improving user engagement by 30%",
-                "Collaborated with 8 cross-functional team members to deliver projects 20% ahead of schedule",
-                "Implemented CI/CD pipelines reducing deployment time from 2 hours to 15 minutes",
-                "Led technical architecture decisions for 3 major projects, resulting in 40% faster development cycles",
-                "Mentored 4 junior developers, improving team productivity by 25%"
-            ],
+            "should_learn_technologys": self._should_learn(missing_keywords),
             "overall_score": overall_score,
-            "summary": f"Good technical foundation with room for improvement in specificity and keyword optimization. Your CV matches {len(matched_keywords)} out of {len(job_words)} key terms from the job description. Focus on adding quantifiable achievements and industry-specific keywords to improve your ATS compatibility score."
+            "summary": f"Good technical foundation with room for improvement in specificity and keyword optimization. Your CV matches {len(matched_keywords)} out of {len(required)} key terms from the job description. Focus on adding quantifiable achievements and industry-specific keywords to improve your ATS compatibility score."
         }
     
+    def _match_keywords(self, cv_text: str, job_description: str) -> Tuple[List[str], List[str], List[str]]:
+        """Matched, missing and all required keywords of a job description"""
+        # Skills named in the job description, matched through the taxonomy aliases
+        matched, missing, required = self.skills.compare(cv_text, job_description)
+        if required:
+            return matched, missing, list(required)
+
+        # No known skills in the job description: fall back to its content words,
+        # counting near-variants in the CV ("managed" for "management") as matches
+        job_words = sorted(set(term for term in tokenize(job_description) if len(term) > 3))
+        cv_words = sorted(set(tokenize(cv_text)))
+        matched = [word for word in job_words if word in cv_words]
+        unmatched = [word for word in job_words if word not in cv_words]
+        matched += list(self.embedder.match_terms(unmatched, cv_words))
+        missing = [word for word in job_words if word not in matched]
+        return matched, missing, job_words
+
+    def _should_learn(self, missing_keywords: List[str]) -> List[str]:
+        """Missing technical skills worth learning for this job"""
+        should_learn = [
+            name for name in missing_keywords
+            if self.skills.categories.get(name, "Soft Skills") != "Soft Skills"
+        ][:5]
+        return should_learn or ["No specific technologies missing for this job description"]
+
     def _create_analysis_prompt(self, cv_text: str, job_description: str) -> str:
         """Create the prompt for OpenAI analysis"""
         return f"""
@@ -0,0 +1,88 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import CVContent, JobDescription
+from database.search import (
+    SNIPPET_WORDS, delete_statement, fts5_match, index_params, insert_statements, search_dialect,
+    search_statement, snippet
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisSearch:
+    """
+    Full-text search over a user's analyses
+
+    Indexes the job description, analysis summary, CV filename and CV text
+    of every analysis (SQLite FTS5 or Postgres tsvector, see database.search).
+    The index is maintained incrementally by a write-behind flush hook and
+    stores no text; excerpts of a page of hits are cut from the stored texts.
+    """
+
+    async def index_batch(self, session: AsyncSession, batch: List[Any]):
+        """Write-behind flush hook: add the batch's analyses to the index"""
+        dialect = search_dialect(session.bind)
+        rows = []
+        for item in batch:
+            analysis = item.analysis_row
+            if analysis.user_id is None:
+                continue  # search is always scoped to a user
+            rows.append(index_params(
+                dialect,
+                analysis_id=analysis.id,
+                user_id=analysis.user_id,
+                filename=item.cv_row.filename,
+                job_description=item.jd_text or analysis.job_description,
+                summary=(analysis.analysis or {}).get("summary"),
+                cv_text=item.cv_text or item.cv_row.file_content,
+            ))
+        if rows:
+            for statement in insert_statements(dialect):
+                await session.execute(statement, rows)
+
+    async def remove(self, session: AsyncSession, analysis_id: str):
+        await session.execute(delete_statement(search_dialect(session.bind)), {"analysis_id": analysis_id})
+
+    async def search(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        query: str,
+        limit: int,
+        offset: int
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Best-ranked matches first; returns one page and whether more follow"""
+        dialect = search_dialect(session.bind)
+        params = {"user_id": user_id, "query": query, "limit": limit + 1, "offset": offset}
+        if dialect == "sqlite":
+            params["match"] = fts5_match(user_id, query)
+            if params["match"] is None:
+                return [], False
+
+        rows = (await session.execute(search_statement(dialect), params)).mappings().all()
+        hits = [dict(row) for row in rows[:limit]]
+        await self._add_snippets(session, hits, query)
+        return hits, len(rows) > limit
+
+    async def _add_snippets(self, session: AsyncSession, hits: List[Dict[str, Any]], query: str):
+        """Job description and CV text excerpts of a page of hits"""
+        jd_hashes = {hit["jd_hash"] for hit in hits if hit["jd_hash"]}
+        cv_hashes = {hit["cv_hash"] for hit in hits if hit["cv_hash"]}
+        jd_texts = dict((await session.exec(
+            select(JobDescription.hash, JobDescription.text).where(JobDescription.hash.in_(jd_hashes))
+        )).all()) if jd_hashes else {}
+        cv_texts = dict((await session.exec(
+            select(CVContent.hash, CVContent.content).where(CVContent.hash.in_(cv_hashes))
+        )).all()) if cv_hashes else {}
+
+        for hit in hits:
+            legacy_job_description = hit.pop("legacy_job_description")
+            job_description = jd_texts.get(hit.pop("jd_hash")) or legacy_job_description
+            hit["job_description"] = snippet(job_description, query) or (
+                " ".join(job_description.split()[:SNIPPET_WORDS]) if job_description else None
+            )
+            hit["cv_snippet"] = snippet(cv_texts.get(hit.pop("cv_hash")), query)
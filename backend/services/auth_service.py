@@ -3,7 +3,14 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.model import User, normalize_email
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
+from services.revocation_store import RevocationStore
+from services.ttl_cache import TTLCache
 from dotenv import load_dotenv
 import uuid
 
@@ -12,8 +19,21 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Columns returned to clients (never the password hash)
+_PUBLIC_FIELDS = ("email", "first_name", "last_name", "is_active", "created_at", "updated_at")
+
 class AuthService:
-    """Service for handling authentication and user management"""
+    """
+    Service for handling authentication and user management
+
+    Users live in the `User` table, looked up by lowercased email through its
+    unique index, so any worker can authenticate any user. Profiles are
+    cached read-through for AUTH_USER_CACHE_TTL seconds; writes made through
+    this service invalidate the local entry, other workers see them on
+    expiry. Password hashes are never cached: logins and password changes
+    read the hash and `is_active` from the database, so a change on one
+    worker applies to all of them at once.
+    """
     
     def __init__(self):
         # JWT configuration
@@ -21,43 +41,94 @@ class AuthService:
         self.algorithm = "HS256"
         self.access_token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
         
-        # Password hashing
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        # Password hashing runs on a bounded executor, off the event loop
+        self.password_hasher = PasswordHasher()
         
-        # In-memory user storage (replace with database in production)
-        self.users = {}
-        self.blacklisted_tokens = set()
-        
-        # Initialize with a test user
-        self._create_test_user()
+        # User rows by email, read through from the database
+        self.user_cache: TTLCache[Dict[str, Any]] = TTLCache(
+            max_entries=int(os.getenv("AUTH_USER_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("AUTH_USER_CACHE_TTL", "30")),
+        )
+        # Revoked tokens by jti, kept only until they expire
+        self.revocations = RevocationStore()
+        self.create_test_user = os.getenv("CREATE_TEST_USER", "true").lower() == "true"
     
-    def _create_test_user(self):
-        """Create a test user for development"""
-        test_user = {
-            "id": str(uuid.uuid4()),
-            "email": "test@example.com",
-            "first_name": "Test",
-            "last_name": "User",
-            "hashed_password": self.pwd_context.hash("password123"),
-            "is_active": True,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        self.users[test_user["email"]] = test_user
-        logger.info("Test user created: test@example.com / password123")
+    async def ensure_test_user(self, session: AsyncSession):
+        """Create the development test user if it does not exist yet"""
+        if not self.create_test_user or await self._load_user(session, "test@example.com"):
+            return
+        try:
+            await self._insert_user(session, {
+                "email": "test@example.com",
+                "first_name": "Test",
+                "last_name": "User",
+                "hashed_password": await self.get_password_hash("password123"),
+            })
+            logger.info("Test user created: test@example.com / password123")
+        except IntegrityError:
+            # Another worker created it first
+            await session.rollback()
+
+    @staticmethod
+    def _normalize_email(email: str) -> str:
+        return normalize_email(email)
+
+    @staticmethod
+    def _to_response(user: Dict[str, Any]) -> Dict[str, Any]:
+        """User without its password hash, in the shape of UserResponse"""
+        return {"id": str(user["id"]), **{field: user[field] for field in _PUBLIC_FIELDS}}
+
+    async def _load_user(self, session: AsyncSession, email: str) -> Optional[Dict[str, Any]]:
+        email = self._normalize_email(email)
+        user = self.user_cache.get(email)
+        if user is None:
+            row = (await session.exec(select(User).where(User.email == email))).first()
+            if row is None:
+                return None
+            user = row.model_dump(exclude={"hashed_password"})
+            self.user_cache.set(email, user)
+        return user
+
+    async def _load_credentials(self, session: AsyncSession, email: str) -> Optional[Dict[str, Any]]:
+        """The user's row with its password hash, always read from the database"""
+        row = (await session.exec(select(User).where(User.email == self._normalize_email(email)))).first()
+        return row.model_dump() if row else None
+
+    async def _insert_user(self, session: AsyncSession, fields: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        row = User(
+            # Local accounts have no Clerk identity; the column is unique and required
+            clerk_user_id=f"local_{uuid.uuid4().hex}",
+            is_active=True,
+            created_at=now,
+            updated_at=now,
+            **fields
+        )
+        session.add(row)
+        await session.commit()
+        await session.refresh(row)
+        return row.model_dump()
+
+    async def _update_user(self, session: AsyncSession, email: str, values: Dict[str, Any]):
+        email = self._normalize_email(email)
+        await session.execute(update(User).where(User.email == email).values(**values))
+        await session.commit()
+        self.user_cache.invalidate(email)
     
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a password against its hash"""
         try:
-            return self.pwd_context.verify(plain_password, hashed_password)
+            return await self.password_hasher.verify(plain_password, hashed_password)
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             logger.error(f"Error verifying password: {str(e)}")
             return False
     
-    def get_password_hash(self, password: str) -> str:
+    async def get_password_hash(self, password: str) -> str:
         """Hash a password"""
         try:
-            return self.pwd_context.hash(password)
+            return await self.password_hasher.hash(password)
         except Exception as e:
             logger.error(f"Error hashing password: {str(e)}")
             raise
@@ -67,7 +138,7 @@ class AuthService:
         try:
             to_encode = data.copy()
             expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire_minutes)
-            to_encode.update({"exp": expire})
+            to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
             
             encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
             logger.info(f"Access token created for user: {data.get('sub', 'unknown')}")
@@ -78,15 +149,16 @@ class AuthService:
             logger.error(f"Error creating access token: {str(e)}")
             raise
     
-    def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
+    async def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Verify and decode a JWT token"""
         try:
-            # Check if token is blacklisted
-            if token in self.blacklisted_tokens:
-                logger.warning("Token is blacklisted")
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            
+            # Tokens issued before jti was added are revoked by their full value
+            if await self.revocations.is_revoked(payload.get("jti") or token):
+                logger.warning("Token has been revoked")
                 return None
             
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
             email: str = payload.get("sub")
             
             if email is None:
@@ -102,51 +174,40 @@ class AuthService:
             logger.error(f"Error verifying token: {str(e)}")
             return None
     
-    def user_exists(self, email: str) -> bool:
+    async def user_exists(self, session: AsyncSession, email: str) -> bool:
         """Check if a user exists"""
-        return email in self.users
+        return await self._load_user(session, email) is not None
     
-    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_user(self, session: AsyncSession, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user"""
         try:
             # Check if passwords match
             if user_data.get("password") != user_data.get("confirm_password"):
                 raise ValueError("Passwords do not match")
             
-            # Create user object
-            user = {
-                "id": str(uuid.uuid4()),
-                "email": user_data["email"],
+            user = await self._insert_user(session, {
+                "email": self._normalize_email(user_data["email"]),
                 "first_name": user_data["first_name"],
                 "last_name": user_data["last_name"],
-                "hashed_password": self.get_password_hash(user_data["password"]),
-                "is_active": True,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            
-            # Store user
-            self.users[user["email"]] = user
+                "hashed_password": await self.get_password_hash(user_data["password"]),
+            })
             
-            # Return user without password
-            user_response = {k: v for k, v in user.items() if k != "hashed_password"}
             logger.info(f"User created successfully: {user['email']}")
-            
-            return user_response
+            return self._to_response(user)
             
         except Exception as e:
             logger.error(f"Error creating user: {str(e)}")
             raise
     
-    def authenticate_user(self, email: str, password: str) -> Optional[Dict[str, Any]]:
+    async def authenticate_user(self, session: AsyncSession, email: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate a user with email and password"""
         try:
-            user = self.users.get(email)
-            if not user:
+            user = await self._load_credentials(session, email)
+            if not user or not user["hashed_password"]:
                 logger.warning(f"Authentication failed: user not found - {email}")
                 return None
             
-            if not self.verify_password(password, user["hashed_password"]):
+            if not await self.verify_password(password, user["hashed_password"]):
                 logger.warning(f"Authentication failed: invalid password - {email}")
                 return None
             
@@ -154,20 +215,25 @@ class AuthService:
                 logger.warning(f"Authentication failed: user inactive - {email}")
                 return None
             
-            # Return user without password
-            user_response = {k: v for k, v in user.items() if k != "hashed_password"}
-            logger.info(f"User authenticated successfully: {email}")
+            # Upgrade the stored hash to the configured cost factor while the password is at hand
+            if self.password_hasher.rehash_on_login and self.password_hasher.needs_rehash(user["hashed_password"]):
+                await self._update_user(session, email, {"hashed_password": await self.get_password_hash(password)})
+                self.password_hasher.rehashed += 1
+                logger.info(f"Password rehashed with {self.password_hasher.rounds} rounds: {email}")
             
-            return user_response
+            logger.info(f"User authenticated successfully: {email}")
+            return self._to_response(user)
             
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             logger.error(f"Error authenticating user: {str(e)}")
             return None
     
-    def get_current_user(self, token: str) -> Optional[Dict[str, Any]]:
+    async def get_current_user(self, session: AsyncSession, token: str) -> Optional[Dict[str, Any]]:
         """Get current user from token"""
         try:
-            payload = self.verify_token(token)
+            payload = await self.verify_token(token)
             if payload is None:
                 return None
             
@@ -175,32 +241,34 @@ class AuthService:
             if email is None:
                 return None
             
-            user = self.users.get(email)
+            user = await self._load_user(session, email)
             if user is None:
                 return None
             
-            # Return user without password
-            user_response = {k: v for k, v in user.items() if k != "hashed_password"}
-            return user_response
+            return self._to_response(user)
             
         except Exception as e:
             logger.error(f"Error getting current user: {str(e)}")
             return None
     
-    def invalidate_token(self, token: str) -> bool:
-        """Add token to blacklist"""
+    async def invalidate_token(self, token: str) -> bool:
+        """Revoke a token until it expires"""
         try:
-            self.blacklisted_tokens.add(token)
-            logger.info("Token blacklisted successfully")
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm], options={"verify_exp": False})
+            await self.revocations.revoke(payload.get("jti") or token, int(payload["exp"]))
+            logger.info("Token revoked successfully")
             return True
+        except JWTError as e:
+            logger.warning(f"Not revoking invalid token: {str(e)}")
+            return False
         except Exception as e:
-            logger.error(f"Error blacklisting token: {str(e)}")
+            logger.error(f"Error revoking token: {str(e)}")
             return False
     
-    def refresh_token(self, token: str) -> Optional[str]:
+    async def refresh_token(self, token: str) -> Optional[str]:
         """Refresh an access token"""
         try:
-            payload = self.verify_token(token)
+            payload = await self.verify_token(token)
             if payload is None:
                 return None
             
@@ -214,46 +282,42 @@ class AuthService:
             logger.error(f"Error refreshing token: {str(e)}")
             return None
     
-    def update_user(self, email: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def update_user(self, session: AsyncSession, email: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update user information"""
         try:
-            user = self.users.get(email)
-            if not user:
+            if not await self._load_user(session, email):
                 return None
             
             # Update allowed fields
             allowed_fields = ["first_name", "last_name"]
-            for field in allowed_fields:
-                if field in update_data:
-                    user[field] = update_data[field]
+            values = {field: update_data[field] for field in allowed_fields if field in update_data}
+            values["updated_at"] = datetime.utcnow()
+            await self._update_user(session, email, values)
             
-            user["updated_at"] = datetime.utcnow()
-            
-            # Return updated user without password
-            user_response = {k: v for k, v in user.items() if k != "hashed_password"}
             logger.info(f"User updated successfully: {email}")
-            
-            return user_response
+            return self._to_response(await self._load_user(session, email))
             
         except Exception as e:
             logger.error(f"Error updating user: {str(e)}")
             return None
     
-    def change_password(self, email: str, current_password: str, new_password: str) -> bool:
+    async def change_password(self, session: AsyncSession, email: str, current_password: str, new_password: str) -> bool:
         """Change user password"""
         try:
-            user = self.users.get(email)
-            if not user:
+            user = await self._load_credentials(session, email)
+            if not user or not user["hashed_password"]:
                 return False
             
             # Verify current password
-            if not self.verify_password(current_password, user["hashed_password"]):
+            if not await self.verify_password(current_password, user["hashed_password"]):
                 logger.warning(f"Password change failed: invalid current password - {email}")
                 return False
             
             # Update password
-            user["hashed_password"] = self.get_password_hash(new_password)
-            user["updated_at"] = datetime.utcnow()
+            await self._update_user(session, email, {
+                "hashed_password": await self.get_password_hash(new_password),
+                "updated_at": datetime.utcnow()
+            })
             
             logger.info(f"Password changed successfully for user: {email}")
             return True
@@ -262,15 +326,13 @@ class AuthService:
             logger.error(f"Error changing password: {str(e)}")
             return False
     
-    def deactivate_user(self, email: str) -> bool:
+    async def deactivate_user(self, session: AsyncSession, email: str) -> bool:
         """Deactivate a user account"""
         try:
-            user = self.users.get(email)
-            if not user:
+            if not await self._load_user(session, email):
                 return False
             
-            user["is_active"] = False
-            user["updated_at"] = datetime.utcnow()
+            await self._update_user(session, email, {"is_active": False, "updated_at": datetime.utcnow()})
             
             logger.info(f"User deactivated: {email}")
             return True
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from services.cv_processor import CVProcessor
+from services.file_validator import SNIFF_BYTES, FileValidator
+
+logger = logging.getLogger(__name__)
+
+# Archive members that are never CVs (macOS resource forks)
+IGNORED_DIRECTORY = "__MACOSX/"
+
+_cv_processor = CVProcessor()
+_file_validator = FileValidator()
+
+
+def _read_entry(archive_path: str, entry_name: str) -> Tuple[bytes, str, Optional[str]]:
+    """Decompress one member; returns its bytes, SHA-256 and sniffed type"""
+    with zipfile.ZipFile(archive_path) as archive:
+        # ZipExtFile stops at the member's declared size, which was checked against the caps
+        with archive.open(entry_name) as member:
+            data = member.read()
+    detected_type = _file_validator.sniff_type(data[:SNIFF_BYTES])
+    if detected_type == ".docx" and not _file_validator.is_docx_archive(io.BytesIO(data)):
+        detected_type = None
+    return data, hashlib.sha256(data).hexdigest(), detected_type
+
+
+def _extract(data: bytes, content_type: str) -> Optional[str]:
+    return _cv_processor.extract_bytes(data, content_type)
+
+
+@dataclass
+class ArchiveEntry:
+    """A member of an uploaded archive, checked from the central directory only"""
+    index: int
+    name: str
+    member: str
+    size: int
+    error: Optional[str] = None
+
+
+class ArchiveValidator(FileValidator):
+    """FileValidator for the ZIP archive itself (the members are CVs)"""
+
+    def __init__(self, max_archive_size: int):
+        super().__init__()
+        self.max_file_size = max_archive_size
+        self.allowed_types = {
+            'application/zip': ['.zip'],
+            'application/x-zip-compressed': ['.zip'],
+        }
+        self.allowed_extensions = ['.zip']
+
+    def sniff_type(self, head: bytes) -> Optional[str]:
+        return '.zip' if head.startswith(b'PK\x03\x04') else None
+
+
+class BulkAnalyzer:
+    """
+    Reading, checking and text extraction for bulk ZIP uploads
+
+    The archive is opened through its central directory only; members are
+    decompressed one at a time, straight into memory, when a worker picks
+    them up. Zip-bomb caps are applied to the declared sizes before anything
+    is decompressed (zipfile never yields more than a member's declared
+    size): at most BULK_MAX_FILES members, each within the CV size limit
+    and BULK_MAX_COMPRESSION_RATIO, and BULK_MAX_TOTAL_BYTES in total.
+    Decompression and extraction run on a dedicated executor (threads by
+    default, BULK_EXTRACT_EXECUTOR=process for a process pool) with
+    BULK_EXTRACT_WORKERS workers; BULK_ANALYSIS_CONCURRENCY bounds how many
+    members are in the pipeline at once.
+    """
+
+    def __init__(
+        self,
+        validator: Optional[FileValidator] = None,
+        max_files: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+        max_ratio: Optional[float] = None,
+        max_archive_bytes: Optional[int] = None,
+        workers: Optional[int] = None,
+        executor_kind: Optional[str] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.validator = validator or FileValidator()
+        self.max_files = max_files or int(os.getenv("BULK_MAX_FILES", "200"))
+        self.max_total_bytes = max_total_bytes or int(os.getenv("BULK_MAX_TOTAL_BYTES", str(500 * 1024 * 1024)))
+        self.max_ratio = max_ratio or float(os.getenv("BULK_MAX_COMPRESSION_RATIO", "100"))
+        self.max_archive_bytes = max_archive_bytes or int(os.getenv("BULK_MAX_ARCHIVE_BYTES", str(200 * 1024 * 1024)))
+        self.workers = workers or int(os.getenv("BULK_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.executor_kind = executor_kind or os.getenv("BULK_EXTRACT_EXECUTOR", "thread")
+        self.concurrency = concurrency or int(os.getenv("BULK_ANALYSIS_CONCURRENCY", "4"))
+        self.archive_validator = ArchiveValidator(self.max_archive_bytes)
+
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-extract")
+        return self._executor
+
+    def list_entries(self, archive_path: str) -> List[ArchiveEntry]:
+        """
+        CV members of an archive with per-member problems filled in
+
+        Raises ValueError when the archive as a whole is unreadable or over
+        the file-count or total-size caps.
+        """
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                infos = archive.infolist()
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Not a readable ZIP archive: {str(e)}")
+
+        # Skip directories, resource forks and hidden files such as .DS_Store
+        members = [
+            info for info in infos
+            if not info.is_dir() and not info.filename.startswith(IGNORED_DIRECTORY)
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+        if len(members) > self.max_files:
+            raise ValueError(f"Archive has {len(members)} files; the limit is {self.max_files}")
+
+        entries: List[ArchiveEntry] = []
+        total = 0
+        for index, info in enumerate(members):
+            name = self.validator.sanitize_filename(info.filename)
+            entry = ArchiveEntry(index=index, name=name, member=info.filename, size=info.file_size)
+            extension = os.path.splitext(name)[1].lower()
+            # Members carry no declared MIME type; the extension implies one
+            if not self.validator.is_valid_upload(name, self.validator.mime_type_for(extension)):
+                entry.error = self.validator.type_error
+            elif info.flag_bits & 0x1:
+                entry.error = "Encrypted files are not supported"
+            elif info.file_size > self.validator.max_file_size:
+                entry.error = self.validator.size_error
+            elif info.file_size < self.validator.min_file_size:
+                entry.error = f"File is too small ({info.file_size} bytes)"
+            elif info.file_size > self.max_ratio * max(info.compress_size, 1):
+                entry.error = f"Compression ratio above {self.max_ratio:g}:1"
+            else:
+                total += info.file_size
+            entries.append(entry)
+
+        if total > self.max_total_bytes:
+            raise ValueError(f"Archive expands to {total} bytes; the limit is {self.max_total_bytes}")
+        return entries
+
+    async def read_entry(self, archive_path: str, entry: ArchiveEntry) -> Tuple[bytes, str, Optional[str]]:
+        """Decompress a member on the executor; returns its bytes, SHA-256 and sniffed type"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), _read_entry, archive_path, entry.member
+        )
+
+    async def extract(self, data: bytes, content_type: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), _extract, data, content_type)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
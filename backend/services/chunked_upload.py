@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from services.file_validator import SNIFF_BYTES, FileValidator
+from services.upload_stream import ReceivedUpload, UploadRejected
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+MANIFEST = "manifest.json"
+# How often the background task removes expired sessions
+PURGE_INTERVAL_SECONDS = 600
+
+
+@dataclass
+class UploadSession:
+    """A resumable upload: the declared file and how it is cut into chunks"""
+    upload_id: str
+    filename: str
+    content_type: Optional[str]
+    size: int
+    chunk_size: int
+    created_at: float
+
+    @property
+    def chunk_count(self) -> int:
+        return (self.size + self.chunk_size - 1) // self.chunk_size
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+class ChunkedUploadStore:
+    """
+    On-disk state of resumable uploads
+
+    Each session is a directory under CHUNKED_UPLOAD_DIR holding a manifest
+    (file name, type, size, chunk size) and one file per received chunk,
+    named "{index}.{sha256}". Chunks are written to a temporary name and
+    renamed, so the directory listing is the upload state and concurrent
+    or repeated PUTs need no locking; a chunk already stored with the same
+    checksum is not written again. The declared name, type and size are
+    validated when the session is created and the content signature with
+    the first chunk, so a bad file is refused before the rest is sent.
+    Sessions expire after CHUNKED_UPLOAD_TTL_HOURS and are removed by a
+    background task (start/stop); at most CHUNKED_UPLOAD_MAX_SESSIONS are
+    open at once. Methods here block on the filesystem; call them from a
+    thread in async code.
+    """
+
+    def __init__(
+        self,
+        validator: Optional[FileValidator] = None,
+        root: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        ttl_hours: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+        purge_interval: float = PURGE_INTERVAL_SECONDS
+    ):
+        self.validator = validator or FileValidator()
+        self.root = root or os.getenv("CHUNKED_UPLOAD_DIR", "./chunked_uploads")
+        self.chunk_size = chunk_size or int(os.getenv("CHUNKED_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+        self.ttl = 3600 * (ttl_hours or float(os.getenv("CHUNKED_UPLOAD_TTL_HOURS", "24")))
+        self.max_sessions = max_sessions or int(os.getenv("CHUNKED_UPLOAD_MAX_SESSIONS", "1000"))
+        self.purge_interval = purge_interval
+        # Serializes the open-session count with the directory it admits
+        self._create_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="chunked-upload-purge")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.purge_expired)
+            except Exception as e:
+                logger.error(f"Error purging chunked uploads: {str(e)}")
+            await asyncio.sleep(self.purge_interval)
+
+    def _directory(self, upload_id: str) -> str:
+        return os.path.join(self.root, upload_id)
+
+    def create(self, filename: str, content_type: Optional[str], size: int) -> UploadSession:
+        if not self.validator.is_valid_upload(filename, content_type):
+            raise UploadRejected(400, self.validator.type_error)
+        if size > self.validator.max_file_size:
+            raise UploadRejected(413, self.validator.size_error)
+        if size < self.validator.min_file_size:
+            raise UploadRejected(400, f"File is too small ({size} bytes)")
+
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            filename=self.validator.sanitize_filename(filename),
+            content_type=content_type,
+            size=size,
+            chunk_size=self.chunk_size,
+            created_at=time.time(),
+        )
+        directory = self._directory(session.upload_id)
+        with self._create_lock:
+            if self.open_sessions() >= self.max_sessions:
+                # Expired sessions may still hold slots until the next periodic purge
+                self.purge_expired()
+                if self.open_sessions() >= self.max_sessions:
+                    raise UploadRejected(429, "Too many uploads in progress; try again later")
+            os.makedirs(directory)
+            with open(os.path.join(directory, MANIFEST), "w") as f:
+                json.dump(asdict(session), f)
+        return session
+
+    def open_sessions(self) -> int:
+        try:
+            return sum(1 for name in os.listdir(self.root) if UPLOAD_ID_PATTERN.match(name))
+        except FileNotFoundError:
+            return 0
+
+    def get(self, upload_id: str) -> UploadSession:
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadRejected(404, "Upload not found")
+        try:
+            with open(os.path.join(self._directory(upload_id), MANIFEST)) as f:
+                session = UploadSession(**json.load(f))
+        except FileNotFoundError:
+            raise UploadRejected(404, "Upload not found")
+        if time.time() - session.created_at > self.ttl:
+            self.discard(upload_id)
+            raise UploadRejected(404, "Upload expired")
+        return session
+
+    def received(self, session: UploadSession) -> Dict[int, str]:
+        """Checksums of the stored chunks by chunk index"""
+        chunks: Dict[int, str] = {}
+        for name in os.listdir(self._directory(session.upload_id)):
+            index, _, checksum = name.partition(".")
+            if index.isdigit() and len(checksum) == 64:
+                chunks[int(index)] = checksum
+        return chunks
+
+    def write_chunk(
+        self,
+        session: UploadSession,
+        offset: int,
+        data: bytes,
+        expected_sha256: Optional[str] = None
+    ) -> Tuple[int, str]:
+        """Store the chunk starting at `offset`; returns its index and SHA-256"""
+        if offset % session.chunk_size or not 0 <= offset < session.size:
+            raise UploadRejected(400, f"Offset must be a multiple of {session.chunk_size} below {session.size}")
+        index = offset // session.chunk_size
+        if len(data) != session.chunk_length(index):
+            raise UploadRejected(400, f"Chunk {index} must be {session.chunk_length(index)} bytes, got {len(data)}")
+
+        checksum = hashlib.sha256(data).hexdigest()
+        if expected_sha256 and expected_sha256.lower() != checksum:
+            raise UploadRejected(400, f"Chunk {index} checksum mismatch")
+        if index == 0 and self.validator.sniff_type(data[:SNIFF_BYTES]) is None:
+            self.discard(session.upload_id)
+            raise UploadRejected(400, self.validator.content_error)
+
+        previous = self.received(session).get(index)
+        if previous == checksum:
+            return index, checksum
+        directory = self._directory(session.upload_id)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as f:
+            f.write(data)
+        os.replace(f.name, os.path.join(directory, f"{index}.{checksum}"))
+        if previous is not None:
+            os.unlink(os.path.join(directory, f"{index}.{previous}"))
+        return index, checksum
+
+    def missing(self, session: UploadSession) -> List[int]:
+        received = self.received(session)
+        return [index for index in range(session.chunk_count) if index not in received]
+
+    def assemble(self, session: UploadSession) -> ReceivedUpload:
+        """
+        Concatenate the chunks into one temporary file (blocking)
+
+        Each chunk is checked against the checksum it was stored under and
+        the file's SHA-256 is computed in the same pass.
+        """
+        missing = self.missing(session)
+        if missing:
+            raise UploadRejected(409, f"Missing chunks: {missing[:20]}")
+
+        directory = self._directory(session.upload_id)
+        received = self.received(session)
+        file_hash = hashlib.sha256()
+        head = b""
+        extension = os.path.splitext(session.filename)[1].lower()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as output:
+            try:
+                for index in range(session.chunk_count):
+                    with open(os.path.join(directory, f"{index}.{received[index]}"), "rb") as f:
+                        data = f.read()
+                    if hashlib.sha256(data).hexdigest() != received[index]:
+                        os.unlink(f.name)
+                        raise UploadRejected(409, f"Chunk {index} is corrupt; upload it again")
+                    if index == 0:
+                        head = data[:SNIFF_BYTES]
+                    file_hash.update(data)
+                    output.write(data)
+            except Exception:
+                output.close()
+                os.unlink(output.name)
+                raise
+
+        upload = ReceivedUpload(
+            filename=session.filename,
+            content_type=session.content_type,
+            path=output.name,
+            size=session.size,
+            sha256=file_hash.hexdigest(),
+            detected_type=self.validator.sniff_type(head),
+        )
+        if upload.detected_type == ".docx" and not self.validator.is_docx_archive(upload.path):
+            upload.detected_type = None
+        if upload.detected_type is None:
+            upload.cleanup()
+            raise UploadRejected(400, self.validator.content_error)
+        return upload
+
+    def discard(self, upload_id: str):
+        shutil.rmtree(self._directory(upload_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """Remove sessions past their TTL; returns how many were removed"""
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        for upload_id in os.listdir(self.root):
+            if not UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            manifest = os.path.join(self.root, upload_id, MANIFEST)
+            try:
+                expired = time.time() - os.path.getmtime(manifest) > self.ttl
+            except OSError:
+                expired = True
+            if expired:
+                self.discard(upload_id)
+                removed += 1
+                logger.info(f"Removed expired chunked upload {upload_id}")
+        return removed
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+
+from services.clerk_service import CLERK_API_BASE
+from services.http_client import HTTPClient
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# Clerk signs session tokens with RS256 only; anything else is rejected before key lookup
+ALLOWED_ALGORITHMS = ["RS256"]
+
+
+class TokenVerificationError(Exception):
+    """A session token that is malformed, expired or not signed by a known key"""
+
+
+class ClerkJWTVerifier:
+    """
+    Local verification of Clerk session JWTs against a cached JWKS
+
+    The JWKS is fetched once and kept in memory as constructed public keys
+    indexed by `kid`, so verifying a token is a signature check plus claim
+    validation, with no network call. A background task refreshes the set
+    every CLERK_JWKS_REFRESH_SECONDS; a token signed with an unknown `kid`
+    (key rotation) triggers an early refresh, at most once per
+    CLERK_JWKS_MIN_REFETCH_SECONDS so forged kids cannot hammer Clerk.
+    `exp`/`nbf`/`iat` are checked with CLERK_JWT_LEEWAY seconds of clock skew.
+
+    Verified claims are cached by the SHA-256 of the token for up to
+    CLERK_TOKEN_CACHE_TTL seconds, never past the token's `exp`.
+    """
+
+    def __init__(
+        self,
+        jwks_url: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        issuer: Optional[str] = None,
+        authorized_parties: Optional[List[str]] = None,
+        leeway: Optional[int] = None,
+        refresh_interval: Optional[float] = None,
+        min_refetch_interval: Optional[float] = None,
+        token_cache: Optional[TTLCache] = None,
+        http_client: Optional[HTTPClient] = None
+    ):
+        self.jwks_url = jwks_url or os.getenv("CLERK_JWKS_URL") or f"{CLERK_API_BASE}/jwks"
+        self.secret_key = secret_key if secret_key is not None else os.getenv("CLERK_SECRET_KEY", "")
+        self.issuer = issuer if issuer is not None else os.getenv("CLERK_ISSUER") or None
+        if authorized_parties is None:
+            authorized_parties = [party.strip() for party in os.getenv("CLERK_AUTHORIZED_PARTIES", "").split(",") if party.strip()]
+        self.authorized_parties = authorized_parties
+        self.leeway = leeway if leeway is not None else int(os.getenv("CLERK_JWT_LEEWAY", "5"))
+        self.refresh_interval = refresh_interval or float(os.getenv("CLERK_JWKS_REFRESH_SECONDS", "3600"))
+        self.min_refetch_interval = min_refetch_interval if min_refetch_interval is not None else float(os.getenv("CLERK_JWKS_MIN_REFETCH_SECONDS", "30"))
+
+        self.http_client = http_client or HTTPClient()
+        self.token_cache = token_cache or TTLCache(
+            max_entries=int(os.getenv("CLERK_TOKEN_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("CLERK_TOKEN_CACHE_TTL", "60")),
+        )
+
+        self._keys: Dict[str, Key] = {}
+        self._fetched_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def key_ids(self) -> List[str]:
+        return list(self._keys)
+
+    async def _fetch_jwks(self) -> Dict[str, Any]:
+        # The secret key only goes to the Clerk Backend API, not to a frontend JWKS URL
+        headers = {"Authorization": f"Bearer {self.secret_key}"} if self.secret_key and self.jwks_url.startswith(CLERK_API_BASE) else {}
+        response = await self.http_client.get(self.jwks_url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def refresh(self, force: bool = True) -> bool:
+        """
+        Replace the cached keys with the current JWKS
+
+        Without `force`, skips the fetch if the set was fetched less than
+        min_refetch_interval ago. Returns whether a fetch happened; on
+        failure the previous keys stay in use.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not force and time.monotonic() - self._fetched_at < self.min_refetch_interval:
+                return False
+            try:
+                jwks = await self._fetch_jwks()
+            except Exception as e:
+                logger.error(f"Failed to fetch Clerk JWKS from {self.jwks_url}: {str(e)}")
+                self._fetched_at = time.monotonic()
+                return False
+
+            keys = {}
+            for key_data in jwks.get("keys", []):
+                kid = key_data.get("kid")
+                if not kid or key_data.get("kty") != "RSA" or key_data.get("use", "sig") != "sig":
+                    continue
+                try:
+                    keys[kid] = jwk.construct(key_data, key_data.get("alg", "RS256"))
+                except Exception as e:
+                    logger.warning(f"Skipping unusable JWKS key {kid}: {str(e)}")
+
+            rotated = set(keys) ^ set(self._keys)
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            if rotated:
+                logger.info(f"Clerk JWKS loaded: {len(keys)} keys ({len(rotated)} added or removed)")
+            return True
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Claims of a valid session token; raises TokenVerificationError otherwise"""
+        token_digest = hashlib.sha256(token.encode()).digest()
+        cached = self.token_cache.get(token_digest)
+        if cached is not None:
+            return cached
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise TokenVerificationError(f"Malformed token: {str(e)}")
+
+        if header.get("alg") not in ALLOWED_ALGORITHMS:
+            raise TokenVerificationError(f"Unsupported signing algorithm: {header.get('alg')}")
+        kid = header.get("kid")
+        if not kid:
+            raise TokenVerificationError("Token has no key id")
+
+        key = self._keys.get(kid)
+        if key is None:
+            # Possibly a rotated signing key: refetch the set (rate limited)
+            await self.refresh(force=False)
+            key = self._keys.get(kid)
+            if key is None:
+                raise TokenVerificationError(f"Unknown signing key: {kid}")
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=ALLOWED_ALGORITHMS,
+                issuer=self.issuer,
+                options={"verify_aud": False, "require_exp": True, "require_sub": True, "leeway": self.leeway},
+            )
+        except JWTError as e:
+            raise TokenVerificationError(str(e))
+
+        if self.authorized_parties and claims.get("azp") and claims["azp"] not in self.authorized_parties:
+            raise TokenVerificationError(f"Unauthorized party: {claims['azp']}")
+
+        self.token_cache.set(token_digest, claims, ttl=float(claims["exp"]) - time.time())
+        return claims
+
+    def start(self):
+        """Fetch the JWKS and keep refreshing it in the background"""
+        if self.jwks_url.startswith(CLERK_API_BASE) and not self.secret_key:
+            logger.warning("CLERK_SECRET_KEY not set, Clerk session tokens cannot be verified")
+            return
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop(), name="clerk-jwks-refresh")
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
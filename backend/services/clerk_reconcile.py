@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from database.model import User, async_session_factory
+from services.clerk_service import UPSERT_CHUNK_SIZE, ClerkService
+
+logger = logging.getLogger(__name__)
+
+# Clerk's maximum page size for GET /v1/users
+MAX_PAGE_SIZE = 500
+
+SYNCED_FIELDS = ("email", "first_name", "last_name", "profile_image_url")
+
+
+class ClerkReconciler:
+    """
+    Bring the User table back in line with Clerk after missed webhooks
+
+    Pages through GET /v1/users (oldest first) with up to
+    CLERK_RECONCILE_CONCURRENCY pages in flight. Each page is diffed against
+    the local rows: users that are missing, differ in a synced field, or
+    were updated in Clerk after the local row was written are upserted in
+    one statement. After each page the creation time of the last user
+    below which every page is done is written to a checkpoint file, and an
+    interrupted run lists only users created from then on. Unlike an
+    offset, that point does not move when users are deleted in between.
+    The file is removed once the list is exhausted.
+
+    A page that fails on a unique constraint (an email address that moved
+    to another Clerk user) is written user by user, and the users that
+    still conflict are skipped and reported. A run that listed every Clerk
+    user then deactivates the active local users it did not see; a resumed
+    run did not list the users before its checkpoint and leaves that to
+    the next full run.
+    """
+
+    def __init__(
+        self,
+        clerk_service: Optional[ClerkService] = None,
+        page_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        session_factory=async_session_factory
+    ):
+        self.clerk_service = clerk_service or ClerkService()
+        self.page_size = min(page_size or int(os.getenv("CLERK_RECONCILE_PAGE_SIZE", "200")), MAX_PAGE_SIZE)
+        self.concurrency = concurrency or int(os.getenv("CLERK_RECONCILE_CONCURRENCY", "4"))
+        self.checkpoint_path = checkpoint_path or os.getenv("CLERK_RECONCILE_CHECKPOINT", "./clerk_reconcile.json")
+        self.session_factory = session_factory
+
+        self.fetched = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deactivated = 0
+        self.pages = 0
+        self.skipped: List[str] = []
+        self.seen: Set[str] = set()
+
+    def load_checkpoint(self) -> Optional[int]:
+        """Clerk created_at (ms) of the last reconciled user, or None to start over"""
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(json.load(f)["created_at"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable reconcile checkpoint: {str(e)}")
+            return None
+
+    def save_checkpoint(self, last_user: Dict[str, Any]):
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({
+                "created_at": last_user["created_at"],
+                "user_id": last_user.get("id"),
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+            }, f)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def needs_update(local: Optional[User], clerk_user: Dict[str, Any], email: Optional[str]) -> bool:
+        if local is None:
+            return True
+        remote = {**clerk_user, "email": email}
+        if any(getattr(local, field) != remote.get(field) for field in SYNCED_FIELDS):
+            return True
+        # Clerk timestamps are milliseconds since the epoch (UTC)
+        clerk_updated_at = clerk_user.get("updated_at")
+        if clerk_updated_at and local.updated_at:
+            return datetime.fromtimestamp(clerk_updated_at / 1000, timezone.utc).replace(tzinfo=None) > local.updated_at
+        return local.updated_at is None
+
+    async def apply_page(self, clerk_users: List[Dict[str, Any]]):
+        """Upsert the users of one page that differ from their local rows"""
+        ids = [user["id"] for user in clerk_users if user.get("id")]
+        self.seen.update(ids)
+        async with self.session_factory() as session:
+            local_users = {
+                user.clerk_user_id: user
+                for user in (await session.exec(select(User).where(User.clerk_user_id.in_(ids)))).all()
+            }
+            changed = [
+                user for user in clerk_users
+                if self.needs_update(local_users.get(user.get("id")), user, self.clerk_service.primary_email(user))
+            ]
+            try:
+                written = [user.clerk_user_id for user in await self.clerk_service.upsert_users(session, changed)]
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                written = await self.upsert_one_by_one(session, changed)
+
+        for clerk_user_id in written:
+            self.clerk_service.invalidate_user(clerk_user_id)
+            if clerk_user_id in local_users:
+                self.updated += 1
+            else:
+                self.created += 1
+        self.unchanged += len(clerk_users) - len(changed)
+
+    async def upsert_one_by_one(self, session, clerk_users: List[Dict[str, Any]]) -> List[str]:
+        """Write each user on its own, skipping the ones that hit a unique constraint; returns the written ids"""
+        written = []
+        for clerk_user in clerk_users:
+            try:
+                user = await self.clerk_service.upsert_user(session, clerk_user)
+                clerk_user_id = user.clerk_user_id if user else None
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                logger.warning(f"Skipping Clerk user {clerk_user.get('id')}: {str(e.orig)}")
+                self.skipped.append(clerk_user.get("id"))
+                continue
+            if clerk_user_id:
+                written.append(clerk_user_id)
+        return written
+
+    async def deactivate_unseen(self, listed_before: datetime):
+        """Deactivate active local users that the Clerk list did not contain"""
+        if not self.seen:
+            logger.warning("Clerk listed no users; not deactivating any local user")
+            return
+        async with self.session_factory() as session:
+            # Rows created while the list was read may belong to users the list
+            # missed; local password accounts (local_...) are not in Clerk at all
+            active = (await session.exec(
+                select(User.clerk_user_id).where(
+                    User.is_active,
+                    User.created_at < listed_before,
+                    ~User.clerk_user_id.startswith("local_"),
+                )
+            )).all()
+            unseen = [clerk_user_id for clerk_user_id in active if clerk_user_id not in self.seen]
+            for start in range(0, len(unseen), UPSERT_CHUNK_SIZE):
+                self.deactivated += await self.clerk_service.deactivate_users(
+                    session, unseen[start:start + UPSERT_CHUNK_SIZE]
+                )
+            await session.commit()
+        for clerk_user_id in unseen:
+            self.clerk_service.invalidate_user(clerk_user_id)
+        if unseen:
+            logger.info(f"Deactivated {len(unseen)} local users no longer in Clerk")
+
+    async def run(self, resume: bool = True) -> Dict[str, Any]:
+        """Reconcile every Clerk user; returns counters and throughput"""
+        resumed_after = self.load_checkpoint() if resume else None
+        # One millisecond earlier so users created in the same millisecond are
+        # not skipped; reapplying the last reconciled user is a no-op
+        created_after = resumed_after - 1 if resumed_after is not None else None
+        if resumed_after is not None:
+            logger.info(f"Resuming Clerk reconciliation after users created at {resumed_after}")
+
+        started = time.perf_counter()
+        listed_before = datetime.now(timezone.utc).replace(tzinfo=None)
+        next_offset = 0
+        end_offset: Optional[int] = None
+        # Offsets (within this run) of finished pages, with each page's last user
+        done: Dict[int, Optional[Dict[str, Any]]] = {}
+        checkpoint = 0
+
+        async def worker():
+            nonlocal next_offset, end_offset, checkpoint
+            while end_offset is None or next_offset < end_offset:
+                offset = next_offset
+                next_offset += self.page_size
+
+                clerk_users = await self.clerk_service.list_users(self.page_size, offset, created_after)
+                if len(clerk_users) < self.page_size:
+                    end_offset = offset + len(clerk_users) if end_offset is None else min(end_offset, offset + len(clerk_users))
+                await self.apply_page(clerk_users)
+                self.fetched += len(clerk_users)
+                self.pages += 1
+
+                # Only advance past pages that are all done, so a resume never skips one
+                done[offset] = clerk_users[-1] if clerk_users else None
+                last_user = None
+                while checkpoint in done:
+                    last_user = done.pop(checkpoint) or last_user
+                    checkpoint += self.page_size
+                if last_user and last_user.get("created_at") is not None:
+                    self.save_checkpoint(last_user)
+
+                elapsed = time.perf_counter() - started
+                logger.info(f"Reconciled {self.fetched} Clerk users ({self.fetched / elapsed:.0f}/s)")
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(self.concurrency):
+                    group.create_task(worker())
+        except ExceptionGroup as errors:
+            logger.error(f"Clerk reconciliation stopped after {checkpoint} users of this run; rerun to resume")
+            raise errors.exceptions[0]
+
+        if resumed_after is None:
+            await self.deactivate_unseen(listed_before)
+        self.clear_checkpoint()
+        return self.stats(time.perf_counter() - started, resumed_after)
+
+    def stats(self, elapsed: float = 0.0, resumed_after: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "resumed_after": resumed_after,
+            "pages": self.pages,
+            "fetched": self.fetched,
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "deactivated": self.deactivated,
+            "skipped": self.skipped,
+            "elapsed_seconds": round(elapsed, 2),
+            "users_per_second": round(self.fetched / elapsed, 1) if elapsed else None,
+        }
+
+
+async def _main(args):
+    from database.model import dispose_engines, init_db
+    from services.http_client import HTTPClient
+
+    init_db()
+    http_client = HTTPClient()
+    reconciler = ClerkReconciler(
+        clerk_service=ClerkService(http_client=http_client),
+        page_size=args.page_size,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+    )
+    try:
+        print(json.dumps(await reconciler.run(resume=not args.restart), indent=2))
+    finally:
+        await http_client.stop()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reconcile local users with the Clerk user list")
+    parser.add_argument("--page-size", type=int, help=f"users per request (max {MAX_PAGE_SIZE})")
+    parser.add_argument("--concurrency", type=int, help="pages fetched and applied at once")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: CLERK_RECONCILE_CHECKPOINT)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
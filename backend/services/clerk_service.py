@@ -1,254 +1,233 @@
+import base64
 import logging
 import os
-from typing import Optional, Dict, Any
-from datetime import datetime
-from database.model import User, get_session
+import time
+from typing import Optional, Dict, Any, List, Mapping
+from datetime import datetime, timezone
+from database.model import User, dialect_insert, normalize_email
+from sqlalchemy import update
 from sqlmodel import select
-import json
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from services.http_client import HTTPClient
+from services.ttl_cache import TTLCache
 import hmac
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+CLERK_API_BASE = "https://api.clerk.com/v1"
+
+# Maximum age (and clock skew) of a webhook delivery's svix-timestamp
+WEBHOOK_TOLERANCE_SECONDS = 300
+
+# Rows per INSERT statement in upsert_users
+UPSERT_CHUNK_SIZE = 500
+
+# Resolved users by Clerk user ID, shared by every ClerkService in the process so
+# webhook handlers invalidate what the user routes read
+user_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    max_entries=int(os.getenv("CLERK_USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CLERK_USER_CACHE_TTL", "60")),
+)
+
 class ClerkService:
     """Service for handling Clerk webhooks and user synchronization"""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[HTTPClient] = None):
         self.webhook_secret = os.getenv("CLERK_WEBHOOK_SECRET", "")
+        self.secret_key = os.getenv("CLERK_SECRET_KEY", "")
+        self.http_client = http_client or HTTPClient()
+        self.user_cache = user_cache
+
+    async def fetch_user(self, clerk_user_id: str) -> Optional[Dict[str, Any]]:
+        """User object from the Clerk Backend API, or None if unavailable"""
+        try:
+            response = await self.http_client.get(
+                f"{CLERK_API_BASE}/users/{clerk_user_id}",
+                headers={"Authorization": f"Bearer {self.secret_key}"}
+            )
+            if response.status_code != 200:
+                logger.warning(f"Clerk user lookup for {clerk_user_id} returned {response.status_code}")
+                return None
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error fetching user from Clerk: {str(e)}")
+            return None
+
+    async def list_users(self, limit: int, offset: int, created_after: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        One page of users from the Clerk Backend API, oldest first
+
+        created_after (milliseconds since the epoch) limits the list to
+        users created after that time. Raises httpx.HTTPError if the page
+        could not be fetched.
+        """
+        params = {"limit": limit, "offset": offset, "order_by": "+created_at"}
+        if created_after is not None:
+            params["created_at_after"] = created_after
+        response = await self.http_client.get(
+            f"{CLERK_API_BASE}/users",
+            params=params,
+            headers={"Authorization": f"Bearer {self.secret_key}"}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def invalidate_user(self, clerk_user_id: str):
+        """Drop a cached user after its row changed"""
+        self.user_cache.invalidate(clerk_user_id)
         
-    def verify_webhook(self, payload: bytes, signature: str) -> bool:
-        """Verify Clerk webhook signature"""
+    def verify_webhook(self, payload: bytes, headers: Mapping[str, str]) -> bool:
+        """
+        Verify a Clerk (Svix) webhook signature
+
+        Svix signs "{svix-id}.{svix-timestamp}.{body}" with HMAC-SHA256 using
+        the base64 part of the `whsec_` secret; `svix-signature` holds one or
+        more space-separated "v1,{base64 signature}" entries. Deliveries with
+        a timestamp outside the tolerance are rejected to stop replays.
+        """
         if not self.webhook_secret:
             logger.warning("CLERK_WEBHOOK_SECRET not set, skipping verification")
             return True
             
         try:
-            expected_signature = hmac.new(
-                self.webhook_secret.encode(),
-                payload,
-                hashlib.sha256
-            ).hexdigest()
+            delivery_id = headers.get("svix-id")
+            timestamp = headers.get("svix-timestamp")
+            signatures = headers.get("svix-signature")
+            if not delivery_id or not timestamp or not signatures:
+                logger.warning("Webhook is missing Svix signature headers")
+                return False
             
-            # Clerk sends signature as "v1,{hash}"
-            signature_hash = signature.split(',')[1] if ',' in signature else signature
+            if abs(time.time() - int(timestamp)) > WEBHOOK_TOLERANCE_SECONDS:
+                logger.warning(f"Webhook timestamp outside tolerance: {timestamp}")
+                return False
             
-            return hmac.compare_digest(expected_signature, signature_hash)
+            secret = base64.b64decode(self.webhook_secret.split("_", 1)[-1])
+            signed_content = f"{delivery_id}.{timestamp}.".encode() + payload
+            expected_signature = base64.b64encode(
+                hmac.new(secret, signed_content, hashlib.sha256).digest()
+            ).decode()
+            
+            for entry in signatures.split():
+                version, _, signature = entry.partition(",")
+                if version == "v1" and hmac.compare_digest(expected_signature, signature):
+                    return True
+            return False
         except Exception as e:
             logger.error(f"Error verifying webhook signature: {str(e)}")
             return False
-    
-    def handle_user_created(self, event_data: Dict[str, Any]) -> Optional[User]:
-        """Handle user.created webhook event"""
-        try:
-            user_data = event_data.get('data', {})
-            
-            # Extract user information from Clerk event
-            clerk_user_id = user_data.get('id')
-            email_addresses = user_data.get('email_addresses', [])
-            first_name = user_data.get('first_name')
-            last_name = user_data.get('last_name')
-            profile_image_url = user_data.get('profile_image_url')
-            
-            if not clerk_user_id or not email_addresses:
-                logger.error("Missing required user data in webhook")
-                return None
-            
-            # Get primary email
-            primary_email = None
-            for email in email_addresses:
-                if email.get('id') == user_data.get('primary_email_address_id'):
-                    primary_email = email.get('email_address')
-                    break
-            
-            if not primary_email and email_addresses:
-                primary_email = email_addresses[0].get('email_address')
-            
-            if not primary_email:
-                logger.error("No email address found in user data")
-                return None
-            
-            # Create user in database
-            with get_session() as session:
-                # Check if user already exists
-                existing_user = session.exec(
-                    select(User).where(User.clerk_user_id == clerk_user_id)
-                ).first()
-                
-                if existing_user:
-                    logger.info(f"User already exists: {clerk_user_id}")
-                    return existing_user
-                
-                # Create new user
-                new_user = User(
-                    clerk_user_id=clerk_user_id,
-                    email=primary_email,
-                    first_name=first_name,
-                    last_name=last_name,
-                    profile_image_url=profile_image_url,
-                    is_active=True,
-                    created_at=datetime.utcnow()
-                )
-                
-                session.add(new_user)
-                session.commit()
-                session.refresh(new_user)
-                
-                logger.info(f"Created new user: {clerk_user_id} ({primary_email})")
-                return new_user
-                
-        except Exception as e:
-            logger.error(f"Error handling user.created event: {str(e)}")
-            return None
-    
-    def handle_user_updated(self, event_data: Dict[str, Any]) -> Optional[User]:
-        """Handle user.updated webhook event"""
-        try:
-            user_data = event_data.get('data', {})
+
+    @staticmethod
+    def primary_email(user_data: Dict[str, Any]) -> Optional[str]:
+        """Primary email address of a Clerk user object (else its first), normalized like local accounts"""
+        email_addresses = user_data.get('email_addresses') or []
+        address = None
+        for email in email_addresses:
+            if email.get('id') == user_data.get('primary_email_address_id'):
+                address = email.get('email_address')
+                break
+        if address is None and email_addresses:
+            address = email_addresses[0].get('email_address')
+        return normalize_email(address) if address else None
+
+    async def upsert_users(self, session: AsyncSession, users_data: List[Dict[str, Any]]) -> List[User]:
+        """
+        Create or update local rows for many Clerk user objects in one statement
+
+        INSERT ... ON CONFLICT (clerk_user_id) DO UPDATE ... RETURNING, so
+        there is no read-before-write and concurrent writers for the same
+        user cannot race into a unique-constraint error. `is_active` and
+        `created_at` of existing rows are left alone. Users without an email
+        address cannot be stored and are skipped. Not committed.
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows: Dict[str, Dict[str, Any]] = {}
+        for user_data in users_data:
             clerk_user_id = user_data.get('id')
-            
-            if not clerk_user_id:
-                logger.error("Missing user ID in webhook")
-                return None
-            
-            with get_session() as session:
-                # Find existing user
-                user = session.exec(
-                    select(User).where(User.clerk_user_id == clerk_user_id)
-                ).first()
-                
-                if not user:
-                    logger.warning(f"User not found for update: {clerk_user_id}")
-                    return None
-                
-                # Update user information
-                email_addresses = user_data.get('email_addresses', [])
-                if email_addresses:
-                    # Get primary email
-                    primary_email = None
-                    for email in email_addresses:
-                        if email.get('id') == user_data.get('primary_email_address_id'):
-                            primary_email = email.get('email_address')
-                            break
-                    
-                    if primary_email:
-                        user.email = primary_email
-                
-                user.first_name = user_data.get('first_name')
-                user.last_name = user_data.get('last_name')
-                user.profile_image_url = user_data.get('profile_image_url')
-                user.updated_at = datetime.utcnow()
-                
-                session.add(user)
-                session.commit()
-                session.refresh(user)
-                
-                logger.info(f"Updated user: {clerk_user_id}")
-                return user
-                
-        except Exception as e:
-            logger.error(f"Error handling user.updated event: {str(e)}")
-            return None
+            primary_email = self.primary_email(user_data)
+            if not clerk_user_id or not primary_email:
+                logger.warning(f"Skipping Clerk user without id or email: {clerk_user_id}")
+                continue
+            # One row per user: Postgres rejects a statement that updates a row twice
+            rows[clerk_user_id] = {
+                "clerk_user_id": clerk_user_id,
+                "email": primary_email,
+                "first_name": user_data.get('first_name'),
+                "last_name": user_data.get('last_name'),
+                "profile_image_url": user_data.get('profile_image_url'),
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+        if not rows:
+            return []
+        
+        users: List[User] = []
+        values = list(rows.values())
+        # Chunked to stay under the drivers' bound-parameter limits
+        for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+            statement = dialect_insert(session.bind, User).values(values[start:start + UPSERT_CHUNK_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=["clerk_user_id"],
+                set_={
+                    column: statement.excluded[column]
+                    for column in ("email", "first_name", "last_name", "profile_image_url", "updated_at")
+                },
+            ).returning(User)
+            result = await session.execute(statement, execution_options={"populate_existing": True})
+            users.extend(result.scalars())
+        return users
+
+    async def upsert_user(self, session: AsyncSession, user_data: Dict[str, Any]) -> Optional[User]:
+        """Create or update the local row for one Clerk user object (not committed)"""
+        users = await self.upsert_users(session, [user_data])
+        return users[0] if users else None
+
+    async def deactivate_users(self, session: AsyncSession, clerk_user_ids: List[str]) -> int:
+        """Soft-delete the local rows of deleted Clerk users (not committed)"""
+        if not clerk_user_ids:
+            return 0
+        result = await session.execute(
+            update(User)
+            .where(User.clerk_user_id.in_(clerk_user_ids))
+            .values(is_active=False, updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
+        )
+        return result.rowcount
     
-    def handle_user_deleted(self, event_data: Dict[str, Any]) -> bool:
-        """Handle user.deleted webhook event"""
+    async def get_user_by_clerk_id(self, session: AsyncSession, clerk_user_id: str) -> Optional[User]:
+        """Get user by Clerk user ID, served from the user cache when fresh"""
         try:
-            user_data = event_data.get('data', {})
-            clerk_user_id = user_data.get('id')
-            
-            if not clerk_user_id:
-                logger.error("Missing user ID in webhook")
-                return False
-            
-            with get_session() as session:
-                # Find and deactivate user (soft delete)
-                user = session.exec(
-                    select(User).where(User.clerk_user_id == clerk_user_id)
-                ).first()
-                
-                if not user:
-                    logger.warning(f"User not found for deletion: {clerk_user_id}")
-                    return False
-                
-                user.is_active = False
-                user.updated_at = datetime.utcnow()
-                
+            cached = self.user_cache.get(clerk_user_id)
+            if cached is not None:
+                # Attach a copy as an already-persisted row, so routes can update it
+                user = User(**cached)
+                make_transient_to_detached(user)
                 session.add(user)
-                session.commit()
-                
-                logger.info(f"Deactivated user: {clerk_user_id}")
-                return True
-                
-        except Exception as e:
-            logger.error(f"Error handling user.deleted event: {str(e)}")
-            return False
-    
-    def get_user_by_clerk_id(self, clerk_user_id: str) -> Optional[User]:
-        """Get user by Clerk user ID"""
-        try:
-            with get_session() as session:
-                user = session.exec(
-                    select(User).where(User.clerk_user_id == clerk_user_id)
-                ).first()
                 return user
+
+            user = (await session.exec(
+                select(User).where(User.clerk_user_id == clerk_user_id)
+            )).first()
+            if user:
+                self.user_cache.set(clerk_user_id, user.model_dump())
+            return user
         except Exception as e:
             logger.error(f"Error getting user by Clerk ID: {str(e)}")
             return None
     
-    def sync_user_from_clerk(self, clerk_user_data: Dict[str, Any]) -> Optional[User]:
+    async def sync_user_from_clerk(self, session: AsyncSession, clerk_user_data: Dict[str, Any]) -> Optional[User]:
         """Sync user data from Clerk API"""
         try:
-            clerk_user_id = clerk_user_data.get('id')
-            if not clerk_user_id:
+            user = await self.upsert_user(session, clerk_user_data)
+            if not user:
                 return None
             
-            with get_session() as session:
-                # Check if user exists
-                user = session.exec(
-                    select(User).where(User.clerk_user_id == clerk_user_id)
-                ).first()
-                
-                email_addresses = clerk_user_data.get('email_addresses', [])
-                primary_email = None
-                
-                if email_addresses:
-                    for email in email_addresses:
-                        if email.get('id') == clerk_user_data.get('primary_email_address_id'):
-                            primary_email = email.get('email_address')
-                            break
-                    
-                    if not primary_email:
-                        primary_email = email_addresses[0].get('email_address')
-                
-                if user:
-                    # Update existing user
-                    if primary_email:
-                        user.email = primary_email
-                    user.first_name = clerk_user_data.get('first_name')
-                    user.last_name = clerk_user_data.get('last_name')
-                    user.profile_image_url = clerk_user_data.get('profile_image_url')
-                    user.updated_at = datetime.utcnow()
-                else:
-                    # Create new user
-                    if not primary_email:
-                        logger.error("No email address found for user sync")
-                        return None
-                    
-                    user = User(
-                        clerk_user_id=clerk_user_id,
-                        email=primary_email,
-                        first_name=clerk_user_data.get('first_name'),
-                        last_name=clerk_user_data.get('last_name'),
-                        profile_image_url=clerk_user_data.get('profile_image_url'),
-                        is_active=True,
-                        created_at=datetime.utcnow()
-                    )
-                
-                session.add(user)
-                session.commit()
-                session.refresh(user)
-                
-                return user
-                
+            await session.commit()
+            self.invalidate_user(user.clerk_user_id)
+            
+            return user
+            
         except Exception as e:
             logger.error(f"Error syncing user from Clerk: {str(e)}")
             return None
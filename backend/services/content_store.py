@@ -0,0 +1,133 @@
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import AnalysisResult, CVContent, CVFile, JobDescription, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class ContentStore:
+    """
+    Content-addressed storage for CV text and job descriptions
+
+    Each distinct (normalized) text is stored once, keyed by its SHA-256.
+    CVContent.ref_count counts the CVFile rows pointing at a text and
+    JobDescription.ref_count the AnalysisResult rows; rows are upserted
+    idempotently and removed once nothing references them.
+    """
+
+    def __init__(self):
+        self.reuse_prior_analyses = os.getenv("REUSE_PRIOR_ANALYSES", "true").lower() == "true"
+
+    async def store_batch(self, session: AsyncSession, batch: List[Any]):
+        """
+        Write-behind flush hook (before insert): upsert the batch's texts
+
+        Runs before the CVFile/AnalysisResult rows are inserted so their
+        foreign keys resolve. Identical texts within the batch are folded into
+        one row with a summed reference count.
+        """
+        cv_texts: Dict[str, List[Any]] = {}
+        jd_texts: Dict[str, List[Any]] = {}
+        for item in batch:
+            cv_hash = item.cv_row.content_hash
+            if cv_hash and item.cv_text is not None:
+                cv_texts.setdefault(cv_hash, [item.cv_text, 0])[1] += 1
+            jd_hash = item.analysis_row.jd_hash
+            if jd_hash and item.jd_text is not None:
+                jd_texts.setdefault(jd_hash, [item.jd_text, 0])[1] += 1
+
+        if cv_texts:
+            await self._upsert(session, CVContent, [
+                {"hash": key, "content": text, "char_count": len(text), "ref_count": count}
+                for key, (text, count) in cv_texts.items()
+            ])
+        if jd_texts:
+            await self._upsert(session, JobDescription, [
+                {"hash": key, "text": text, "ref_count": count}
+                for key, (text, count) in jd_texts.items()
+            ])
+
+    async def find_prior_analysis(
+        self,
+        session: AsyncSession,
+        cv_hash: str,
+        jd_hash: str,
+        model: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Most recent analysis of the same CV text against the same job description
+
+        Only results `model` produced (or a dated snapshot of it) are reused;
+        fallback results and mock analyses never are, so a failed model call
+        is retried on the next upload. Returns None without a model.
+        """
+        if not self.reuse_prior_analyses or not model:
+            return None
+        statement = (
+            select(AnalysisResult.analysis)
+            .where(
+                AnalysisResult.cv_hash == cv_hash,
+                AnalysisResult.jd_hash == jd_hash,
+                or_(AnalysisResult.model == model, AnalysisResult.model.like(f"{model}-20%")),
+                AnalysisResult.fallback.is_not(True),
+            )
+            .order_by(AnalysisResult.created_at.desc())
+            .limit(1)
+        )
+        return (await session.exec(statement)).first()
+
+    async def find_text_by_file_hash(self, session: AsyncSession, file_hash: str) -> Optional[str]:
+        """Extracted text of an earlier upload with byte-identical content"""
+        statement = (
+            select(CVContent.content)
+            .join(CVFile, CVFile.content_hash == CVContent.hash)
+            .where(CVFile.file_hash == file_hash, CVContent.content.is_not(None))
+            .limit(1)
+        )
+        return (await session.exec(statement)).first()
+
+    async def release(
+        self,
+        session: AsyncSession,
+        cv_hashes: Iterable[str] = (),
+        jd_hashes: Iterable[str] = ()
+    ) -> List[str]:
+        """
+        Drop one reference per hash given and delete texts no longer referenced
+
+        Returns the hashes of CV texts that were deleted.
+        """
+        deleted_cv_hashes: List[str] = []
+        for table, hashes in ((CVContent, cv_hashes), (JobDescription, jd_hashes)):
+            counts: Dict[str, int] = {}
+            for key in hashes:
+                if key:
+                    counts[key] = counts.get(key, 0) + 1
+            for key, count in counts.items():
+                await session.execute(
+                    update(table).where(table.hash == key).values(ref_count=table.ref_count - count)
+                )
+            if counts:
+                result = await session.execute(
+                    delete(table)
+                    .where(table.hash.in_(counts.keys()), table.ref_count <= 0)
+                    .returning(table.hash)
+                )
+                if table is CVContent:
+                    deleted_cv_hashes = list(result.scalars())
+        return deleted_cv_hashes
+
+    @staticmethod
+    async def _upsert(session: AsyncSession, table, rows: List[Dict[str, Any]]):
+        statement = dialect_insert(session.bind, table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=["hash"],
+            set_={"ref_count": table.ref_count + statement.excluded.ref_count},
+        )
+        await session.execute(statement)
@@ -1,5 +1,6 @@
+import io
 import logging
-from typing import Optional
+from typing import BinaryIO, Optional, Union
 import PyPDF2
 from docx import Document
 import os
@@ -50,25 +51,42 @@ class CVProcessor:
             logger.error(f"Error extracting text from {file_path}: {str(e)}")
             return None
     
-    def _extract_pdf_text(self, file_path: str) -> Optional[str]:
+    def extract_bytes(self, data: bytes, content_type: str) -> Optional[str]:
+        """
+        Extract text from an in-memory document (blocking; run off the event loop)
+        
+        Args:
+            data: Document content
+            content_type: MIME type of the document
+            
+        Returns:
+            Extracted text or None if extraction fails
+        """
+        extractor = self.supported_formats.get(content_type)
+        if extractor is None:
+            logger.warning(f"Unsupported content type: {content_type}")
+            return None
+        text = extractor(io.BytesIO(data))
+        return text.strip() if text else None
+    
+    def _extract_pdf_text(self, file_path: Union[str, BinaryIO]) -> Optional[str]:
         """Extract text from PDF file"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                return text.strip()
+            pdf_reader = PyPDF2.PdfReader(file_path)
+            text = ""
+            
+            for page in pdf_reader.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    text += page_text + "\n"
+            
+            return text.strip()
                 
         except Exception as e:
             logger.error(f"Error extracting PDF text: {str(e)}")
             return None
     
-    def _extract_docx_text(self, file_path: str) -> Optional[str]:
+    def _extract_docx_text(self, file_path: Union[str, BinaryIO]) -> Optional[str]:
         """Extract text from DOCX file"""
         try:
             doc = Document(file_path)
@@ -91,7 +109,7 @@ class CVProcessor:
             logger.error(f"Error extracting DOCX text: {str(e)}")
             return None
     
-    def _extract_doc_text(self, file_path: str) -> Optional[str]:
+    def _extract_doc_text(self, file_path: Union[str, BinaryIO]) -> Optional[str]:
         """Extract text from DOC file (basic implementation)"""
         try:
             # Note: This is a basic implementation
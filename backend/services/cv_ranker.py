@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import CVContent, async_session_factory
+
+logger = logging.getLogger(__name__)
+
+# Keeps skill tokens such as c++, c#, node.js and ci/cd-style pieces intact
+_TERM = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can could did do
+does doing during each for from had has have having he her here hers him his how i if in into is
+it its itself just me more most my no nor not now of off on once only or other our ours out over
+own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours etc e.g i.e per via within without
+""".split())
+
+# Postings store term frequencies as uint16
+_MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a CV or job description, stopwords removed"""
+    return [term for term in _TERM.findall(text.lower()) if term not in STOPWORDS and len(term) > 1]
+
+
+class CVRanker:
+    """
+    In-memory BM25 index over the stored CV corpus
+
+    One document per distinct CV text (CVContent hash; rows written before
+    content deduplication are indexed once `dedup-content` has run). Each
+    term owns two parallel arrays, document ids (uint32) and term
+    frequencies (uint16), appended in document order, so postings stay
+    sorted without per-entry objects. Queries only touch the postings of
+    their highest-IDF terms: scores are summed per touched document and the
+    best candidates picked with argpartition, never a corpus-sized array.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_query_terms: Optional[int] = None):
+        self.k1 = k1
+        self.b = b
+        self.max_query_terms = max_query_terms or int(os.getenv("RANKER_MAX_QUERY_TERMS", "64"))
+
+        self._term_ids: Dict[str, int] = {}
+        self._postings_docs: List[array] = []
+        self._postings_tfs: List[array] = []
+        self._doc_hashes: List[str] = []
+        self._doc_ids: Dict[str, int] = {}
+        self._doc_lengths = array("I")
+        self._total_length = 0
+        self._removed = set()
+        self._norms: Optional[np.ndarray] = None  # BM25 length normalization, rebuilt after adds
+
+        self._load_task: Optional[asyncio.Task] = None
+        self.ready = False
+
+    @property
+    def document_count(self) -> int:
+        return len(self._doc_hashes) - len(self._removed)
+
+    def add_document(self, doc_hash: str, text: str) -> bool:
+        """Index a CV text; False if this content is already indexed"""
+        if doc_hash in self._doc_ids:
+            doc = self._doc_ids[doc_hash]
+            self._removed.discard(doc)
+            return False
+
+        doc = len(self._doc_hashes)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self._postings_docs)
+                self._postings_docs.append(array("I"))
+                self._postings_tfs.append(array("H"))
+            self._postings_docs[term_id].append(doc)
+            self._postings_tfs[term_id].append(min(tf, _MAX_TF))
+
+        length = sum(counts.values())
+        self._doc_hashes.append(doc_hash)
+        self._doc_ids[doc_hash] = doc
+        self._doc_lengths.append(length)
+        self._total_length += length
+        self._norms = None
+        return True
+
+    def remove_document(self, doc_hash: str):
+        """Exclude a CV text from results (postings are left in place)"""
+        doc = self._doc_ids.get(doc_hash)
+        if doc is not None:
+            self._removed.add(doc)
+
+    def search(self, query: str, top_k: int = 10, hashes: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """BM25 top-K as (content hash, score), best first, optionally among the given content hashes only"""
+        total_docs = len(self._doc_hashes)
+        if total_docs == 0:
+            return []
+
+        # Highest-IDF query terms only: common words barely move BM25 scores
+        weighted = []
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            df = len(self._postings_docs[term_id])
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            weighted.append((idf, term_id))
+        weighted = heapq.nlargest(self.max_query_terms, weighted)
+        if not weighted:
+            return []
+
+        if self._norms is None:
+            lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+            self._norms = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / total_docs))
+        norms = self._norms
+
+        # Sparse accumulator: the work follows the query's postings, not the corpus size
+        posting_docs, contributions = [], []
+        for idf, term_id in weighted:
+            # A copy, so no buffer export outlives the query and blocks appends
+            docs = np.frombuffer(self._postings_docs[term_id], dtype=np.uint32).copy()
+            tfs = np.frombuffer(self._postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            posting_docs.append(docs)
+            contributions.append(idf * tfs * (self.k1 + 1) / (tfs + norms[docs]))
+        touched, slots = np.unique(np.concatenate(posting_docs), return_inverse=True)
+        scores = np.bincount(slots, weights=np.concatenate(contributions))
+
+        keep = None
+        if self._removed:
+            keep = ~np.isin(touched, np.fromiter(self._removed, dtype=np.uint32, count=len(self._removed)))
+        if hashes is not None:
+            allowed = np.fromiter(
+                (self._doc_ids[doc_hash] for doc_hash in set(hashes) if doc_hash in self._doc_ids), dtype=np.uint32
+            )
+            allowed = np.isin(touched, allowed)
+            keep = allowed if keep is None else keep & allowed
+        if keep is not None:
+            touched, scores = touched[keep], scores[keep]
+
+        if len(touched) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            touched, scores = touched[best], scores[best]
+        ranked = sorted(zip(scores.tolist(), touched.tolist()), reverse=True)
+        return [(self._doc_hashes[doc], score) for score, doc in ranked]
+
+    async def index_batch(self, batch: List[Any]):
+        """Write-behind commit hook: index CV texts of the batch"""
+        for item in batch:
+            doc_hash = item.cv_row.content_hash
+            if doc_hash and item.cv_text:
+                self.add_document(doc_hash, item.cv_text)
+
+    def start_loading(self, session_factory=async_session_factory):
+        """Build the index from the database in the background"""
+        if self._load_task is None:
+            self._load_task = asyncio.create_task(self._load(session_factory), name="cv-ranker-load")
+
+    async def stop(self):
+        if self._load_task is not None:
+            self._load_task.cancel()
+            try:
+                await self._load_task
+            except asyncio.CancelledError:
+                pass
+            self._load_task = None
+
+    async def _load(self, session_factory, batch_size: int = 500):
+        try:
+            last_hash = ""
+            while True:
+                async with session_factory() as session:
+                    rows = (await session.exec(
+                        select(CVContent.hash, CVContent.content)
+                        .where(CVContent.hash > last_hash)
+                        .order_by(CVContent.hash)
+                        .limit(batch_size)
+                    )).all()
+                if not rows:
+                    break
+                for doc_hash, text in rows:
+                    if text:
+                        self.add_document(doc_hash, text)
+                last_hash = rows[-1][0]
+                await asyncio.sleep(0)
+
+            self.ready = True
+            logger.info(f"CV ranking index loaded: {self.document_count} documents, {len(self._term_ids)} terms")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to load CV ranking index: {str(e)}")
+
+
+async def fetch_texts(session: AsyncSession, hashes: List[str]) -> Dict[str, str]:
+    """CV texts by content hash"""
+    rows = (await session.exec(
+        select(CVContent.hash, CVContent.content).where(CVContent.hash.in_(hashes))
+    )).all()
+    return {doc_hash: text for doc_hash, text in rows}
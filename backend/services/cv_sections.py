@@ -0,0 +1,77 @@
+import re
+from typing import List
+
+from database.model import content_hash
+
+# Common CV headings, matched case-insensitively on a line of their own
+KNOWN_HEADINGS = {
+    "summary", "professional summary", "profile", "about me", "objective", "career objective",
+    "experience", "work experience", "professional experience", "employment", "employment history",
+    "work history", "education", "skills", "technical skills", "core skills", "key skills",
+    "projects", "personal projects", "certifications", "certificates", "courses", "training",
+    "languages", "awards", "achievements", "publications", "interests", "hobbies",
+    "volunteering", "volunteer experience", "references", "contact", "contacts",
+}
+
+# Longest block sent as one unit; longer sections are split at line boundaries
+MAX_SECTION_CHARS = 1200
+
+_TRAILING_PUNCTUATION = re.compile(r"[:\-–—\s]+$")
+
+
+class CVSection:
+    """A heading-delimited block of a CV, addressed by the hash of its text"""
+
+    __slots__ = ("title", "text", "hash")
+
+    def __init__(self, title: str, text: str):
+        self.title = title
+        self.text = text
+        self.hash = content_hash(f"{title}\n{text}")
+
+
+def _is_heading(line: str) -> bool:
+    candidate = _TRAILING_PUNCTUATION.sub("", line.strip())
+    if not candidate or len(candidate) > 40:
+        return False
+    if candidate.lower() in KNOWN_HEADINGS:
+        return True
+    letters = [char for char in candidate if char.isalpha()]
+    return len(letters) >= 3 and candidate.isupper() and len(candidate.split()) <= 4
+
+
+def split_sections(cv_text: str) -> List[CVSection]:
+    """
+    Split extracted CV text into sections at its headings
+
+    Text before the first heading becomes a "Header" section. Sections longer
+    than MAX_SECTION_CHARS are cut into consecutive parts at line boundaries,
+    so editing one bullet only changes the hash of the part containing it.
+    """
+    blocks = []
+    title, lines = "Header", []
+    for line in cv_text.splitlines():
+        if _is_heading(line):
+            blocks.append((title, lines))
+            title, lines = _TRAILING_PUNCTUATION.sub("", line.strip()), []
+        elif line.strip():
+            lines.append(line.strip())
+    blocks.append((title, lines))
+
+    sections = []
+    for title, lines in blocks:
+        if not lines:
+            continue
+        parts, current, size = [], [], 0
+        for line in lines:
+            if current and size + len(line) > MAX_SECTION_CHARS:
+                parts.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        parts.append(current)
+
+        for index, part in enumerate(parts, 1):
+            part_title = title if len(parts) == 1 else f"{title} ({index}/{len(parts)})"
+            sections.append(CVSection(part_title, "\n".join(part)))
+    return sections
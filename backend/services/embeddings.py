@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import select
+
+from database.model import CVContent, async_session_factory
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+
+class HashedNgramEmbedder:
+    """
+    Fixed-width text vectors without a model: the hashing trick over n-grams
+
+    Features are words, word bigrams and character n-grams of each word
+    (with boundary markers, so "postgres"/"postgresql" and
+    "managed"/"management" share most features). Each feature is hashed
+    (CRC32, stable across processes) to a signed bucket; counts are damped
+    with log(1 + tf) and the vector is L2-normalized, so cosine similarity
+    is a plain dot product.
+    """
+
+    def __init__(self, dim: Optional[int] = None, char_ngrams: Tuple[int, ...] = (3, 4, 5)):
+        self.dim = dim or int(os.getenv("EMBEDDING_DIM", "512"))
+        self.char_ngrams = char_ngrams
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        features.extend(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+        for word in words:
+            marked = f"<{word}>"
+            for n in self.char_ngrams:
+                features.extend(marked[i:i + n] for i in range(len(marked) - n + 1))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        features = self._features(text)
+        if not features:
+            return np.zeros(self.dim, dtype=np.float32)
+
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+        buckets = hashes % self.dim
+        # The top bit picks the sign so colliding features tend to cancel out
+        signs = np.where(hashes >> 31, -1.0, 1.0)
+        counts = np.bincount(buckets, weights=signs, minlength=self.dim)
+
+        vector = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 matrix of L2-normalized rows"""
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+    def match_terms(self, terms: List[str], candidates: List[str], threshold: float = 0.5) -> Dict[str, str]:
+        """
+        Closest candidate for each term, when similar enough
+
+        One matrix multiply over all (term, candidate) pairs; catches
+        inflections and spelling variants ("postgres" ~ "postgresql").
+        """
+        if not terms or not candidates:
+            return {}
+        similarities = cosine_similarity(self.embed_batch(terms), self.embed_batch(candidates))
+        best = similarities.argmax(axis=1)
+        return {
+            term: candidates[best[row]]
+            for row, term in enumerate(terms)
+            if similarities[row, best[row]] >= threshold
+        }
+
+
+def cosine_similarity(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Similarities of normalized query rows against normalized matrix rows"""
+    return np.atleast_2d(queries) @ matrix.T
+
+
+class EmbeddingIndex:
+    """
+    Embeddings of the stored CV corpus in a memory-mapped matrix file
+
+    Vectors are appended as raw float32 rows to EMBEDDING_MATRIX_PATH and
+    the content hash of each row to a sidecar `.ids` file; searches map the
+    file read-only and score it in chunks, so the corpus does not have to
+    fit in memory. Startup embeds CV texts missing from the file and masks
+    rows whose text was deleted. Embedding and file appends run in a worker
+    thread, one batch at a time, so they never block the event loop.
+    """
+
+    def __init__(self, embedder: Optional[HashedNgramEmbedder] = None, path: Optional[str] = None, chunk_rows: int = 8192):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.path = path or os.getenv("EMBEDDING_MATRIX_PATH", "./cv_embeddings.f32")
+        self.ids_path = f"{self.path}.ids"
+        self.chunk_rows = chunk_rows
+
+        self._hashes: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._removed = set()
+        self._matrix: Optional[np.memmap] = None
+        self._load_task: Optional[asyncio.Task] = None
+        self._append_lock = asyncio.Lock()
+        self.ready = False
+        self._open()
+
+    @property
+    def document_count(self) -> int:
+        return len(self._hashes) - len(self._removed)
+
+    def _open(self):
+        if not os.path.exists(self.ids_path):
+            # Rows without their ids cannot be mapped back to CVs
+            if os.path.exists(self.path):
+                logger.warning(f"Discarding embedding matrix {self.path}: {self.ids_path} is missing")
+                self._reset_files()
+            return
+        with open(self.ids_path, encoding="utf-8") as ids:
+            header = ids.readline().strip()
+            hashes = [line.strip() for line in ids if line.strip()]
+
+        rows_on_disk = os.path.getsize(self.path) // (self.embedder.dim * 4) if os.path.exists(self.path) else 0
+        if header != f"# dim={self.embedder.dim}" or rows_on_disk < len(hashes):
+            logger.warning(f"Discarding embedding matrix {self.path}: dimension changed or file incomplete")
+            self._reset_files()
+            return
+
+        self._hashes = hashes
+        self._rows = {doc_hash: row for row, doc_hash in enumerate(hashes)}
+        # Rows past the last id were written by an interrupted append
+        if rows_on_disk > len(hashes):
+            with open(self.path, "r+b") as matrix:
+                matrix.truncate(len(hashes) * self.embedder.dim * 4)
+
+    def _reset_files(self):
+        for path in (self.path, self.ids_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def add(self, doc_hash: str, text: str) -> bool:
+        """Embed and append a CV text; False if it is already stored (blocking)"""
+        return self.add_many([(doc_hash, text)]) == 1
+
+    def add_many(self, documents: List[Tuple[str, str]]) -> int:
+        """Embed and append CV texts not stored yet; returns how many were added (blocking)"""
+        new_documents = self._new_documents(documents)
+        if new_documents:
+            self._append(new_documents)
+            self._register(new_documents)
+        return len(new_documents)
+
+    async def add_many_async(self, documents: List[Tuple[str, str]]) -> int:
+        """
+        add_many with the embedding and file appends in a worker thread
+
+        Appends are serialized so row numbers follow the file; the in-memory
+        row map is only touched on the event loop.
+        """
+        async with self._append_lock:
+            new_documents = self._new_documents(documents)
+            if new_documents:
+                await asyncio.to_thread(self._append, new_documents)
+                self._register(new_documents)
+            return len(new_documents)
+
+    def _new_documents(self, documents: List[Tuple[str, str]]) -> Dict[str, str]:
+        new_documents: Dict[str, str] = {}
+        for doc_hash, text in documents:
+            if doc_hash in self._rows:
+                self._removed.discard(self._rows[doc_hash])
+            elif text:
+                new_documents[doc_hash] = text
+        return new_documents
+
+    def _append(self, documents: Dict[str, str]):
+        matrix = self.embedder.embed_batch(list(documents.values()))
+        new_file = not os.path.exists(self.ids_path)
+        # Rows are appended before their ids, so every listed id has its row on disk
+        with open(self.path, "ab") as matrix_file:
+            matrix_file.write(matrix.tobytes())
+        with open(self.ids_path, "a", encoding="utf-8") as ids:
+            if new_file:
+                ids.write(f"# dim={self.embedder.dim}\n")
+            ids.writelines(f"{doc_hash}\n" for doc_hash in documents)
+
+    def _register(self, documents: Dict[str, str]):
+        for doc_hash in documents:
+            self._rows[doc_hash] = len(self._hashes)
+            self._hashes.append(doc_hash)
+        self._matrix = None
+
+    def remove(self, doc_hash: str):
+        row = self._rows.get(doc_hash)
+        if row is not None:
+            self._removed.add(row)
+
+    def vector(self, doc_hash: str) -> Optional[np.ndarray]:
+        row = self._rows.get(doc_hash)
+        return None if row is None or row in self._removed else np.array(self._map()[row])
+
+    def _map(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) != len(self._hashes):
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r", shape=(len(self._hashes), self.embedder.dim))
+        return self._matrix
+
+    def similarities(self, query: str) -> np.ndarray:
+        """Cosine similarity of a text against every stored row (removed rows are -1)"""
+        if not self._hashes:
+            return np.zeros(0, dtype=np.float32)
+        vector = self.embedder.embed(query)
+        matrix = self._map()
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), self.chunk_rows):
+            scores[start:start + self.chunk_rows] = matrix[start:start + self.chunk_rows] @ vector
+        if self._removed:
+            scores[list(self._removed)] = -1.0
+        return scores
+
+    def search(self, query: str, top_k: int = 10, hashes: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Most similar CV texts as (content hash, cosine), best first, optionally among the given hashes only"""
+        if hashes is None:
+            rows = None
+            scores = self.similarities(query)
+        else:
+            # Sorted, so the memmap is read front to back
+            rows = np.array(sorted(
+                self._rows[doc_hash] for doc_hash in set(hashes)
+                if doc_hash in self._rows and self._rows[doc_hash] not in self._removed
+            ), dtype=np.int64)
+            scores = self._map()[rows] @ self.embedder.embed(query) if len(rows) else np.zeros(0, dtype=np.float32)
+        if len(scores) == 0:
+            return []
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        if rows is not None:
+            return [(self._hashes[rows[index]], float(scores[index])) for index in best]
+        return [(self._hashes[row], float(scores[row])) for row in best if row not in self._removed]
+
+    async def index_batch(self, batch: List[Any]):
+        """Write-behind commit hook: embed CV texts of the batch"""
+        documents = [
+            (item.cv_row.content_hash, item.cv_text)
+            for item in batch if item.cv_row.content_hash and item.cv_text
+        ]
+        if documents:
+            await self.add_many_async(documents)
+
+    def start_loading(self, session_factory=async_session_factory):
+        """Embed stored CV texts missing from the matrix file in the background"""
+        if self._load_task is None:
+            self._load_task = asyncio.create_task(self._sync(session_factory), name="embedding-index-sync")
+
+    async def stop(self):
+        if self._load_task is not None:
+            self._load_task.cancel()
+            try:
+                await self._load_task
+            except asyncio.CancelledError:
+                pass
+            self._load_task = None
+
+    async def _sync(self, session_factory, batch_size: int = 500):
+        try:
+            present = set()
+            added = 0
+            last_hash = ""
+            while True:
+                async with session_factory() as session:
+                    hashes = (await session.exec(
+                        select(CVContent.hash).where(CVContent.hash > last_hash).order_by(CVContent.hash).limit(batch_size)
+                    )).all()
+                    missing = [doc_hash for doc_hash in hashes if doc_hash not in self._rows]
+                    if missing:
+                        rows = (await session.exec(
+                            select(CVContent.hash, CVContent.content).where(CVContent.hash.in_(missing))
+                        )).all()
+                if missing:
+                    added += await self.add_many_async(rows)
+                if not hashes:
+                    break
+                present.update(hashes)
+                last_hash = hashes[-1]
+
+            for doc_hash in self._rows.keys() - present:
+                self.remove(doc_hash)
+            self.ready = True
+            logger.info(f"Embedding index ready: {self.document_count} CVs ({added} embedded at startup)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to sync embedding index: {str(e)}")
@@ -1,9 +1,25 @@
 import logging
+import struct
+from contextlib import nullcontext
+from typing import BinaryIO, Optional, Union
 from fastapi import UploadFile
 import os
 
 logger = logging.getLogger(__name__)
 
+# Leading bytes needed to recognise every supported format
+SNIFF_BYTES = 8
+
+# File signatures: PDF header, ZIP local file header (DOCX), OLE2 compound file (DOC)
+MAGIC_SIGNATURES = [
+    (b'%PDF-', '.pdf'),
+    (b'PK\x03\x04', '.docx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', '.doc'),
+]
+
+# Larger ZIP central directories are not a CV (a DOCX has a few dozen entries)
+MAX_ZIP_DIRECTORY_BYTES = 1024 * 1024
+
 class FileValidator:
     """Service for validating uploaded files"""
     
@@ -11,6 +27,9 @@ class FileValidator:
         # Maximum file size in bytes (10MB)
         self.max_file_size = 10 * 1024 * 1024
         
+        # Smaller files cannot be a real CV document
+        self.min_file_size = 100
+        
         # Allowed file types and their MIME types
         self.allowed_types = {
             'application/pdf': ['.pdf'],
@@ -28,33 +47,156 @@ class FileValidator:
         Args:
             file: Uploaded file object
             
+        Returns:
+            True if file is valid, False otherwise
+        """
+        return self.is_valid_upload(file.filename, file.content_type)
+    
+    def is_valid_upload(self, filename: Optional[str], content_type: Optional[str]) -> bool:
+        """
+        Check the declared name and type of an upload before reading its body
+        
+        Only the extension can reject the upload. The declared MIME type is
+        a hint (browsers and HTTP clients often send application/octet-stream
+        or a type that does not match); what counts is the type sniff_type
+        finds in the content.
+        
+        Args:
+            filename: Client-supplied filename
+            content_type: Client-supplied MIME type
+            
         Returns:
             True if file is valid, False otherwise
         """
         try:
             # Check if file has a name
-            if not file.filename:
+            if not filename:
                 logger.warning("File has no filename")
                 return False
             
             # Check file extension
-            file_extension = self._get_file_extension(file.filename)
+            file_extension = self._get_file_extension(filename)
             if not self._is_valid_extension(file_extension):
                 logger.warning(f"Invalid file extension: {file_extension}")
                 return False
             
-            # Check MIME type
-            if not self._is_valid_mime_type(file.content_type, file_extension):
-                logger.warning(f"Invalid MIME type: {file.content_type} for extension {file_extension}")
-                return False
+            # Note a mismatching MIME type; the content is checked by sniff_type
+            if not self._is_valid_mime_type(content_type, file_extension):
+                logger.info(f"Declared MIME type {content_type} does not match {file_extension}; checking the content")
             
-            logger.info(f"File validation passed for: {file.filename}")
+            logger.info(f"File validation passed for: {filename}")
             return True
             
         except Exception as e:
             logger.error(f"Error validating file: {str(e)}")
             return False
     
+    def sniff_type(self, head: bytes) -> Optional[str]:
+        """
+        Detect the document type from the first bytes of its content
+        
+        A ZIP signature only makes a DOCX candidate; confirm it with
+        is_docx_archive once the whole file is available.
+        
+        Args:
+            head: At least SNIFF_BYTES leading bytes (fewer only for tiny files)
+            
+        Returns:
+            The matching extension ('.pdf', '.docx', '.doc') or None
+        """
+        for signature, extension in MAGIC_SIGNATURES:
+            if head.startswith(signature):
+                return extension
+        return None
+    
+    def is_docx_archive(self, file_path: Union[str, BinaryIO]) -> bool:
+        """
+        Check that a ZIP file's central directory lists word/document.xml
+        
+        Only the end of central directory record and the directory itself
+        are read (a few KB for a DOCX), not the compressed entries.
+        
+        Args:
+            file_path: Path to (or binary file object of) a ZIP file
+            
+        Returns:
+            True if the archive is a Word document, False otherwise
+        """
+        try:
+            opened = open(file_path, 'rb') if isinstance(file_path, str) else nullcontext(file_path)
+            with opened as f:
+                file_size = f.seek(0, os.SEEK_END)
+                # The end record is 22 bytes plus an archive comment of up to 64KB
+                tail_size = min(file_size, 22 + 65535)
+                f.seek(file_size - tail_size)
+                tail = f.read(tail_size)
+                end_record = tail.rfind(b'PK\x05\x06')
+                if end_record < 0 or len(tail) - end_record < 22:
+                    return False
+                directory_size, directory_offset = struct.unpack_from('<II', tail, end_record + 12)
+                if directory_size > MAX_ZIP_DIRECTORY_BYTES or directory_offset + directory_size > file_size:
+                    return False
+                f.seek(directory_offset)
+                directory = f.read(directory_size)
+            
+            # Walk the central directory file headers (46 bytes + name + extra + comment)
+            position = 0
+            while position + 46 <= len(directory) and directory[position:position + 4] == b'PK\x01\x02':
+                name_length, extra_length, comment_length = struct.unpack_from('<HHH', directory, position + 28)
+                name = directory[position + 46:position + 46 + name_length]
+                if name == b'word/document.xml':
+                    return True
+                position += 46 + name_length + extra_length + comment_length
+            return False
+            
+        except Exception as e:
+            logger.error(f"Error reading ZIP directory: {str(e)}")
+            return False
+    
+    def sniff_file(self, file_path: str) -> Optional[str]:
+        """
+        Detect the document type of a file on disk from its content
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            The matching extension ('.pdf', '.docx', '.doc') or None
+        """
+        with open(file_path, 'rb') as f:
+            detected_type = self.sniff_type(f.read(SNIFF_BYTES))
+        if detected_type == '.docx' and not self.is_docx_archive(file_path):
+            return None
+        return detected_type
+    
+    def mime_type_for(self, extension: str) -> Optional[str]:
+        """MIME type of a supported extension (used to pick the extractor)"""
+        for mime_type, extensions in self.allowed_types.items():
+            if extension in extensions:
+                return mime_type
+        return None
+    
+    @property
+    def type_error(self) -> str:
+        """Client-facing message for a rejected file type"""
+        return f"Invalid file type. Only {self._type_names('and')} files are allowed."
+    
+    @property
+    def content_error(self) -> str:
+        """Client-facing message for content that matches no allowed type"""
+        return f"File content is not a {self._type_names('or')} document."
+    
+    @property
+    def size_error(self) -> str:
+        """Client-facing message for a file over the size limit"""
+        return f"File size too large. Maximum size is {self.max_file_size // (1024 * 1024)}MB."
+    
+    def _type_names(self, conjunction: str) -> str:
+        names = [extension.lstrip('.').upper() for extension in self.allowed_extensions]
+        if len(names) < 3:
+            return f" {conjunction} ".join(names)
+        return f"{', '.join(names[:-1])}, {conjunction} {names[-1]}"
+    
     def is_valid_size(self, file: UploadFile) -> bool:
         """
         Check if the file size is within limits
@@ -77,7 +219,7 @@ class FileValidator:
                 return False
             
             # Check if file size is reasonable (not too small)
-            if file.size < 100:  # Less than 100 bytes
+            if file.size < self.min_file_size:
                 logger.warning(f"File size {file.size} is too small")
                 return False
             
@@ -109,17 +251,7 @@ class FileValidator:
             # Check if extension matches the MIME type
             return extension in self.allowed_types[mime_type]
         
-        # If MIME type is not recognized, check if it's a generic type
-        # that might be acceptable for the given extension
-        generic_mime_types = {
-            '.pdf': ['application/octet-stream', 'binary/octet-stream'],
-            '.docx': ['application/octet-stream', 'binary/octet-stream'],
-            '.doc': ['application/octet-stream', 'binary/octet-stream']
-        }
-        
-        if extension in generic_mime_types:
-            return mime_type in generic_mime_types[extension]
-        
+        # Generic types such as application/octet-stream say nothing about the content
         return False
     
     def get_file_info(self, file: UploadFile) -> dict:
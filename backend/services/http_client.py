@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limited or a transient upstream failure
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class HTTPClient:
+    """
+    Shared async HTTP client for outbound API calls
+
+    One pooled httpx.AsyncClient (keep-alive, bounded connections) is
+    created in the app lifespan and reused by every caller. Requests time
+    out after HTTP_TIMEOUT_SECONDS, at most HTTP_MAX_CONCURRENCY run at
+    once, and connection errors or 429/502/503/504 responses are retried
+    up to HTTP_MAX_RETRIES times with full-jitter exponential backoff
+    (honouring Retry-After). Non-idempotent methods are only retried when
+    the caller passes `retry=True`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "",
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.2,
+        backoff_cap: float = 5.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = base_url
+        self.timeout = timeout or float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+        self.max_connections = max_connections or int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+        self.max_keepalive = max_keepalive or int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+        self.max_concurrency = max_concurrency or int(os.getenv("HTTP_MAX_CONCURRENCY", "20"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("HTTP_MAX_RETRIES", "3"))
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.transport = transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=30.0,
+                ),
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_cap)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def request(self, method: str, url: str, retry: Optional[bool] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request, retrying transient failures
+
+        Returns the last response (the caller checks its status); raises
+        httpx.HTTPError if no response was received after the last attempt.
+        """
+        if self._client is None:
+            await self.start()
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.max_retries if retry else 0)
+
+        for attempt in range(attempts):
+            response = None
+            try:
+                async with self._semaphore:
+                    self.requests += 1
+                    response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+            except httpx.TransportError as e:
+                if attempt == attempts - 1:
+                    self.failures += 1
+                    raise
+                logger.warning(f"{method} {url} failed ({type(e).__name__}), retrying")
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
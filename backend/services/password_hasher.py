@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# bcrypt only uses the first 72 bytes of a password
+_BCRYPT_MAX_BYTES = 72
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8")[:_BCRYPT_MAX_BYTES], bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8")[:_BCRYPT_MAX_BYTES], hashed_password.encode("ascii"))
+
+
+def _percentile(samples: Deque[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password operations are already waiting for a worker"""
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification off the event loop
+
+    Operations run on a dedicated executor (threads by default: bcrypt
+    releases the GIL; PASSWORD_HASH_EXECUTOR=process for a process pool)
+    with at most PASSWORD_HASH_WORKERS running at once. Callers beyond that
+    wait on a semaphore; once PASSWORD_HASH_MAX_WAITING are waiting, new
+    calls fail fast with PasswordHasherBusy instead of piling up. Queue and
+    run times of recent operations are kept for stats().
+    """
+
+    def __init__(
+        self,
+        rounds: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_waiting: Optional[int] = None,
+        executor_kind: Optional[str] = None,
+        rehash_on_login: Optional[bool] = None
+    ):
+        self.rounds = rounds or int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+        self.workers = workers or int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.max_waiting = max_waiting if max_waiting is not None else int(os.getenv("PASSWORD_HASH_MAX_WAITING", "64"))
+        self.executor_kind = executor_kind or os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+        if rehash_on_login is None:
+            rehash_on_login = os.getenv("PASSWORD_REHASH_ON_LOGIN", "false").lower() == "true"
+        self.rehash_on_login = rehash_on_login
+
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._queue_ms: Deque[float] = deque(maxlen=1024)
+        self._run_ms: Deque[float] = deque(maxlen=1024)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _submit(self, function: Callable[..., Any], *args) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self._queue_ms.append((started_at - queued_at) * 1000)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), function, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._run_ms.append((time.perf_counter() - started_at) * 1000)
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a stored hash uses a different cost factor than configured"""
+        try:
+            return int(hashed_password.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "queue_ms_p50": _percentile(self._queue_ms, 0.5),
+            "queue_ms_p95": _percentile(self._queue_ms, 0.95),
+            "run_ms_p50": _percentile(self._run_ms, 0.5),
+            "run_ms_p95": _percentile(self._run_ms, 0.95),
+        }
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Truncated SHA-256: collisions are irrelevant at any realistic revocation count
+DIGEST_BYTES = 16
+
+# Expired rows are deleted from the backend at startup and then at this interval
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def token_digest(token_id: str) -> bytes:
+    """Fixed-size key of a token's `jti` (or of the token itself when it has none)"""
+    return hashlib.sha256(token_id.encode("utf-8")).digest()[:DIGEST_BYTES]
+
+
+class RevocationBackend(ABC):
+    """
+    Persistence for revoked token digests (blocking calls)
+
+    `changes_since` returns rows added after a cursor so every process
+    sharing the backend can pick up revocations made by the others.
+    """
+
+    @abstractmethod
+    def add(self, digest: bytes, expires_at: int):
+        ...
+
+    @abstractmethod
+    def changes_since(self, cursor: int) -> Tuple[int, List[Tuple[bytes, int]]]:
+        """New (digest, expires_at) rows and the cursor to pass next time"""
+
+    @abstractmethod
+    def purge(self, now: int) -> int:
+        """Delete rows that expired before `now`; returns how many"""
+
+    def close(self):
+        pass
+
+
+class MemoryRevocationBackend(RevocationBackend):
+    """No persistence: revocations live as long as the process"""
+
+    def add(self, digest: bytes, expires_at: int):
+        pass
+
+    def changes_since(self, cursor: int) -> Tuple[int, List[Tuple[bytes, int]]]:
+        return cursor, []
+
+    def purge(self, now: int) -> int:
+        return 0
+
+
+class SQLiteRevocationBackend(RevocationBackend):
+    """Local SQLite file shared by the workers of one host (WAL mode)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_token ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "digest BLOB NOT NULL UNIQUE, "
+            "expires_at INTEGER NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_revoked_token_expires_at ON revoked_token (expires_at)")
+
+    def add(self, digest: bytes, expires_at: int):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO revoked_token (digest, expires_at) VALUES (?, ?)",
+                (digest, expires_at),
+            )
+
+    def changes_since(self, cursor: int) -> Tuple[int, List[Tuple[bytes, int]]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, digest, expires_at FROM revoked_token WHERE id > ? ORDER BY id",
+                (cursor,),
+            ).fetchall()
+        if not rows:
+            return cursor, []
+        return rows[-1][0], [(digest, expires_at) for _, digest, expires_at in rows]
+
+    def purge(self, now: int) -> int:
+        with self._lock:
+            return self._connection.execute("DELETE FROM revoked_token WHERE expires_at <= ?", (now,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class RevocationStore:
+    """
+    Revoked tokens until they would have expired anyway
+
+    Entries are 16-byte digests mapped to the token's `exp`; a min-heap on
+    `exp` drops them as soon as the token could no longer verify, so memory
+    tracks live revocations only. Lookups are a dict probe. Revocations are
+    written through to the backend, and lookups pull other processes'
+    revocations from it at most every REVOCATION_SYNC_SECONDS. Backend
+    calls run in a worker thread; the backend configured by
+    REVOCATION_BACKEND is opened by `start()` (or on first use), not when
+    the store is built.
+    """
+
+    def __init__(self, backend: Optional[RevocationBackend] = None, sync_interval: Optional[float] = None):
+        self.backend = backend
+        self.sync_interval = sync_interval if sync_interval is not None else float(os.getenv("REVOCATION_SYNC_SECONDS", "1"))
+
+        self._expiry: Dict[bytes, int] = {}
+        self._heap: List[Tuple[int, bytes]] = []
+        self._cursor = 0
+        self._synced_at = 0.0
+        self._purged_at = 0.0
+        self._open_lock = asyncio.Lock()
+
+    async def start(self):
+        """Open the backend and load the revocations it holds"""
+        await self._sync(force=True)
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+
+    async def _get_backend(self) -> RevocationBackend:
+        async with self._open_lock:
+            if self.backend is None:
+                self.backend = await asyncio.to_thread(self._backend_from_env)
+        return self.backend
+
+    @staticmethod
+    def _backend_from_env() -> RevocationBackend:
+        if os.getenv("REVOCATION_BACKEND", "sqlite").lower() == "memory":
+            return MemoryRevocationBackend()
+        return SQLiteRevocationBackend(os.getenv("REVOCATION_DB_PATH", "./revoked_tokens.db"))
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    async def revoke(self, token_id: str, expires_at: int):
+        """Revoke a token by `jti` (or full token) until its `exp` (epoch seconds)"""
+        if expires_at <= time.time():
+            return
+        digest = token_digest(token_id)
+        self._remember(digest, expires_at)
+        try:
+            backend = await self._get_backend()
+            await asyncio.to_thread(backend.add, digest, expires_at)
+        except Exception as e:
+            logger.error(f"Failed to persist token revocation: {str(e)}")
+
+    async def is_revoked(self, token_id: str) -> bool:
+        await self._sync()
+        now = int(time.time())
+        self._evict(now)
+        expires_at = self._expiry.get(token_digest(token_id))
+        return expires_at is not None and expires_at > now
+
+    def _remember(self, digest: bytes, expires_at: int):
+        if self._expiry.get(digest, 0) < expires_at:
+            self._expiry[digest] = expires_at
+            heapq.heappush(self._heap, (expires_at, digest))
+
+    def _evict(self, now: int):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, digest = heapq.heappop(self._heap)
+            if self._expiry.get(digest) == expires_at:
+                del self._expiry[digest]
+
+    async def _sync(self, force: bool = False):
+        if not force and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = time.monotonic()
+        try:
+            backend = await self._get_backend()
+            if force or self._synced_at - self._purged_at > PURGE_INTERVAL_SECONDS:
+                self._purged_at = self._synced_at
+                await asyncio.to_thread(backend.purge, int(time.time()))
+            self._cursor, rows = await asyncio.to_thread(backend.changes_since, self._cursor)
+        except Exception as e:
+            logger.error(f"Failed to sync token revocations: {str(e)}")
+            return
+        for digest, expires_at in rows:
+            self._remember(digest, expires_at)
+
+    async def purge(self) -> int:
+        """Delete expired revocations from the backend"""
+        backend = await self._get_backend()
+        return await asyncio.to_thread(backend.purge, int(time.time()))
+
+    def stats(self) -> Dict[str, int]:
+        return {"live_revocations": len(self._expiry)}
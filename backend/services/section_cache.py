@@ -0,0 +1,60 @@
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import SectionFinding, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class SectionFindingCache:
+    """Per-section findings keyed by (section hash, job description hash, user)"""
+
+    def __init__(self):
+        self.enabled = os.getenv("INCREMENTAL_ANALYSIS", "true").lower() == "true"
+
+    async def load(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        jd_hash: str,
+        section_hashes: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Findings already stored for any of the given sections"""
+        if not section_hashes:
+            return {}
+        rows = (await session.exec(
+            select(SectionFinding.section_hash, SectionFinding.findings).where(
+                SectionFinding.section_hash.in_(section_hashes),
+                SectionFinding.jd_hash == jd_hash,
+                SectionFinding.user_id == user_id,
+            )
+        )).all()
+        return {section_hash: findings for section_hash, findings in rows}
+
+    async def save(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        jd_hash: str,
+        findings: Dict[str, Dict[str, Any]]
+    ):
+        """Store findings of newly analyzed sections (existing keys are kept; not committed)"""
+        if not findings:
+            return
+        now = datetime.utcnow()
+        statement = dialect_insert(session.bind, SectionFinding).values([
+            {
+                "section_hash": section_hash,
+                "jd_hash": jd_hash,
+                "user_id": user_id,
+                "findings": section_findings,
+                "created_at": now,
+            }
+            for section_hash, section_findings in findings.items()
+        ]).on_conflict_do_nothing(index_elements=["section_hash", "jd_hash", "user_id"])
+        await session.execute(statement)
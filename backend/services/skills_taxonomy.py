@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from database.model import content_hash, normalize_content
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAXONOMY_PATH = Path(__file__).resolve().parent.parent / "data" / "skills_taxonomy.json"
+
+# Characters that continue a token: a match must not be preceded or followed by
+# one, so "java" does not match inside "javascript" nor "c" inside "c++".
+# A preceding "." or "-" also continues it ("js" in "react.js", "c" in "objective-c").
+_WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789+#")
+_PREFIX_CHARS = _WORD_CHARS | {".", "-"}
+
+
+class SkillTaxonomy:
+    """
+    Canonical skills with aliases and categories, matched in one pass
+
+    All names and aliases are compiled into an Aho-Corasick automaton over
+    the lowercased, whitespace-normalized text, so extracting every skill
+    from a document is a single linear scan regardless of taxonomy size.
+    Case-sensitive skills ("Go", "R", "Swift") are verified against the
+    original text. Results are cached per document hash; extraction is
+    safe to run from worker threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, cache_size: Optional[int] = None):
+        self.path = Path(path or os.getenv("SKILLS_TAXONOMY_PATH") or DEFAULT_TAXONOMY_PATH)
+        self.cache_size = cache_size or int(os.getenv("SKILLS_CACHE_SIZE", "1024"))
+        self.categories: Dict[str, str] = {}
+
+        # Automaton: per state, its transitions, failure link and the patterns ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, str, Optional[str]]]] = [[]]
+        self._cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self._compile(self._load())
+
+    def _load(self) -> List[dict]:
+        with open(self.path, encoding="utf-8") as taxonomy:
+            skills = json.load(taxonomy)["skills"]
+        logger.info(f"Loaded {len(skills)} skills from {self.path}")
+        return skills
+
+    def _compile(self, skills: List[dict]):
+        for skill in skills:
+            name = skill["name"]
+            self.categories[name] = skill.get("category", "Other")
+            for alias in [name, *skill.get("aliases", [])]:
+                pattern = normalize_content(alias)
+                # Case-sensitive patterns keep their original spelling for verification
+                exact = pattern if skill.get("case_sensitive") else None
+                self._add_pattern(pattern.lower(), name, exact)
+
+        # Breadth-first failure links; outputs of the failure state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def _add_pattern(self, pattern: str, name: str, exact: Optional[str]):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = nxt
+        self._outputs[state].append((len(pattern), name, exact))
+
+    def extract(self, text: str) -> Dict[str, str]:
+        """Canonical skills found in a text, mapped to their category"""
+        key = content_hash(text)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        skills = self._scan(normalize_content(text))
+        with self._cache_lock:
+            self._cache[key] = skills
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return skills
+
+    def _scan(self, original: str) -> Dict[str, str]:
+        text = original.lower()
+        # Exact-case checks need character positions to line up
+        aligned = len(text) == len(original)
+        found: Dict[str, str] = {}
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, name, exact in self._outputs[state]:
+                if name in found:
+                    continue
+                start = end - length
+                if start > 0 and text[start - 1] in _PREFIX_CHARS:
+                    continue
+                if end < len(text) and text[end] in _WORD_CHARS:
+                    continue
+                if exact is not None and (not aligned or original[start:end] != exact):
+                    continue
+                found[name] = self.categories[name]
+        return found
+
+    def compare(self, cv_text: str, job_description: str) -> Tuple[List[str], List[str], Dict[str, str]]:
+        """Skills required by the job description that the CV has / lacks"""
+        cv_skills = self.extract(cv_text)
+        jd_skills = self.extract(job_description)
+        matched = [name for name in jd_skills if name in cv_skills]
+        missing = [name for name in jd_skills if name not in cv_skills]
+        return matched, missing, jd_skills
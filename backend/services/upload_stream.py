@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+
+from services.file_validator import SNIFF_BYTES, FileValidator
+
+logger = logging.getLogger(__name__)
+
+# Allowance on top of the file size limit for form fields and part headers
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """The request body was refused before it was fully received"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class ReceivedUpload:
+    """A multipart upload written to a temporary file while it streamed in"""
+    filename: str
+    content_type: Optional[str]
+    path: str
+    size: int
+    sha256: str
+    detected_type: Optional[str]
+    fields: Dict[str, str] = field(default_factory=dict)
+
+    def cleanup(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+            logger.info(f"Cleaned up temporary file: {self.path}")
+
+
+class UploadReceiver:
+    """
+    Parse a multipart/form-data request as it streams in
+
+    The file part is written straight to a temporary file while its SHA-256
+    is computed, so the body is never buffered in memory or copied again.
+    Uploads are refused as early as possible: an oversized Content-Length
+    before reading anything, a bad filename/type once the part headers are
+    in, content without a known document signature after its first bytes
+    (a ZIP must also list word/document.xml), and a body growing past the
+    size limit at the chunk that crosses it. `detected_type` is what the
+    content is, whatever the client declared.
+    """
+
+    def __init__(
+        self,
+        validator: Optional[FileValidator] = None,
+        file_field: str = "cv_file",
+        max_field_bytes: int = 256 * 1024
+    ):
+        self.validator = validator or FileValidator()
+        self.file_field = file_field
+        self.max_field_bytes = max_field_bytes
+
+    async def receive(self, request: Request) -> ReceivedUpload:
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        boundary = options.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise UploadRejected(400, "Expected a multipart/form-data upload")
+
+        max_file_size = self.validator.max_file_size
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_file_size + FORM_OVERHEAD_BYTES:
+            raise UploadRejected(413, self.validator.size_error)
+
+        state = _ParseState(self, max_file_size)
+        parser = MultipartParser(boundary, state.callbacks())
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+            parser.finalize()
+            return state.result()
+        except UploadRejected:
+            state.discard()
+            raise
+        except Exception as e:
+            state.discard()
+            logger.warning(f"Malformed multipart upload: {str(e)}")
+            raise UploadRejected(400, "Malformed multipart upload")
+
+
+class _ParseState:
+    """Callback state of one MultipartParser run"""
+
+    def __init__(self, receiver: UploadReceiver, max_file_size: int):
+        self.receiver = receiver
+        self.validator = receiver.validator
+        self.max_file_size = max_file_size
+
+        self.fields: Dict[str, str] = {}
+        self.headers: Dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+
+        self.part_name: Optional[str] = None
+        self.part_buffer = bytearray()
+        self.file = None
+        self.filename: Optional[str] = None
+        self.file_content_type: Optional[str] = None
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.head = bytearray()
+        self.detected_type: Optional[str] = None
+        self.sniffed = False
+        self.received_file = False
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+        self.part_name = None
+        self.part_buffer = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        self.part_name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            return
+        if self.part_name != self.receiver.file_field or self.received_file:
+            raise UploadRejected(400, "Unexpected file in upload")
+
+        filename = options[b"filename"].decode("utf-8", "replace")
+        content_type = self.headers.get(b"content-type", b"").decode("latin-1") or None
+        if not self.validator.is_valid_upload(filename, content_type):
+            raise UploadRejected(400, self.validator.type_error)
+
+        self.filename = filename
+        self.file_content_type = content_type
+        self.file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1].lower())
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        chunk = data[start:end]
+        if self.file is None:
+            self.part_buffer += chunk
+            if len(self.part_buffer) > self.receiver.max_field_bytes:
+                raise UploadRejected(413, f"Form field '{self.part_name}' is too large")
+            return
+
+        self.size += len(chunk)
+        if self.size > self.max_file_size:
+            raise UploadRejected(413, self.validator.size_error)
+        if not self.sniffed:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._sniff()
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+
+    def on_part_end(self):
+        if self.file is None:
+            if self.part_name:
+                self.fields[self.part_name] = self.part_buffer.decode("utf-8", "replace")
+            return
+
+        if not self.sniffed:
+            self._sniff()
+        if self.size < self.validator.min_file_size:
+            raise UploadRejected(400, f"File is too small ({self.size} bytes)")
+        self.file.close()
+        if self.detected_type == ".docx" and not self.validator.is_docx_archive(self.file.name):
+            raise UploadRejected(400, self.validator.content_error)
+        if self.detected_type != os.path.splitext(self.filename)[1].lower():
+            logger.info(f"{self.filename} was declared {self.file_content_type} but contains {self.detected_type}")
+        self.received_file = True
+        self.upload = ReceivedUpload(
+            filename=self.filename,
+            content_type=self.file_content_type,
+            path=self.file.name,
+            size=self.size,
+            sha256=self.sha256.hexdigest(),
+            detected_type=self.detected_type,
+        )
+        self.file = None
+
+    def _sniff(self):
+        self.sniffed = True
+        self.detected_type = self.validator.sniff_type(bytes(self.head))
+        if self.detected_type is None:
+            raise UploadRejected(400, self.validator.content_error)
+
+    def result(self) -> ReceivedUpload:
+        if not self.received_file:
+            raise UploadRejected(422, f"Missing file field '{self.receiver.file_field}'")
+        self.upload.fields = self.fields
+        return self.upload
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            os.unlink(self.file.name)
+            self.file = None
+        if self.received_file:
+            self.upload.cleanup()
@@ -0,0 +1,122 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens (input, output). Override with OPENAI_PRICE_INPUT / OPENAI_PRICE_OUTPUT.
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "mock": (0.0, 0.0),
+}
+
+# Stages recorded for every analysis, in pipeline order
+STAGES = ("extraction", "prompt_build", "llm", "parse", "normalize", "db_write")
+
+
+class AnalysisUsage:
+    """Token, cost and per-stage latency accounting for a single CV analysis"""
+
+    def __init__(self):
+        self.model: Optional[str] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prompt_chars = 0
+        self.cache_hit = False
+        self.fallback = False
+        self.timings_ms: Dict[str, float] = {}
+        self.total_ms: Optional[float] = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a pipeline stage; repeated stages accumulate"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_timing(name, (time.perf_counter() - start) * 1000)
+
+    def add_timing(self, name: str, elapsed_ms: float):
+        """Record time spent in a stage that cannot be wrapped in stage()"""
+        self.timings_ms[name] = self.timings_ms.get(name, 0.0) + elapsed_ms
+
+    def record_completion(self, model: str, response: Any):
+        """Record model and token counts from an OpenAI chat completion"""
+        self.model = getattr(response, "model", None) or model
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            logger.warning("OpenAI response did not include token usage")
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def finish(self):
+        """Freeze the end-to-end latency of the request path"""
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self._started) * 1000
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost_usd(self) -> float:
+        input_price, output_price = _pricing_for(self.model)
+        return round(
+            (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1_000_000,
+            6,
+        )
+
+    def to_metadata(self) -> Dict[str, Any]:
+        """Usage summary attached to the analysis response"""
+        return {
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cost_usd": self.cost_usd,
+            "cache_hit": self.cache_hit,
+            "fallback": self.fallback,
+            "timings_ms": {name: round(ms, 2) for name, ms in self.timings_ms.items()},
+            "total_ms": round(self.total_ms, 2) if self.total_ms is not None else None,
+        }
+
+    def to_columns(self, model_class: Optional[type] = None) -> Dict[str, Any]:
+        """Column values for the AnalysisResult row, or the subset a given table model has"""
+        columns = {
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": self.cost_usd,
+            "prompt_chars": self.prompt_chars,
+            "cache_hit": self.cache_hit,
+            "fallback": self.fallback,
+            "total_ms": self.total_ms,
+        }
+        for name in STAGES:
+            columns[f"{name}_ms"] = self.timings_ms.get(name)
+        if model_class is not None:
+            columns = {key: value for key, value in columns.items() if key in model_class.model_fields}
+        return columns
+
+
+def _pricing_for(model: Optional[str]):
+    input_override = os.getenv("OPENAI_PRICE_INPUT")
+    output_override = os.getenv("OPENAI_PRICE_OUTPUT")
+    if input_override and output_override:
+        return float(input_override), float(output_override)
+
+    if not model:
+        return 0.0, 0.0
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their base model
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICING[name]
+    logger.warning(f"No pricing configured for model: {model}")
+    return 0.0, 0.0
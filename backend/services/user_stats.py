@@ -0,0 +1,148 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import AnalysisResult, CVFile, UserStats, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class UserStatsService:
+    """Maintains per-user counters so stats reads are a single primary-key lookup"""
+
+    async def record_batch(self, session: AsyncSession, batch: List[Any]):
+        """
+        Write-behind flush hook: fold a batch of new analyses into the counters
+
+        Runs inside the flush transaction, after the batch rows were inserted.
+        Users without a counter row yet are initialized from SQL aggregates
+        (which already include this batch); existing rows are incremented.
+        """
+        per_user: Dict[int, List[AnalysisResult]] = {}
+        for item in batch:
+            row = item.analysis_row
+            if row.user_id is not None:
+                per_user.setdefault(row.user_id, []).append(row)
+        if not per_user:
+            return
+
+        existing = set((await session.exec(
+            select(UserStats.user_id).where(UserStats.user_id.in_(per_user.keys()))
+        )).all())
+
+        for user_id, rows in per_user.items():
+            if user_id not in existing and await self._initialize(session, user_id):
+                continue
+            await self._increment(session, user_id, rows)
+
+    async def get_stats(self, session: AsyncSession, user_id: int) -> UserStats:
+        """Counter row for a user, built from aggregates on first access"""
+        stats = await session.get(UserStats, user_id)
+        if stats is None:
+            await self._initialize(session, user_id)
+            await session.commit()
+            stats = await session.get(UserStats, user_id)
+        return stats
+
+    @staticmethod
+    def to_response(stats: UserStats) -> Dict[str, Any]:
+        average = round(stats.score_sum / stats.score_count, 1) if stats.score_count else None
+        trend = None
+        if stats.last_score is not None and stats.previous_score is not None:
+            trend = stats.last_score - stats.previous_score
+        return {
+            "cv_uploads": stats.cv_count,
+            "analyses_completed": stats.analysis_count,
+            "average_score": average,
+            "last_score": stats.last_score,
+            "score_trend": trend,
+            "last_analysis_at": stats.last_analysis_at,
+        }
+
+    async def _initialize(self, session: AsyncSession, user_id: int) -> bool:
+        """Insert the counter row from SQL aggregates; False if it already existed"""
+        cv_count = (await session.exec(
+            select(func.count()).select_from(CVFile).where(CVFile.user_id == user_id)
+        )).one()
+
+        analysis_count, score_count, score_sum, last_analysis_at = (await session.exec(
+            select(
+                func.count(AnalysisResult.id),
+                func.count(AnalysisResult.overall_score),
+                func.coalesce(func.sum(AnalysisResult.overall_score), 0),
+                func.max(AnalysisResult.created_at),
+            ).where(AnalysisResult.user_id == user_id)
+        )).one()
+
+        recent_scores = (await session.exec(
+            select(AnalysisResult.overall_score)
+            .where(AnalysisResult.user_id == user_id, AnalysisResult.overall_score.is_not(None))
+            .order_by(AnalysisResult.created_at.desc(), AnalysisResult.id.desc())
+            .limit(2)
+        )).all()
+
+        statement = dialect_insert(session.bind, UserStats).values(
+            user_id=user_id,
+            cv_count=cv_count,
+            analysis_count=analysis_count,
+            score_count=score_count,
+            score_sum=score_sum,
+            last_score=recent_scores[0] if recent_scores else None,
+            previous_score=recent_scores[1] if len(recent_scores) > 1 else None,
+            last_analysis_at=_as_datetime(last_analysis_at),
+            updated_at=datetime.utcnow(),
+        ).on_conflict_do_nothing(index_elements=["user_id"])
+        result = await session.execute(statement)
+        return result.rowcount == 1
+
+    async def _increment(self, session: AsyncSession, user_id: int, rows: List[AnalysisResult]):
+        rows = sorted(rows, key=lambda row: (row.created_at, row.id))
+        scores = [row.overall_score for row in rows if row.overall_score is not None]
+
+        # SET expressions referencing UserStats columns read the pre-update row
+        if len(scores) >= 2:
+            previous_score = scores[-2]
+        elif scores:
+            previous_score = UserStats.last_score
+        else:
+            previous_score = UserStats.previous_score
+
+        statement = dialect_insert(session.bind, UserStats).values(
+            user_id=user_id,
+            cv_count=len(rows),
+            analysis_count=len(rows),
+            score_count=len(scores),
+            score_sum=sum(scores),
+            last_score=scores[-1] if scores else None,
+            previous_score=scores[-2] if len(scores) >= 2 else None,
+            last_analysis_at=rows[-1].created_at,
+            updated_at=datetime.utcnow(),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                "cv_count": UserStats.cv_count + len(rows),
+                "analysis_count": UserStats.analysis_count + len(rows),
+                "score_count": UserStats.score_count + len(scores),
+                "score_sum": UserStats.score_sum + sum(scores),
+                "last_score": scores[-1] if scores else UserStats.last_score,
+                "previous_score": previous_score,
+                "last_analysis_at": case(
+                    (UserStats.last_analysis_at > rows[-1].created_at, UserStats.last_analysis_at),
+                    else_=rows[-1].created_at
+                ),
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        await session.execute(statement)
+
+
+def _as_datetime(value: Optional[Any]) -> Optional[datetime]:
+    # SQLite returns MAX() over a DATETIME column as text
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
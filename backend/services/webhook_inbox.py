@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import ConsumerLease, WebhookEvent, async_session_factory, dialect_insert
+from services.clerk_service import ClerkService
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+USER_EVENTS = {"user.created", "user.updated", "user.deleted"}
+
+# ConsumerLease row that makes one worker the inbox consumer
+LEASE_NAME = "webhook-inbox"
+
+# Re-read this much of the processed log on each look, for commit delays and clock skew
+INVALIDATION_OVERLAP = timedelta(seconds=10)
+
+
+class WebhookInbox:
+    """
+    Durable inbox for Clerk webhooks, applied by a background consumer
+
+    `receive` stores the raw event keyed by its delivery id (svix-id) with
+    INSERT ... ON CONFLICT DO NOTHING and returns, so the webhook is acked
+    after one small write. Retried deliveries hit an in-memory set of
+    recent ids first and the primary key otherwise. The consumer reads
+    pending events in batches, groups them by user in event-time order,
+    writes only each user's latest state (skipping events older than one
+    already applied) with one bulk upsert and one bulk deactivation, and
+    marks the batch processed in the same transaction.
+    A failing batch is retried user by user; events failing
+    WEBHOOK_MAX_ATTEMPTS times are parked with their error.
+
+    Every worker runs the loop, but only the holder of the "webhook-inbox"
+    ConsumerLease applies events: each batch transaction first renews (or
+    takes over an expired) lease with a conditional UPDATE, which also
+    locks the lease row until commit, so two workers never apply events
+    concurrently and per-user order holds. The lease lapses after
+    WEBHOOK_LEASE_SECONDS without a batch. All workers follow the
+    processed events and drop the affected users from their own caches.
+    """
+
+    def __init__(
+        self,
+        clerk_service: Optional[ClerkService] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retention_hours: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        session_factory=async_session_factory
+    ):
+        self.clerk_service = clerk_service or ClerkService()
+        self.batch_size = batch_size or int(os.getenv("WEBHOOK_BATCH_SIZE", "200"))
+        self.poll_interval = poll_interval or float(os.getenv("WEBHOOK_POLL_SECONDS", "2"))
+        self.max_attempts = max_attempts or int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+        self.retention = timedelta(hours=retention_hours or float(os.getenv("WEBHOOK_RETENTION_HOURS", "168")))
+        self.lease = timedelta(seconds=lease_seconds or float(os.getenv("WEBHOOK_LEASE_SECONDS", "30")))
+        self.session_factory = session_factory
+        self.consumer_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._seen: TTLCache[bool] = TTLCache(max_entries=50000, ttl=self.retention.total_seconds())
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = 0.0
+        self._invalidated_until = datetime.utcnow()
+
+        self.received = 0
+        self.duplicates = 0
+        self.applied = 0
+        self.stale = 0
+        self.failed = 0
+        self.last_batch_ms: Optional[float] = None
+
+    async def receive(
+        self,
+        session: AsyncSession,
+        delivery_id: str,
+        event: Dict[str, Any],
+        delivered_at: Optional[int] = None
+    ) -> bool:
+        """Store a delivery for processing; False if it was already received"""
+        if self._seen.get(delivery_id):
+            self.duplicates += 1
+            return False
+
+        event_type = event.get("type", "")
+        data = event.get("data") or {}
+        # Clerk timestamps are milliseconds; fall back to the Svix delivery time
+        event_timestamp = event.get("timestamp") or data.get("updated_at") or (delivered_at or int(time.time())) * 1000
+
+        statement = dialect_insert(session.bind, WebhookEvent).values(
+            delivery_id=delivery_id,
+            event_type=event_type,
+            clerk_user_id=data.get("id") if event_type in USER_EVENTS else None,
+            event_timestamp=int(event_timestamp),
+            payload=event,
+            received_at=datetime.utcnow(),
+            attempts=0,
+        ).on_conflict_do_nothing(index_elements=["delivery_id"]).returning(WebhookEvent.delivery_id)
+        inserted = (await session.execute(statement)).first() is not None
+        await session.commit()
+
+        self._seen.set(delivery_id, True)
+        if not inserted:
+            self.duplicates += 1
+            return False
+        self.received += 1
+        self._wake.set()
+        return True
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="webhook-inbox")
+
+    async def stop(self):
+        """Stop the consumer after applying what is already pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            while await self.process_pending() == self.batch_size:
+                pass
+        except Exception as e:
+            logger.error(f"Error draining webhook inbox: {str(e)}")
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_pending()
+                await self.invalidate_processed()
+                await self._purge_processed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing webhook inbox: {str(e)}")
+                processed = 0
+            if processed < self.batch_size:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _hold_lease(self, session: AsyncSession) -> bool:
+        """
+        Renew or take the consumer lease inside the session's transaction
+
+        The UPDATE row-locks the lease (SQLite: the database) until commit,
+        so a competing worker waits and then sees it renewed.
+        """
+        now = datetime.utcnow()
+        renewed = await session.execute(
+            update(ConsumerLease)
+            .where(
+                ConsumerLease.name == LEASE_NAME,
+                or_(ConsumerLease.owner == self.consumer_id, ConsumerLease.expires_at < now),
+            )
+            .values(owner=self.consumer_id, expires_at=now + self.lease)
+        )
+        if renewed.rowcount == 1:
+            return True
+        created = await session.execute(
+            dialect_insert(session.bind, ConsumerLease)
+            .values(name=LEASE_NAME, owner=self.consumer_id, expires_at=now + self.lease)
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(ConsumerLease.name)
+        )
+        return created.first() is not None
+
+    async def process_pending(self) -> int:
+        """Apply one batch of pending events if this worker holds the lease; returns how many were taken"""
+        started = time.perf_counter()
+        async with self.session_factory() as session:
+            if not await self._hold_lease(session):
+                await session.rollback()
+                return 0
+            events = (await session.exec(
+                select(WebhookEvent)
+                .where(WebhookEvent.processed_at.is_(None))
+                .order_by(WebhookEvent.event_timestamp, WebhookEvent.received_at)
+                .limit(self.batch_size)
+            )).all()
+            if not events:
+                await session.commit()
+                return 0
+
+            groups: "OrderedDict[str, List[WebhookEvent]]" = OrderedDict()
+            for event in events:
+                groups.setdefault(event.clerk_user_id or f"event:{event.delivery_id}", []).append(event)
+            # Taken before applying: a rollback expires the loaded events
+            delivery_ids = {key: [event.delivery_id for event in group] for key, group in groups.items()}
+
+            counts = (self.applied, self.stale)
+            try:
+                await self._apply_groups(session, groups)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                self.applied, self.stale = counts  # the per-user retry counts them again
+                logger.warning(f"Webhook batch failed ({str(e)}), retrying per user")
+                await self._apply_isolated(delivery_ids)
+
+        for key in groups:
+            if not key.startswith("event:"):
+                self.clerk_service.invalidate_user(key)
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Applied {len(events)} webhook events for {len(groups)} users in {self.last_batch_ms:.1f} ms")
+        return len(events)
+
+    async def _apply_groups(self, session: AsyncSession, groups: Dict[str, List[WebhookEvent]]):
+        user_ids = [key for key in groups if not key.startswith("event:")]
+        applied_until: Dict[str, int] = {}
+        if user_ids:
+            rows = (await session.exec(
+                select(WebhookEvent.clerk_user_id, func.max(WebhookEvent.event_timestamp))
+                .where(
+                    WebhookEvent.clerk_user_id.in_(user_ids),
+                    WebhookEvent.processed_at.is_not(None),
+                    WebhookEvent.error.is_(None),  # parked events were never applied
+                )
+                .group_by(WebhookEvent.clerk_user_id)
+            )).all()
+            applied_until = {clerk_user_id: latest for clerk_user_id, latest in rows}
+
+        # Each user's latest event decides its state; earlier ones are superseded
+        snapshots: List[Dict[str, Any]] = []
+        deleted: List[str] = []
+        for key, events in groups.items():
+            latest = events[-1]
+            if latest.event_type not in USER_EVENTS:
+                continue
+            if key in applied_until and latest.event_timestamp < applied_until[key]:
+                self.stale += len(events)
+                logger.info(f"Skipping stale {latest.event_type} for {latest.clerk_user_id}")
+                continue
+            if latest.event_type == "user.deleted":
+                deleted.append(latest.clerk_user_id)
+            else:
+                snapshots.append(latest.payload.get("data") or {})
+            self.applied += len(events)
+
+        await self.clerk_service.upsert_users(session, snapshots)
+        await self.clerk_service.deactivate_users(session, deleted)
+        await session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.delivery_id.in_([event.delivery_id for events in groups.values() for event in events]))
+            .values(processed_at=datetime.utcnow(), attempts=WebhookEvent.attempts + 1, error=None)
+        )
+
+    async def _apply_isolated(self, groups: Dict[str, List[str]]):
+        """Apply a failed batch one user at a time, given delivery ids by user"""
+        for key, delivery_ids in groups.items():
+            async with self.session_factory() as session:
+                if not await self._hold_lease(session):
+                    await session.rollback()
+                    logger.warning("Lost the webhook consumer lease; leaving the rest of the batch")
+                    return
+                try:
+                    # Re-read: the failed batch session's objects were expired by the rollback
+                    fresh = (await session.exec(
+                        select(WebhookEvent)
+                        .where(WebhookEvent.delivery_id.in_(delivery_ids), WebhookEvent.processed_at.is_(None))
+                        .order_by(WebhookEvent.event_timestamp, WebhookEvent.received_at)
+                    )).all()
+                    await self._apply_groups(session, {key: list(fresh)})
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    self.failed += len(delivery_ids)
+                    logger.error(f"Failed to apply webhook events for {key}: {str(e)}")
+                    if not await self._hold_lease(session):
+                        await session.rollback()
+                        return
+                    await session.execute(
+                        update(WebhookEvent)
+                        .where(WebhookEvent.delivery_id.in_(delivery_ids))
+                        .values(attempts=WebhookEvent.attempts + 1, error=str(e)[:500])
+                    )
+                    # Park events that keep failing so they stop blocking the queue
+                    await session.execute(
+                        update(WebhookEvent)
+                        .where(WebhookEvent.delivery_id.in_(delivery_ids), WebhookEvent.attempts >= self.max_attempts)
+                        .values(processed_at=datetime.utcnow())
+                    )
+                    await session.commit()
+
+    async def invalidate_processed(self):
+        """Drop cached users whose events any worker applied since the last look"""
+        since = self._invalidated_until - INVALIDATION_OVERLAP
+        async with self.session_factory() as session:
+            rows = (await session.exec(
+                select(WebhookEvent.clerk_user_id, WebhookEvent.processed_at)
+                .where(WebhookEvent.processed_at > since, WebhookEvent.clerk_user_id.is_not(None))
+            )).all()
+        for clerk_user_id, processed_at in rows:
+            self.clerk_service.invalidate_user(clerk_user_id)
+            self._invalidated_until = max(self._invalidated_until, processed_at)
+
+    async def _purge_processed(self):
+        """Delete processed events past the retention window (at most hourly)"""
+        if time.monotonic() - self._purged_at < 3600:
+            return
+        self._purged_at = time.monotonic()
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(WebhookEvent).where(
+                    WebhookEvent.processed_at.is_not(None),
+                    WebhookEvent.processed_at < datetime.utcnow() - self.retention,
+                )
+            )
+            await session.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "applied": self.applied,
+            "stale": self.stale,
+            "failed": self.failed,
+            "last_batch_ms": round(self.last_batch_ms, 2) if self.last_batch_ms is not None else None,
+        }
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import CVFile, AnalysisResult, async_session_factory
+
+logger = logging.getLogger(__name__)
+
+# Called inside the flush transaction with the rows of the batch
+FlushHook = Callable[[AsyncSession, List["PendingAnalysis"]], Awaitable[None]]
+
+# Called with the rows of the batch once its transaction has committed
+CommitHook = Callable[[List["PendingAnalysis"]], Awaitable[None]]
+
+_DATETIME_FIELDS = {"uploaded_at", "created_at"}
+
+# Errors a retry cannot fix (e.g. a user_id violating a foreign key)
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+
+class PendingAnalysis:
+    """
+    A CV upload and its analysis waiting to be written
+
+    cv_text / jd_text carry the content behind the rows' content hashes until
+    the flush stores it in the content-addressed tables. before_write, if
+    given, runs once before the rows are first serialized.
+    """
+
+    __slots__ = ("cv_row", "analysis_row", "cv_text", "jd_text", "before_write")
+
+    def __init__(
+        self,
+        cv_row: CVFile,
+        analysis_row: AnalysisResult,
+        cv_text: Optional[str] = None,
+        jd_text: Optional[str] = None,
+        before_write: Optional[Callable[[], None]] = None
+    ):
+        self.cv_row = cv_row
+        self.analysis_row = analysis_row
+        self.cv_text = cv_text
+        self.jd_text = jd_text
+        self.before_write = before_write
+
+    def seal(self):
+        """Run the before_write callback if it has not run yet; the rows are final after this"""
+        if self.before_write is not None:
+            before_write, self.before_write = self.before_write, None
+            before_write()
+
+    def to_dict(self, error: Optional[str] = None) -> Dict[str, Any]:
+        self.seal()
+        data = {
+            "cv_row": self.cv_row.model_dump(),
+            "analysis_row": self.analysis_row.model_dump(),
+            "cv_text": self.cv_text,
+            "jd_text": self.jd_text,
+        }
+        if error is not None:
+            data["error"] = error
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PendingAnalysis":
+        rows = {}
+        for key in ("cv_row", "analysis_row"):
+            values = dict(data[key])
+            for field in _DATETIME_FIELDS & values.keys():
+                if isinstance(values[field], str):
+                    values[field] = datetime.fromisoformat(values[field])
+            rows[key] = values
+        return cls(
+            CVFile(**rows["cv_row"]),
+            AnalysisResult(**rows["analysis_row"]),
+            data.get("cv_text"),
+            data.get("jd_text")
+        )
+
+
+class AnalysisWriteBuffer:
+    """
+    In-process write-behind buffer for CV uploads and analysis results
+
+    Requests enqueue rows whose ids were allocated up front and return
+    immediately; a background task writes them in batches, one transaction
+    and one multi-row INSERT per table per batch. A batch that still fails
+    after retries is written again one row at a time, so a bad row only
+    fails itself: rows rejected by the database (integrity or data errors)
+    are parked in WRITE_BEHIND_PARKED_PATH, rows that failed for any other
+    reason are spilled to WRITE_BEHIND_SPILL_PATH and replayed on next
+    start. Both are JSONL files recording each row's error.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session_factory,
+        max_batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        spill_path: Optional[str] = None,
+        parked_path: Optional[str] = None
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size or int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+        self.flush_interval = flush_interval or float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))
+        self.max_pending = max_pending or int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+        self.spill_path = spill_path or os.getenv("WRITE_BEHIND_SPILL_PATH", "./write_behind.spill.jsonl")
+        self.parked_path = parked_path or os.getenv("WRITE_BEHIND_PARKED_PATH", "./write_behind.parked.jsonl")
+        self.max_retries = 3
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pre_insert_hooks: List[FlushHook] = []
+        self._hooks: List[FlushHook] = []
+        self._commit_hooks: List[CommitHook] = []
+
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.spilled_rows = 0
+        self.parked_rows = 0
+        self.last_flush_ms: Optional[float] = None
+
+    def add_flush_hook(self, hook: FlushHook, before_insert: bool = False):
+        """
+        Run `hook(session, batch)` inside every flush transaction
+
+        Hooks registered with before_insert=True run before the batch rows are
+        inserted and may still modify them (e.g. to write referenced rows first).
+        """
+        if before_insert:
+            self._pre_insert_hooks.append(hook)
+        else:
+            self._hooks.append(hook)
+
+    def add_commit_hook(self, hook: CommitHook):
+        """
+        Run `hook(batch)` after every flush transaction commits
+
+        For state outside the database (e.g. in-memory indexes), which must not
+        hold the transaction open nor change for a batch that is rolled back.
+        A failing hook is logged; the batch stays written.
+        """
+        self._commit_hooks.append(hook)
+
+    async def start(self):
+        """Start the background writer, replaying any spilled batches first"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        await self._replay_spill()
+        self._task = asyncio.create_task(self._run(), name="analysis-write-behind")
+        logger.info("Analysis write-behind buffer started")
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info(f"Analysis write-behind buffer stopped ({self.rows_written} rows written)")
+
+    async def submit(
+        self,
+        cv_row: CVFile,
+        analysis_row: AnalysisResult,
+        cv_text: Optional[str] = None,
+        jd_text: Optional[str] = None,
+        before_write: Optional[Callable[[], None]] = None
+    ):
+        """
+        Queue a CV row and its analysis for writing
+
+        Only waits when the buffer is full (backpressure). `before_write` is
+        the last chance to set fields on the rows: it runs once the rows are
+        queued, or when writing through, just before they are serialized.
+        """
+        item = PendingAnalysis(cv_row, analysis_row, cv_text, jd_text, before_write)
+        if self._task is None:
+            # Not running inside the app lifespan (scripts, tests): write through
+            await self._flush([item])
+            return
+        await self._queue.put(item)
+        item.seal()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "failed_batches": self.failed_batches,
+            "spilled_rows": self.spilled_rows,
+            "parked_rows": self.parked_rows,
+            "last_flush_ms": round(self.last_flush_ms, 2) if self.last_flush_ms is not None else None,
+        }
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush_with_retry(batch)
+
+        # Drain whatever was queued behind the stop marker
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.max_batch_size):
+            await self._flush_with_retry(remaining[start:start + self.max_batch_size])
+
+    async def _flush_with_retry(self, batch: List[PendingAnalysis]):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self._flush(batch)
+                return
+            except Exception as e:
+                logger.error(f"Write-behind flush failed (attempt {attempt}/{self.max_retries}, {len(batch)} rows): {str(e)}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+
+        self.failed_batches += 1
+        await self._flush_rows(batch)
+
+    async def _flush_rows(self, batch: List[PendingAnalysis]):
+        """Write a failed batch row by row, keeping only the rows that still fail"""
+        spilled: List[Tuple[PendingAnalysis, str]] = []
+        parked: List[Tuple[PendingAnalysis, str]] = []
+        for item in batch:
+            try:
+                await self._flush([item])
+            except PERMANENT_ERRORS as e:
+                parked.append((item, str(e.orig or e)))
+            except Exception as e:
+                spilled.append((item, str(e)))
+
+        if parked:
+            self.parked_rows += len(parked)
+            self._append(self.parked_path, parked, "Parked rejected analyses")
+        if spilled:
+            self.spilled_rows += len(spilled)
+            self._append(self.spill_path, spilled, "Spilled unwritten analyses")
+
+    async def _flush(self, batch: List[PendingAnalysis]):
+        start = time.perf_counter()
+        async with self.session_factory() as session:
+            async with session.begin():
+                for hook in self._pre_insert_hooks:
+                    await hook(session, batch)
+                for item in batch:
+                    item.seal()
+                await session.execute(insert(CVFile), [item.cv_row.model_dump() for item in batch])
+                await session.execute(insert(AnalysisResult), [item.analysis_row.model_dump() for item in batch])
+                for hook in self._hooks:
+                    await hook(session, batch)
+
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.rows_written += len(batch)
+        self.batches_written += 1
+
+        for hook in self._commit_hooks:
+            try:
+                await hook(batch)
+            except Exception as e:
+                logger.error(f"Write-behind commit hook failed ({len(batch)} rows): {str(e)}")
+
+    def _append(self, path: str, failed: List[Tuple[PendingAnalysis, str]], message: str):
+        try:
+            with open(path, "a", encoding="utf-8") as output:
+                for item, error in failed:
+                    output.write(json.dumps(item.to_dict(error), default=_json_default) + "\n")
+                output.flush()
+                os.fsync(output.fileno())
+            logger.error(f"{message} ({len(failed)} rows) to {path}; first error: {failed[0][1]}")
+        except Exception as e:
+            logger.critical(f"Failed to write {len(failed)} analyses to {path}, data lost: {str(e)}")
+
+    async def _replay_spill(self):
+        replay_path = f"{self.spill_path}.replaying"
+        if os.path.exists(replay_path):
+            self._restore_interrupted_replay(replay_path)
+        if not os.path.exists(self.spill_path):
+            return
+
+        with open(self.spill_path, encoding="utf-8") as spill:
+            batch = [PendingAnalysis.from_dict(json.loads(line)) for line in spill if line.strip()]
+        if not batch:
+            os.unlink(self.spill_path)
+            return
+
+        os.replace(self.spill_path, replay_path)
+        logger.info(f"Replaying {len(batch)} spilled analyses from {self.spill_path}")
+        for start in range(0, len(batch), self.max_batch_size):
+            unwritten = await self._unwritten(batch[start:start + self.max_batch_size])
+            if unwritten:
+                await self._flush_with_retry(unwritten)
+        os.unlink(replay_path)
+
+    def _restore_interrupted_replay(self, replay_path: str):
+        """Put the rows of a replay cut short (e.g. by a crash) back in front of the spill file"""
+        with open(replay_path, encoding="utf-8") as replay:
+            lines = [line.rstrip("\n") for line in replay if line.strip()]
+        if os.path.exists(self.spill_path):
+            with open(self.spill_path, encoding="utf-8") as spill:
+                lines += [line.rstrip("\n") for line in spill if line.strip()]
+
+        # A crash while restoring leaves rows in both files; keep one copy of each
+        lines = list(dict.fromkeys(lines))
+        merged_path = f"{self.spill_path}.merging"
+        with open(merged_path, "w", encoding="utf-8") as merged:
+            merged.writelines(f"{line}\n" for line in lines)
+            merged.flush()
+            os.fsync(merged.fileno())
+        os.replace(merged_path, self.spill_path)
+        os.unlink(replay_path)
+        logger.warning(f"Restored an interrupted replay of {self.spill_path} ({len(lines)} rows)")
+
+    async def _unwritten(self, batch: List[PendingAnalysis]) -> List[PendingAnalysis]:
+        """Rows of a spilled batch not in the database yet (an interrupted replay may have written some)"""
+        async with self.session_factory() as session:
+            written = set((await session.exec(
+                select(AnalysisResult.id).where(AnalysisResult.id.in_([item.analysis_row.id for item in batch]))
+            )).all())
+        return [item for item in batch if item.analysis_row.id not in written]
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,57 @@
+import json
+import re
+from types import SimpleNamespace
+
+FULL_ANALYSIS = {
+    "grammar_suggestions": ["Use action verbs"],
+    "keyword_match": {"matched": ["python"], "missing": [], "score": 90},
+    "ats_compatibility": {"score": 80, "issues": [], "suggestions": []},
+    "should_learn_technologys": ["Docker"],
+    "overall_score": 85,
+    "summary": "Strong match",
+}
+
+
+class FakeOpenAI:
+    """
+    Stand-in for AsyncOpenAI's chat completions
+
+    Every analysis prompt gets FULL_ANALYSIS; section prompts also get
+    findings for every "[sN]" id except those in `skip_sections`. Re-ranking
+    prompts get a score of 60 for every CV id. `fail` raises instead.
+    """
+
+    def __init__(self, fail=False, skip_sections=()):
+        self.fail = fail
+        self.skip_sections = set(skip_sections)
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @property
+    def section_calls(self):
+        return [prompt for prompt in self.prompts if "CV Sections:" in prompt]
+
+    @property
+    def full_calls(self):
+        return [prompt for prompt in self.prompts if "CV Sections:" not in prompt]
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        if self.fail:
+            raise ConnectionError("OpenAI unavailable")
+        if "CVs:" in prompt:
+            content = {"scores": {cv_id: 60 for cv_id in re.findall(r"^\[(\w+)\]$", prompt, re.MULTILINE)}}
+        elif "CV Sections:" in prompt:
+            ids = [f"s{index}" for index in re.findall(r"^\[s(\d+)\]", prompt, re.MULTILINE)]
+            content = {**FULL_ANALYSIS, "sections": {
+                section_id: {"grammar_suggestions": [], "ats_issues": [], "ats_suggestions": [], "keywords": ["python"], "score": 90, "summary": f"{section_id} ok"}
+                for section_id in ids if section_id not in self.skip_sections
+            }}
+        else:
+            content = FULL_ANALYSIS
+        return SimpleNamespace(
+            model=model,
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20),
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(content)))],
+        )
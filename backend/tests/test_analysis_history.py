@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import routes.cv_analysis as cv_analysis
+from database.model import AnalysisResult, CVFile, User, UserStats
+
+START = datetime(2024, 5, 1, 9, 30, 15, 123456)
+
+
+def test_cursor_round_trips_without_padding():
+    cursor = cv_analysis._encode_cursor(START, "01HZX3")
+    assert "=" not in cursor
+    assert cv_analysis._decode_cursor(cursor) == (START, "01HZX3")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WyJub3QtYS1kYXRlIiwgIngiXQ", "W10"])
+def test_malformed_cursors_are_a_400(cursor):
+    with pytest.raises(HTTPException) as invalid:
+        cv_analysis._decode_cursor(cursor)
+    assert invalid.value.status_code == 400
+
+
+@pytest.fixture
+def history_db(db_session_factory):
+    """Five analyses, three of which share a created_at"""
+    created = [START, START, START, START - timedelta(minutes=1), START + timedelta(minutes=1)]
+
+    async def seed():
+        async with db_session_factory() as session:
+            session.add(User(id=1, clerk_user_id="history_user", email="history@example.com"))
+            for index, created_at in enumerate(created):
+                cv_row = CVFile(user_id=1, filename=f"cv{index}.pdf", uploaded_at=created_at)
+                session.add_all([cv_row, AnalysisResult(
+                    user_id=1, cv_id=cv_row.id, overall_score=index, created_at=created_at, job_description="Engineer"
+                )])
+            # Someone else's analysis at the same instant never leaks into the pages
+            session.add(AnalysisResult(user_id=2, created_at=START))
+            session.add(UserStats(user_id=1, analysis_count=5))
+            await session.commit()
+
+    asyncio.run(seed())
+    return db_session_factory
+
+
+def pages(session_factory, limit):
+    async def scenario():
+        result, cursor = [], None
+        while True:
+            async with session_factory() as session:
+                page = await cv_analysis.get_analysis_history("1", limit=limit, cursor=cursor, session=session)
+            result.append(page)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return result
+
+    return asyncio.run(scenario())
+
+
+def test_pages_cross_equal_timestamps_without_gaps_or_repeats(history_db):
+    result = pages(history_db, limit=2)
+
+    assert [len(page["analyses"]) for page in result] == [2, 2, 1]
+    assert [page["has_more"] for page in result] == [True, True, False]
+    assert {page["total"] for page in result} == {5}
+
+    listed = [(item["timestamp"], item["id"]) for page in result for item in page["analyses"]]
+    assert len(set(listed)) == 5
+    assert listed == sorted(listed, reverse=True)
+    assert listed[0][0] == START + timedelta(minutes=1) and listed[-1][0] == START - timedelta(minutes=1)
+
+
+def test_history_without_counters_has_no_total(db_session_factory):
+    [page] = pages(db_session_factory, limit=10)
+    assert page["analyses"] == [] and page["total"] is None and page["has_more"] is False
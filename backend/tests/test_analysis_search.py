@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database.migrations import rebuild_search_index
+from database.model import AnalysisResult, CVFile, User, content_hash
+from database.search import create_search_index, fts5_match, snippet
+from services.analysis_search import AnalysisSearch
+from services.content_store import ContentStore
+from services.write_behind import AnalysisWriteBuffer, PendingAnalysis
+
+ANALYSES = [
+    # user, filename, job description, summary, CV text
+    (1, "jane.pdf", "Senior Python developer, FastAPI", "Strong backend match", "Ten years of Go and Rust"),
+    (1, "jane-data.pdf", "Data engineer", "Good fit", "Pipelines in Python and Spark"),
+    (1, "jane-ops.pdf", "Site reliability engineer", "Partial match", "Kubernetes and Terraform"),
+    (2, "john.pdf", "Python developer", "Strong match", "Python and Django"),
+]
+
+
+@pytest.fixture
+def search_db(db_session_factory, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    assert create_search_index(engine)
+
+    async def add_users():
+        async with db_session_factory() as session:
+            session.add_all([
+                User(id=1, clerk_user_id="user_1", email="jane@example.com"),
+                User(id=2, clerk_user_id="user_2", email="john@example.com"),
+            ])
+            await session.commit()
+
+    asyncio.run(add_users())
+    yield db_session_factory, engine
+    engine.dispose()
+
+
+def pending(user_id, filename, job_description, summary, cv_text):
+    cv_row = CVFile(user_id=user_id, filename=filename, content_hash=content_hash(cv_text))
+    analysis_row = AnalysisResult(
+        user_id=user_id, cv_id=cv_row.id, cv_hash=cv_row.content_hash, jd_hash=content_hash(job_description),
+        overall_score=80, analysis={"summary": summary}
+    )
+    return PendingAnalysis(cv_row, analysis_row, cv_text, job_description)
+
+
+async def index(session_factory, batch):
+    """Write the rows as the write-behind flush does, texts first and the index last"""
+    buffer = AnalysisWriteBuffer(session_factory=session_factory)
+    buffer.add_flush_hook(ContentStore().store_batch, before_insert=True)
+    buffer.add_flush_hook(AnalysisSearch().index_batch)
+    for item in batch:
+        await buffer.submit(item.cv_row, item.analysis_row, item.cv_text, item.jd_text)
+
+
+async def search(session_factory, user_id, query, limit=10, offset=0):
+    async with session_factory() as session:
+        return await AnalysisSearch().search(session, user_id, query, limit, offset)
+
+
+def test_search_is_ranked_and_scoped_to_the_user(search_db):
+    session_factory, _ = search_db
+    batch = [pending(*analysis) for analysis in ANALYSES]
+    batch.append(pending(None, "anonymous.pdf", "Python developer", None, "Python"))
+
+    async def scenario():
+        await index(session_factory, batch)
+        return await search(session_factory, 1, "python"), await search(session_factory, 1, "pyth")
+
+    (results, has_more), (prefix_results, _) = asyncio.run(scenario())
+    # A job-description match outranks a CV-text match; user 2 and anonymous rows never show
+    assert [row["filename"] for row in results] == ["jane.pdf", "jane-data.pdf"]
+    assert "[Python]" in results[0]["job_description"]
+    assert "[Python]" in results[1]["cv_snippet"]
+    assert not has_more
+    assert [row["filename"] for row in prefix_results] == ["jane.pdf", "jane-data.pdf"]
+
+
+def test_index_stores_no_text(search_db):
+    session_factory, engine = search_db
+    asyncio.run(index(session_factory, [pending(*ANALYSES[0])]))
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT filename, job_description, summary, cv_text FROM analysis_fts")).all()
+    assert stored == [(None, None, None, None)]
+
+
+def test_index_that_stored_text_is_recreated(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE VIRTUAL TABLE analysis_fts USING fts5(filename, job_description, cv_text)"))
+
+    assert create_search_index(engine)
+    assert not create_search_index(engine)
+    with engine.connect() as conn:
+        schema = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'analysis_fts'")).scalar()
+    engine.dispose()
+    assert "content = ''" in schema
+
+
+def test_snippets_bracket_prefix_matches():
+    words = " ".join(f"w{index}" for index in range(30))
+    assert snippet(f"{words} Engineering lead, Python", "python engineer") == (
+        "…w26 w27 w28 w29 [Engineering] lead, [Python]"
+    )
+    assert snippet("Ten years of Go", "python") is None
+
+
+def test_pages_and_removal(search_db):
+    session_factory, _ = search_db
+    batch = [pending(*analysis) for analysis in ANALYSES]
+
+    async def scenario():
+        await index(session_factory, batch)
+        first = await search(session_factory, 1, "engineer", limit=1)
+        second = await search(session_factory, 1, "engineer", limit=1, offset=1)
+        async with session_factory() as session:
+            await AnalysisSearch().remove(session, batch[1].analysis_row.id)
+            await session.commit()
+        return first, second, await search(session_factory, 1, "engineer")
+
+    (first, first_more), (second, second_more), (remaining, _) = asyncio.run(scenario())
+    assert len(first) == 1 and first_more
+    assert len(second) == 1 and not second_more
+    assert [row["filename"] for row in remaining] == ["jane-ops.pdf"]
+
+
+def test_removed_postings_never_match_a_new_analysis(search_db):
+    session_factory, _ = search_db
+    removed = pending(1, "old.pdf", "Cobol programmer", "Legacy", "Mainframes")
+
+    async def scenario():
+        await index(session_factory, [removed])
+        async with session_factory() as session:
+            await AnalysisSearch().remove(session, removed.analysis_row.id)
+            await session.commit()
+        await index(session_factory, [pending(*ANALYSES[0])])
+        return await search(session_factory, 1, "cobol"), await search(session_factory, 1, "python")
+
+    (stale, _), (fresh, _) = asyncio.run(scenario())
+    assert stale == []
+    assert [row["filename"] for row in fresh] == ["jane.pdf"]
+
+
+def test_query_syntax_is_inert():
+    assert fts5_match(1, "!!! ***") is None
+    match = fts5_match(7, 'python" OR owner:u2 NEAR(')
+    assert match == 'owner:u7 AND ("python" "OR" "owner" "u2" "NEAR"*)'
+
+
+def test_operators_in_the_query_do_not_fail_or_escape_the_user(search_db):
+    session_factory, _ = search_db
+
+    async def scenario():
+        await index(session_factory, [pending(*analysis) for analysis in ANALYSES])
+        return (
+            await search(session_factory, 1, "owner:u2 OR python"),
+            await search(session_factory, 1, "?!"),
+        )
+
+    (results, _), (empty, more) = asyncio.run(scenario())
+    assert all(row["filename"].startswith("jane") for row in results)
+    assert empty == [] and more is False
+
+
+def test_rebuild_indexes_stored_analyses(search_db):
+    session_factory, engine = search_db
+
+    async def add_analyses():
+        async with session_factory() as session:
+            for user_id, filename, job_description, summary, cv_text in ANALYSES:
+                cv_row = CVFile(user_id=user_id, filename=filename, file_content=cv_text)
+                session.add(cv_row)
+                session.add(AnalysisResult(
+                    user_id=user_id, cv_id=cv_row.id, job_description=job_description,
+                    analysis={"summary": summary}, overall_score=60,
+                ))
+            await session.commit()
+
+    asyncio.run(add_analyses())
+    rebuild_search_index(engine, batch_size=2)
+    results, _ = asyncio.run(search(session_factory, 2, "django"))
+    assert [row["filename"] for row in results] == ["john.pdf"]
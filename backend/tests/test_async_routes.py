@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlmodel import select
+
+import routes.cv_analysis as cv_analysis
+import routes.users as users
+from database.model import (
+    AnalysisResult, CVContent, CVFile, JobDescription, User, UserStats, _pool_options, _to_async_url, content_hash
+)
+from database.search import create_search_index
+from services.content_store import ContentStore
+from services.user_stats import UserStatsService
+from services.write_behind import AnalysisWriteBuffer
+
+CV_TEXT = "Jane Doe, Python developer"
+JD_TEXT = "Senior Python developer"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./cv_checker.db", "sqlite+aiosqlite:///./cv_checker.db"),
+    ("postgresql://app:secret@db:5432/cv", "postgresql+asyncpg://app:secret@db:5432/cv"),
+    ("postgresql+psycopg2://app@db/cv", "postgresql+asyncpg://app@db/cv"),
+])
+def test_database_urls_map_to_async_drivers(url, expected):
+    assert _to_async_url(url) == expected
+
+
+def test_unsupported_backends_and_memory_pools():
+    with pytest.raises(ValueError, match="mysql"):
+        _to_async_url("mysql://db/cv")
+    assert _pool_options("sqlite://") == {}
+    assert _pool_options("sqlite+aiosqlite:///:memory:") == {}
+    assert _pool_options("sqlite:///./cv.db")["pool_pre_ping"] in (True, False)
+
+
+@pytest.fixture
+def signed_in(db_session_factory):
+    """A stored Clerk user, with the route's user cache cleared"""
+    async def seed():
+        async with db_session_factory() as session:
+            session.add(User(id=1, clerk_user_id="async_user", email="async@example.com", first_name="Jane"))
+            await session.commit()
+
+    asyncio.run(seed())
+    users.clerk_service.invalidate_user("async_user")
+    yield db_session_factory
+    users.clerk_service.invalidate_user("async_user")
+
+
+def test_user_routes_read_and_update_through_the_async_session(signed_in):
+    async def scenario():
+        async with signed_in() as session:
+            updated = await users.update_current_user(
+                {"first_name": "Janet", "email": "ignored@example.com"}, clerk_user_id="async_user", session=session
+            )
+        async with signed_in() as session:
+            current = await users.get_current_user(clerk_user_id="async_user", session=session)
+            stats = await users.get_user_stats(clerk_user_id="async_user", session=session)
+            await users.delete_current_user(clerk_user_id="async_user", session=session)
+        async with signed_in() as session:
+            return updated, current, stats, await session.get(User, 1)
+
+    updated, current, stats, stored = asyncio.run(scenario())
+    assert updated["first_name"] == "Janet" and updated["email"] == "async@example.com"
+    assert current["first_name"] == "Janet"
+    assert stats["user_id"] == 1 and stats["analyses_completed"] == 0
+    assert stored.is_active is False
+
+
+def test_unknown_user_is_a_404(signed_in):
+    async def scenario():
+        async with signed_in() as session:
+            await users.get_user_stats(clerk_user_id="nobody", session=session)
+
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(scenario())
+    assert missing.value.status_code == 404
+
+
+def test_delete_analysis_releases_content_and_rebuilds_counters(signed_in, tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    create_search_index(engine)
+    engine.dispose()
+    buffer = AnalysisWriteBuffer(session_factory=signed_in)
+    buffer.add_flush_hook(ContentStore().store_batch, before_insert=True)
+    buffer.add_flush_hook(UserStatsService().record_batch)
+    monkeypatch.setattr(cv_analysis, "write_buffer", buffer)
+
+    def rows(score):
+        cv_row = CVFile(user_id=1, filename="cv.pdf", content_hash=content_hash(CV_TEXT))
+        return cv_row, AnalysisResult(
+            user_id=1, cv_id=cv_row.id, cv_hash=cv_row.content_hash, jd_hash=content_hash(JD_TEXT), overall_score=score
+        )
+
+    async def scenario():
+        kept, deleted = rows(60), rows(80)
+        for cv_row, analysis_row in (kept, deleted):
+            await buffer.submit(cv_row, analysis_row, CV_TEXT, JD_TEXT)
+
+        async with signed_in() as session:
+            with pytest.raises(HTTPException) as other_user:
+                await cv_analysis.delete_analysis(deleted[1].id, user_id="2", session=session)
+            await cv_analysis.delete_analysis(deleted[1].id, user_id="1", session=session)
+
+        async with signed_in() as session:
+            remaining = (await session.exec(select(AnalysisResult.id))).all()
+            cv_rows = (await session.exec(select(CVFile.id))).all()
+            refs = (await session.exec(select(CVContent.ref_count))).one(), (await session.exec(select(JobDescription.ref_count))).one()
+            stats = await session.get(UserStats, 1)
+            return other_user.value.status_code, remaining, cv_rows, refs, stats, kept
+
+    status, remaining, cv_rows, refs, stats, kept = asyncio.run(scenario())
+    assert status == 404
+    assert remaining == [kept[1].id] and cv_rows == [kept[0].id]
+    assert refs == (1, 1)
+    assert stats.analysis_count == 1 and stats.last_score == 60
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel, select
+
+from database.migrations import normalize_user_emails
+from database.model import User
+from services.auth_service import AuthService
+from services.clerk_service import ClerkService
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """Two AuthService instances standing in for two worker processes"""
+    monkeypatch.setenv("PASSWORD_BCRYPT_ROUNDS", "4")
+    monkeypatch.setenv("REVOCATION_BACKEND", "memory")
+    monkeypatch.setenv("CREATE_TEST_USER", "false")
+    services = (AuthService(), AuthService())
+    yield services
+    for service in services:
+        service.password_hasher.shutdown()
+
+
+def register(session_factory, service, email="Jane@Example.com", password="old-password"):
+    async def scenario():
+        async with session_factory() as session:
+            return await service.create_user(session, {
+                "email": email, "first_name": "Jane", "last_name": "Doe",
+                "password": password, "confirm_password": password,
+            })
+    return asyncio.run(scenario())
+
+
+def call(session_factory, method, *args):
+    async def scenario():
+        async with session_factory() as session:
+            return await method(session, *args)
+    return asyncio.run(scenario())
+
+
+def test_password_change_applies_on_every_worker(db_session_factory, workers):
+    first, second = workers
+    register(db_session_factory, first)
+    # The second worker has the user cached before the change
+    assert call(db_session_factory, second.user_exists, "jane@example.com")
+    assert call(db_session_factory, second.authenticate_user, "jane@example.com", "old-password")
+    assert "hashed_password" not in second.user_cache.get("jane@example.com")
+
+    assert call(db_session_factory, first.change_password, "jane@example.com", "old-password", "new-password")
+    assert call(db_session_factory, second.authenticate_user, "jane@example.com", "old-password") is None
+    assert call(db_session_factory, second.authenticate_user, "JANE@example.com", "new-password")
+
+
+def test_deactivation_applies_on_every_worker(db_session_factory, workers):
+    first, second = workers
+    register(db_session_factory, first)
+    assert call(db_session_factory, second.user_exists, "jane@example.com")
+    assert call(db_session_factory, second.authenticate_user, "jane@example.com", "old-password")
+
+    assert call(db_session_factory, first.deactivate_user, "jane@example.com")
+    assert call(db_session_factory, second.authenticate_user, "jane@example.com", "old-password") is None
+
+
+def test_clerk_emails_are_stored_like_local_ones(db_session_factory, workers):
+    clerk_user = {
+        "id": "user_1",
+        "primary_email_address_id": "email_1",
+        "email_addresses": [{"id": "email_1", "email_address": " Mixed.Case@Example.COM "}],
+    }
+
+    async def sync():
+        async with db_session_factory() as session:
+            return await ClerkService().sync_user_from_clerk(session, clerk_user)
+
+    assert asyncio.run(sync()).email == "mixed.case@example.com"
+    assert call(db_session_factory, workers[0].user_exists, "Mixed.Case@example.com")
+
+
+def test_migration_lowercases_stored_emails_without_merging_accounts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for index, email in enumerate(["Solo@Example.com", "Twin@Example.com", "twin@example.com"]):
+            conn.execute(text(
+                'INSERT INTO "user" (clerk_user_id, email, is_active, created_at) VALUES (:id, :email, 1, CURRENT_TIMESTAMP)'
+            ), {"id": f"user_{index}", "email": email})
+
+    normalize_user_emails(engine)
+    with engine.connect() as conn:
+        emails = sorted(conn.execute(select(User.email)).scalars())
+    assert emails == ["Twin@Example.com", "solo@example.com", "twin@example.com"]
+    engine.dispose()
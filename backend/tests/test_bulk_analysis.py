@@ -0,0 +1,106 @@
+import asyncio
+import io
+import zipfile
+
+import docx
+import pytest
+
+from services.bulk_analysis import BulkAnalyzer
+
+PDF = b"%PDF-1.4\n" + b"%" * 500
+
+
+def docx_bytes(text: str) -> bytes:
+    document = docx.Document()
+    document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def fake_docx_bytes() -> bytes:
+    """A ZIP with a .docx name but no word/document.xml"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("notes.txt", "x" * 500)
+    return buffer.getvalue()
+
+
+def write_archive(path, members, compression=zipfile.ZIP_STORED):
+    with zipfile.ZipFile(path, "w", compression=compression) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return str(path)
+
+
+@pytest.fixture
+def analyzer():
+    bulk = BulkAnalyzer(max_files=5, max_total_bytes=1024 * 1024, max_ratio=20, workers=2)
+    yield bulk
+    bulk.shutdown()
+
+
+def test_members_are_checked_from_the_directory(analyzer, tmp_path):
+    archive = write_archive(tmp_path / "cvs.zip", [
+        ("jane.pdf", PDF),
+        ("team/john.docx", docx_bytes("John Doe, Python developer")),
+        ("notes.txt", b"x" * 500),
+        ("tiny.pdf", b"%PDF-1.4\n"),
+        ("__MACOSX/._jane.pdf", b"x" * 500),
+        (".DS_Store", b"x" * 500),
+        ("folder/", b""),
+    ])
+
+    entries = analyzer.list_entries(archive)
+    assert [entry.member for entry in entries] == ["jane.pdf", "team/john.docx", "notes.txt", "tiny.pdf"]
+    assert entries[1].name == "john.docx"  # directories are stripped
+    assert [entry.error is None for entry in entries] == [True, True, False, False]
+    assert "too small" in entries[3].error
+
+
+def test_highly_compressed_member_is_refused_before_decompression(analyzer, tmp_path):
+    archive = write_archive(
+        tmp_path / "bomb.zip", [("bomb.pdf", b"%PDF-1.4\n" + b"\0" * 500_000)], zipfile.ZIP_DEFLATED
+    )
+
+    [entry] = analyzer.list_entries(archive)
+    assert entry.error.startswith("Compression ratio")
+
+
+@pytest.mark.parametrize("members, message", [
+    ([(f"cv{i}.pdf", PDF) for i in range(6)], "the limit is 5"),
+    ([(f"cv{i}.pdf", b"%PDF-1.4\n" + b"%" * 400_000) for i in range(3)], "expands to"),
+])
+def test_archive_caps_reject_the_whole_upload(analyzer, tmp_path, members, message):
+    archive = write_archive(tmp_path / "big.zip", members)
+
+    with pytest.raises(ValueError, match=message):
+        analyzer.list_entries(archive)
+
+
+def test_unreadable_archive_is_rejected(analyzer, tmp_path):
+    path = tmp_path / "broken.zip"
+    path.write_bytes(b"PK\x03\x04 not really a zip")
+
+    with pytest.raises(ValueError, match="Not a readable ZIP"):
+        analyzer.list_entries(str(path))
+
+
+def test_members_are_read_sniffed_and_extracted_off_the_loop(analyzer, tmp_path):
+    archive = write_archive(tmp_path / "cvs.zip", [
+        ("jane.pdf", PDF),
+        ("john.docx", docx_bytes("John Doe, Python developer")),
+        ("fake.docx", fake_docx_bytes()),
+        ("renamed.pdf", docx_bytes("Renamed document")),
+    ])
+
+    async def scenario():
+        entries = analyzer.list_entries(archive)
+        read = await asyncio.gather(*[analyzer.read_entry(archive, entry) for entry in entries])
+        text = await analyzer.extract(read[1][0], analyzer.validator.mime_type_for(read[1][2]))
+        return read, text
+
+    read, text = asyncio.run(scenario())
+    assert [detected_type for _, _, detected_type in read] == [".pdf", ".docx", None, ".docx"]
+    assert read[0][0] == PDF
+    assert "Python developer" in text
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+import routes.cv_analysis as cv_analysis
+from models.cv_analysis import ChunkedUploadRequest
+from services.chunked_upload import MANIFEST, ChunkedUploadStore
+from services.upload_stream import UploadRejected
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(root=str(tmp_path / "uploads"), chunk_size=256, max_sessions=2)
+
+
+def age(store, session, seconds):
+    """Backdate a session as if it was created `seconds` ago"""
+    manifest = os.path.join(store.root, session.upload_id, MANIFEST)
+    past = time.time() - seconds
+    os.utime(manifest, (past, past))
+
+
+def test_chunks_in_any_order_assemble_the_file(store):
+    session = store.create("cv.pdf", "application/octet-stream", len(PDF))
+    chunks = [PDF[offset:offset + 256] for offset in range(0, len(PDF), 256)]
+    for index in reversed(range(len(chunks))):
+        store.write_chunk(session, index * 256, chunks[index], hashlib.sha256(chunks[index]).hexdigest())
+    store.write_chunk(session, 0, chunks[0])
+
+    assert store.missing(session) == []
+    upload = store.assemble(session)
+    try:
+        assert upload.detected_type == ".pdf"
+        assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+        with open(upload.path, "rb") as f:
+            assert f.read() == PDF
+    finally:
+        upload.cleanup()
+
+
+def test_bad_chunks_are_refused(store):
+    session = store.create("cv.pdf", "application/pdf", len(PDF))
+
+    with pytest.raises(UploadRejected) as rejected:
+        store.write_chunk(session, 256, PDF[256:512], "0" * 64)
+    assert rejected.value.status_code == 400
+    with pytest.raises(UploadRejected):
+        store.write_chunk(session, 100, PDF[100:356])
+    with pytest.raises(UploadRejected) as rejected:
+        store.assemble(session)
+    assert rejected.value.status_code == 409
+
+    with pytest.raises(UploadRejected):
+        store.write_chunk(session, 0, b"GIF89a.." + PDF[8:256])
+    with pytest.raises(UploadRejected) as rejected:
+        store.get(session.upload_id)
+    assert rejected.value.status_code == 404
+
+
+def test_open_sessions_are_capped_until_one_expires(store):
+    first = store.create("a.pdf", "application/pdf", len(PDF))
+    store.create("b.pdf", "application/pdf", len(PDF))
+
+    with pytest.raises(UploadRejected) as rejected:
+        store.create("c.pdf", "application/pdf", len(PDF))
+    assert rejected.value.status_code == 429
+
+    age(store, first, store.ttl + 60)
+    store.create("c.pdf", "application/pdf", len(PDF))
+    assert store.open_sessions() == 2
+    assert not os.path.exists(os.path.join(store.root, first.upload_id))
+
+
+def test_background_task_purges_expired_sessions(store):
+    store.purge_interval = 0.01
+    expired = store.create("a.pdf", "application/pdf", len(PDF))
+    live = store.create("b.pdf", "application/pdf", len(PDF))
+    age(store, expired, store.ttl + 60)
+
+    async def scenario():
+        await store.start()
+        await asyncio.sleep(0.1)
+        await store.stop()
+
+    asyncio.run(scenario())
+    assert not os.path.exists(os.path.join(store.root, expired.upload_id))
+    assert store.get(live.upload_id).upload_id == live.upload_id
+
+
+def test_routes_touch_the_upload_directory_off_the_event_loop(store, monkeypatch):
+    threads = []
+    for name in ("get", "received", "discard"):
+        method = getattr(store, name)
+
+        def recorded(*args, _method=method, _name=name):
+            threads.append((_name, threading.current_thread() is threading.main_thread()))
+            return _method(*args)
+
+        monkeypatch.setattr(store, name, recorded)
+    monkeypatch.setattr(cv_analysis, "chunked_uploads", store)
+
+    async def scenario():
+        created = await cv_analysis.create_chunked_upload(ChunkedUploadRequest(filename="cv.pdf", size=len(PDF)))
+        status = await cv_analysis.get_chunked_upload(created.upload_id)
+        await cv_analysis.delete_chunked_upload(created.upload_id)
+        return status
+
+    status = asyncio.run(scenario())
+    assert status.missing == list(range(status.chunk_count))
+    assert {name for name, _ in threads} == {"get", "received", "discard"}
+    assert not any(on_loop for _, on_loop in threads)
+    assert store.open_sessions() == 0
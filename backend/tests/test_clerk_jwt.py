@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import rsa
+from jose import jwt
+
+from services.clerk_jwt import ClerkJWTVerifier, TokenVerificationError
+
+
+def _b64(number: int) -> str:
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class LocalIssuer:
+    """Stand-in for Clerk: signs session tokens and serves its JWKS over HTTP"""
+
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+        issuer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                issuer.fetches += 1
+                body = json.dumps({"keys": [
+                    {"kty": "RSA", "kid": kid, "use": "sig", "alg": "RS256", "n": _b64(public.n), "e": _b64(public.e)}
+                    for kid, (public, _) in issuer.keys.items()
+                ]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/.well-known/jwks.json"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add_key(self, kid: str):
+        public, private = rsa.newkeys(1024)
+        self.keys[kid] = (public, private.save_pkcs1().decode())
+
+    def token(self, kid: str, **claims) -> str:
+        now = int(time.time())
+        payload = {"sub": "user_123", "iat": now, "nbf": now, "exp": now + 60, "iss": "https://clerk.test", **claims}
+        return jwt.encode(payload, self.keys[kid][1], algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture(scope="module")
+def issuer():
+    local_issuer = LocalIssuer()
+    local_issuer.add_key("key-1")
+    yield local_issuer
+    local_issuer.server.shutdown()
+
+
+def make_verifier(issuer, **kwargs):
+    options = {"jwks_url": issuer.url, "issuer": "https://clerk.test", "leeway": 5, "min_refetch_interval": 0}
+    options.update(kwargs)
+    return ClerkJWTVerifier(**options)
+
+
+def test_valid_token_verifies_locally_after_one_fetch(issuer):
+    async def scenario():
+        verifier = make_verifier(issuer)
+        await verifier.refresh()
+        fetches = issuer.fetches
+
+        for _ in range(5):
+            claims = await verifier.verify(issuer.token("key-1", jti=str(_)))
+            assert claims["sub"] == "user_123"
+        assert issuer.fetches == fetches
+
+    asyncio.run(scenario())
+
+
+def test_rotated_key_triggers_refetch(issuer):
+    async def scenario():
+        verifier = make_verifier(issuer)
+        await verifier.refresh()
+        issuer.add_key("key-2")
+
+        claims = await verifier.verify(issuer.token("key-2"))
+        assert claims["sub"] == "user_123"
+        assert "key-2" in verifier.key_ids
+
+    asyncio.run(scenario())
+
+
+def test_unknown_kid_refetch_is_rate_limited(issuer):
+    async def scenario():
+        verifier = make_verifier(issuer, min_refetch_interval=60)
+        await verifier.refresh()
+        fetches = issuer.fetches
+
+        token = issuer.token("key-1").split(".")
+        header = base64.urlsafe_b64encode(json.dumps({"alg": "RS256", "kid": "forged"}).encode()).rstrip(b"=").decode()
+        for _ in range(3):
+            with pytest.raises(TokenVerificationError):
+                await verifier.verify(".".join([header, *token[1:]]))
+        assert issuer.fetches == fetches
+
+    asyncio.run(scenario())
+
+
+def test_clock_skew_within_leeway(issuer):
+    async def scenario():
+        verifier = make_verifier(issuer, leeway=10)
+        now = int(time.time())
+        assert await verifier.verify(issuer.token("key-1", exp=now - 5))
+        with pytest.raises(TokenVerificationError):
+            await verifier.verify(issuer.token("key-1", exp=now - 30))
+        assert await verifier.verify(issuer.token("key-1", nbf=now + 5))
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("claims", [{"iss": "https://evil.test"}, {"azp": "https://evil.test"}])
+def test_rejects_wrong_issuer_and_party(issuer, claims):
+    async def scenario():
+        verifier = make_verifier(issuer, authorized_parties=["http://localhost:3000"])
+        with pytest.raises(TokenVerificationError):
+            await verifier.verify(issuer.token("key-1", **claims))
+
+    asyncio.run(scenario())
+
+
+def test_rejects_tampered_and_unsigned_tokens(issuer):
+    async def scenario():
+        verifier = make_verifier(issuer)
+        header, payload, signature = issuer.token("key-1").split(".")
+        forged_payload = base64.urlsafe_b64encode(json.dumps({"sub": "admin", "exp": int(time.time()) + 60}).encode()).rstrip(b"=").decode()
+        with pytest.raises(TokenVerificationError):
+            await verifier.verify(".".join([header, forged_payload, signature]))
+
+        unsigned = jwt.encode({"sub": "admin", "exp": int(time.time()) + 60}, "secret", algorithm="HS256", headers={"kid": "key-1"})
+        with pytest.raises(TokenVerificationError):
+            await verifier.verify(unsigned)
+
+    asyncio.run(scenario())
+
+
+def test_verified_tokens_are_cached_until_exp(issuer):
+    async def scenario():
+        verifier = make_verifier(issuer)
+        token = issuer.token("key-1")
+        await verifier.verify(token)
+        await verifier.verify(token)
+        assert verifier.token_cache.stats()["hits"] == 1
+
+        # A token within the leeway is accepted but not cached past its exp
+        expired = issuer.token("key-1", exp=int(time.time()) - 1)
+        await verifier.verify(expired)
+        assert len(verifier.token_cache) == 1
+
+    asyncio.run(scenario())
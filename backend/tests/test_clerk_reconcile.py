@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import User
+from services.clerk_reconcile import ClerkReconciler
+from services.clerk_service import ClerkService
+from services.http_client import HTTPClient
+
+
+class FakeClerk:
+    """Stand-in for GET /v1/users with limit/offset paging and created_at_after"""
+
+    def __init__(self, count: int):
+        now = int(time.time() * 1000)
+        self.users = [self.user(i, f"First{i}", now - 60000) for i in range(count)]
+        self.created_after = []
+        self.offsets = []
+        self.fail_at = None
+
+    @staticmethod
+    def user(i: int, first_name: str, updated_at: int):
+        return {
+            "id": f"user_{i:03d}",
+            "first_name": first_name,
+            "last_name": "Test",
+            "profile_image_url": None,
+            "primary_email_address_id": "email_1",
+            "email_addresses": [{"id": "email_1", "email_address": f"user{i}@example.com"}],
+            "created_at": 1_700_000_000_000 + i * 1000,
+            "updated_at": updated_at,
+        }
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/v1/users"
+        limit = int(request.url.params["limit"])
+        offset = int(request.url.params["offset"])
+        created_after = request.url.params.get("created_at_after")
+        if offset == self.fail_at:
+            return httpx.Response(500, json={"errors": [{"code": "internal"}]})
+        self.offsets.append(offset)
+        self.created_after.append(created_after)
+        users = self.users
+        if created_after is not None:
+            users = [user for user in users if user["created_at"] > int(created_after)]
+        return httpx.Response(200, json=users[offset:offset + limit])
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def make_reconciler(clerk, session_factory, tmp_path, **kwargs):
+    http_client = HTTPClient(max_retries=0, transport=httpx.MockTransport(clerk))
+    options = {"page_size": 5, "concurrency": 3, "checkpoint_path": str(tmp_path / "checkpoint.json")}
+    options.update(kwargs)
+    return ClerkReconciler(clerk_service=ClerkService(http_client=http_client), session_factory=session_factory, **options)
+
+
+async def local_users(session_factory):
+    async with session_factory() as session:
+        return {user.clerk_user_id: user for user in (await session.exec(select(User))).all()}
+
+
+def test_imports_all_pages_then_finds_nothing_to_do(session_factory, tmp_path):
+    clerk = FakeClerk(23)
+
+    async def scenario():
+        first = await make_reconciler(clerk, session_factory, tmp_path).run()
+        second = await make_reconciler(clerk, session_factory, tmp_path).run()
+        return first, second, await local_users(session_factory)
+
+    first, second, users = asyncio.run(scenario())
+    assert first["fetched"] == 23 and first["created"] == 23
+    assert second["unchanged"] == 23 and second["created"] == second["updated"] == 0
+    assert users["user_022"].email == "user22@example.com"
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_only_changed_users_are_rewritten(session_factory, tmp_path):
+    clerk = FakeClerk(12)
+
+    async def scenario():
+        await make_reconciler(clerk, session_factory, tmp_path).run()
+        clerk.users[7] = FakeClerk.user(7, "Renamed", int(time.time() * 1000) + 1000)
+        stats = await make_reconciler(clerk, session_factory, tmp_path).run()
+        return stats, await local_users(session_factory)
+
+    stats, users = asyncio.run(scenario())
+    assert stats["updated"] == 1 and stats["unchanged"] == 11
+    assert users["user_007"].first_name == "Renamed"
+
+
+def test_interrupted_run_resumes_from_checkpoint(session_factory, tmp_path):
+    clerk = FakeClerk(30)
+    clerk.fail_at = 15
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(make_reconciler(clerk, session_factory, tmp_path, concurrency=1).run())
+    checkpoint = json.loads((tmp_path / "checkpoint.json").read_text())
+    assert checkpoint["user_id"] == "user_014"
+    assert checkpoint["created_at"] == clerk.users[14]["created_at"]
+
+    clerk.fail_at = None
+    clerk.offsets.clear()
+    stats = asyncio.run(make_reconciler(clerk, session_factory, tmp_path).run())
+    assert set(clerk.created_after) == {None, str(checkpoint["created_at"] - 1)}
+    assert stats["resumed_after"] == checkpoint["created_at"]
+    assert stats["fetched"] == 16 and stats["created"] == 15 and stats["unchanged"] == 1
+    assert len(asyncio.run(local_users(session_factory))) == 30
+
+
+def test_resume_after_deletions_does_not_skip_users(session_factory, tmp_path):
+    clerk = FakeClerk(30)
+    clerk.fail_at = 15
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(make_reconciler(clerk, session_factory, tmp_path, concurrency=1).run())
+
+    # An offset checkpoint (15) would now skip user_015..user_019
+    del clerk.users[:5]
+    clerk.fail_at = None
+    stats = asyncio.run(make_reconciler(clerk, session_factory, tmp_path).run())
+    users = asyncio.run(local_users(session_factory))
+    assert stats["created"] == 15
+    assert {f"user_{i:03d}" for i in range(30)} <= set(users)
+
+
+async def add_local_users(session_factory, *users):
+    async with session_factory() as session:
+        session.add_all(users)
+        await session.commit()
+
+
+def test_full_run_deactivates_users_missing_from_clerk(session_factory, tmp_path):
+    clerk = FakeClerk(12)
+
+    async def scenario():
+        await make_reconciler(clerk, session_factory, tmp_path).run()
+        await add_local_users(session_factory, User(clerk_user_id="local_abc", email="local@example.com"))
+        del clerk.users[3:5]
+        stats = await make_reconciler(clerk, session_factory, tmp_path).run()
+        return stats, await local_users(session_factory)
+
+    stats, users = asyncio.run(scenario())
+    assert stats["deactivated"] == 2
+    assert {clerk_user_id for clerk_user_id, user in users.items() if not user.is_active} == {"user_003", "user_004"}
+    assert users["local_abc"].is_active
+
+
+def test_resumed_run_does_not_deactivate(session_factory, tmp_path):
+    clerk = FakeClerk(30)
+    clerk.fail_at = 15
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(make_reconciler(clerk, session_factory, tmp_path, concurrency=1).run())
+    clerk.fail_at = None
+    # Users before the checkpoint are not listed again, so they were not seen
+    stats = asyncio.run(make_reconciler(clerk, session_factory, tmp_path).run())
+    assert stats["deactivated"] == 0
+    assert all(user.is_active for user in asyncio.run(local_users(session_factory)).values())
+
+
+def test_email_conflicts_are_skipped_without_stopping_the_run(session_factory, tmp_path):
+    clerk = FakeClerk(12)
+
+    async def scenario():
+        # A password account already holds user_003's email address
+        await add_local_users(session_factory, User(clerk_user_id="local_abc", email="user3@example.com"))
+        stats = await make_reconciler(clerk, session_factory, tmp_path).run()
+        return stats, await local_users(session_factory)
+
+    stats, users = asyncio.run(scenario())
+    assert stats["skipped"] == ["user_003"]
+    assert stats["created"] == 11 and stats["fetched"] == 12
+    assert "user_003" not in users and users["local_abc"].is_active
+    assert not (tmp_path / "checkpoint.json").exists()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database import compression
+from database.compression import FORMAT_RAW, FORMAT_ZLIB, FORMAT_ZSTD, MAGIC, compress, decompress, is_encoded
+from database.migrations import compress_existing_rows
+from database.model import AnalysisResult, CVFile
+
+CV_TEXT = "Jane Doe — Python developer. " * 100
+ANALYSIS = {"overall_score": 80, "summary": "Strong match " * 50}
+
+
+@pytest.mark.parametrize("codec", [
+    FORMAT_RAW,
+    FORMAT_ZLIB,
+    pytest.param(FORMAT_ZSTD, marks=pytest.mark.skipif(compression.zstandard is None, reason="zstandard not installed")),
+])
+def test_values_round_trip_with_every_codec(codec):
+    data = CV_TEXT.encode("utf-8")
+    encoded = compress(data, codec)
+    assert encoded[:2] == MAGIC + codec
+    assert decompress(encoded) == data
+    if codec != FORMAT_RAW:
+        assert len(encoded) < len(data) / 5
+
+
+def test_short_and_legacy_values():
+    assert compress(b"short", FORMAT_ZLIB) == MAGIC + FORMAT_RAW + b"short"
+    # Untagged values are legacy plain text and pass through
+    assert decompress("Jane Doe".encode("utf-8")) == "Jane Doe".encode("utf-8")
+    assert not is_encoded("Ça va".encode("utf-8"))
+
+
+def test_columns_are_stored_compressed_and_read_back(db_session_factory, tmp_path):
+    cv_row = CVFile(filename="cv.pdf", file_content=CV_TEXT)
+    analysis_row = AnalysisResult(cv_id=cv_row.id, analysis=ANALYSIS, overall_score=80)
+
+    async def scenario():
+        async with db_session_factory() as session:
+            session.add_all([cv_row, analysis_row])
+            await session.commit()
+        async with db_session_factory() as session:
+            stored_cv = await session.get(CVFile, cv_row.id)
+            stored_analysis = await session.get(AnalysisResult, analysis_row.id)
+            return await session.run_sync(lambda _: (stored_cv.file_content, stored_analysis.analysis))
+
+    content, analysis = asyncio.run(scenario())
+    assert content == CV_TEXT and analysis == ANALYSIS
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.connect() as conn:
+        raw = conn.execute(text("SELECT file_content FROM cvfile")).scalar_one()
+    engine.dispose()
+    assert is_encoded(raw) and len(raw) < len(CV_TEXT.encode("utf-8")) / 5
+
+
+def test_legacy_rows_stay_readable_and_are_compressed_by_the_migration(db_session_factory, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO cvfile (id, filename, file_content, uploaded_at) VALUES ('cv1', 'cv.pdf', :content, '2024-01-01')"
+        ), {"content": CV_TEXT})
+        conn.execute(text(
+            "INSERT INTO analysisresult (id, cv_id, analysis, created_at) VALUES ('a1', 'cv1', :analysis, '2024-01-01')"
+        ), {"analysis": json.dumps(ANALYSIS)})
+
+    async def read():
+        async with db_session_factory() as session:
+            cv_row = await session.get(CVFile, "cv1")
+            analysis_row = await session.get(AnalysisResult, "a1")
+            return await session.run_sync(lambda _: (cv_row.file_content, analysis_row.analysis))
+
+    assert asyncio.run(read()) == (CV_TEXT, ANALYSIS)
+
+    compress_existing_rows(engine)
+    with engine.connect() as conn:
+        raw_cv = conn.execute(text("SELECT file_content FROM cvfile")).scalar_one()
+        raw_analysis = conn.execute(text("SELECT analysis FROM analysisresult")).scalar_one()
+    engine.dispose()
+    assert is_encoded(raw_cv) and is_encoded(raw_analysis)
+    assert asyncio.run(read()) == (CV_TEXT, ANALYSIS)
@@ -0,0 +1,116 @@
+import asyncio
+
+from sqlmodel import select
+
+from database.model import AnalysisResult, CVContent, CVFile, JobDescription, content_hash
+from services.ai_analyzer import AIAnalyzer
+from services.content_store import ContentStore
+from services.usage_tracker import AnalysisUsage
+from services.write_behind import PendingAnalysis
+
+CV_TEXT = "Python developer with FastAPI and PostgreSQL experience"
+JD_TEXT = "Looking for a Python developer"
+
+
+def pending(cv_text=CV_TEXT, jd_text=JD_TEXT):
+    cv_row = CVFile(filename="cv.pdf", content_hash=content_hash(cv_text))
+    analysis_row = AnalysisResult(cv_id=cv_row.id, cv_hash=cv_row.content_hash, jd_hash=content_hash(jd_text))
+    return PendingAnalysis(cv_row, analysis_row, cv_text, jd_text)
+
+
+async def store(session_factory, batch):
+    async with session_factory() as session:
+        await ContentStore().store_batch(session, batch)
+        await session.commit()
+
+
+def test_identical_texts_are_stored_once_with_summed_ref_counts(db_session_factory):
+    async def scenario():
+        # Whitespace differences normalize to the same content
+        await store(db_session_factory, [pending(), pending(CV_TEXT.replace(" ", "  "))])
+        await store(db_session_factory, [pending()])
+        async with db_session_factory() as session:
+            return (await session.exec(select(CVContent))).all(), (await session.exec(select(JobDescription))).all()
+
+    cv_rows, jd_rows = asyncio.run(scenario())
+    assert len(cv_rows) == 1 and cv_rows[0].ref_count == 3
+    assert len(jd_rows) == 1 and jd_rows[0].ref_count == 3
+
+
+def test_release_deletes_texts_once_unreferenced(db_session_factory):
+    cv_hash, jd_hash = content_hash(CV_TEXT), content_hash(JD_TEXT)
+
+    async def scenario():
+        await store(db_session_factory, [pending(), pending()])
+        async with db_session_factory() as session:
+            first = await ContentStore().release(session, [cv_hash], [jd_hash])
+            second = await ContentStore().release(session, [cv_hash], [jd_hash])
+            await session.commit()
+            return first, second, (await session.exec(select(CVContent))).all()
+
+    first, second, remaining = asyncio.run(scenario())
+    assert first == [] and second == [cv_hash]
+    assert remaining == []
+
+
+def add_result(session, model, fallback=None, score=50):
+    session.add(AnalysisResult(
+        cv_hash=content_hash(CV_TEXT),
+        jd_hash=content_hash(JD_TEXT),
+        analysis={"overall_score": score},
+        model=model,
+        fallback=fallback,
+    ))
+
+
+def find_prior(session_factory, model):
+    async def scenario():
+        async with session_factory() as session:
+            return await ContentStore().find_prior_analysis(
+                session, content_hash(CV_TEXT), content_hash(JD_TEXT), model
+            )
+    return asyncio.run(scenario())
+
+
+def test_prior_analysis_of_the_configured_model_is_reused(db_session_factory):
+    async def seed():
+        async with db_session_factory() as session:
+            add_result(session, "gpt-4o-mini-2024-07-18", score=81)
+            await session.commit()
+
+    asyncio.run(seed())
+    assert find_prior(db_session_factory, "gpt-4o-mini") == {"overall_score": 81}
+    assert find_prior(db_session_factory, "gpt-4o") is None
+
+
+def test_mock_and_fallback_results_are_never_reused(db_session_factory):
+    async def seed():
+        async with db_session_factory() as session:
+            add_result(session, "mock")
+            add_result(session, "gpt-4o-mini", fallback=True)
+            await session.commit()
+
+    asyncio.run(seed())
+    assert find_prior(db_session_factory, "gpt-4o-mini") is None
+    assert find_prior(db_session_factory, None) is None
+
+
+class FailingCompletions:
+    async def create(self, **kwargs):
+        raise ConnectionError("OpenAI unavailable")
+
+
+class FailingClient:
+    def __init__(self):
+        self.chat = type("Chat", (), {"completions": FailingCompletions()})()
+
+
+def test_failed_model_call_marks_the_result_as_fallback():
+    analyzer = AIAnalyzer()
+    analyzer.openai_client = FailingClient()
+    usage = AnalysisUsage()
+
+    result = asyncio.run(analyzer.analyze_cv(CV_TEXT, JD_TEXT, usage))
+    assert result["overall_score"] >= 0
+    assert usage.fallback is True
+    assert usage.to_columns()["fallback"] is True
@@ -0,0 +1,164 @@
+import asyncio
+import math
+from collections import Counter
+
+import pytest
+from fastapi import HTTPException
+
+import routes.ranking as ranking
+from database.model import CVContent, CVFile, User
+from models.ranking import CVRankingRequest
+from services.cv_ranker import CVRanker, tokenize
+
+CORPUS = {
+    "python": "Python developer. Python, FastAPI and PostgreSQL services in Python.",
+    "java": "Java developer building Spring services and Kafka pipelines.",
+    "frontend": "Frontend engineer: React, TypeScript, node.js and CSS.",
+    "cpp": "Embedded C++ engineer with Rust and some Python scripting.",
+}
+
+
+def build(corpus=CORPUS, **kwargs):
+    ranker = CVRanker(**kwargs)
+    for doc_hash, text in corpus.items():
+        ranker.add_document(doc_hash, text)
+    return ranker
+
+
+def reference_bm25(corpus, query, k1=1.2, b=0.75):
+    """Textbook BM25 over the same tokens, for comparison"""
+    documents = {doc_hash: Counter(tokenize(text)) for doc_hash, text in corpus.items()}
+    average = sum(sum(counts.values()) for counts in documents.values()) / len(documents)
+    scores = {}
+    for doc_hash, counts in documents.items():
+        length = sum(counts.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for other in documents.values() if term in other)
+            if not df or term not in counts:
+                continue
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            tf = counts[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+        if score:
+            scores[doc_hash] = score
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def test_tokenize_keeps_skill_tokens_and_drops_stopwords():
+    assert tokenize("Experience with C++, C# and Node.js in the cloud") == [
+        "experience", "c++", "c#", "node.js", "cloud"
+    ]
+
+
+def test_scores_match_reference_bm25():
+    ranker = build()
+    query = "python engineer with fastapi"
+
+    results = ranker.search(query, top_k=10)
+    expected = reference_bm25(CORPUS, query)
+    assert [doc_hash for doc_hash, _ in results] == [doc_hash for doc_hash, _ in expected]
+    for (_, score), (_, expected_score) in zip(results, expected):
+        assert score == pytest.approx(expected_score, rel=1e-5)
+
+
+def test_top_k_and_unknown_terms():
+    ranker = build()
+    assert [doc_hash for doc_hash, _ in ranker.search("python", top_k=1)] == ["python"]
+    assert ranker.search("cobol fortran") == []
+    assert CVRanker().search("python") == []
+
+
+def test_removed_documents_are_excluded_until_added_again():
+    ranker = build()
+    ranker.remove_document("python")
+    assert "python" not in dict(ranker.search("python"))
+    assert ranker.document_count == 3
+
+    assert ranker.add_document("python", CORPUS["python"]) is False
+    assert ranker.search("python")[0][0] == "python"
+    assert ranker.document_count == 4
+
+
+def test_search_can_be_limited_to_given_documents():
+    ranker = build()
+    ranker.remove_document("cpp")
+    assert [doc_hash for doc_hash, _ in ranker.search("python", hashes=["cpp", "java", "unknown"])] == []
+    results = ranker.search("python scripting", hashes={"cpp", "python"})
+    assert [doc_hash for doc_hash, _ in results] == ["python"]
+    assert results == ranker.search("python scripting", top_k=1)
+
+
+def test_query_is_cut_to_its_highest_idf_terms():
+    # "developer" appears in two documents, "kafka" in one: only kafka is kept
+    ranker = build(max_query_terms=1)
+    assert [doc_hash for doc_hash, _ in ranker.search("developer kafka")] == ["java"]
+
+
+def test_scores_stay_correct_after_more_documents():
+    ranker = build({"python": CORPUS["python"]})
+    ranker.search("python")  # caches length norms
+    for doc_hash, text in CORPUS.items():
+        ranker.add_document(doc_hash, text)
+
+    results = ranker.search("python")
+    expected = reference_bm25(CORPUS, "python")
+    assert [doc_hash for doc_hash, _ in results] == [doc_hash for doc_hash, _ in expected]
+    assert [score for _, score in results] == pytest.approx([score for _, score in expected], rel=1e-5)
+
+
+def test_index_loads_from_stored_content(db_session_factory):
+    async def scenario():
+        async with db_session_factory() as session:
+            session.add_all([CVContent(hash=doc_hash, content=text) for doc_hash, text in CORPUS.items()])
+            session.add(CVContent(hash="empty", content=None))
+            await session.commit()
+        ranker = CVRanker()
+        await ranker._load(db_session_factory, batch_size=2)
+        return ranker
+
+    ranker = asyncio.run(scenario())
+    assert ranker.ready and ranker.document_count == 4
+    assert ranker.search("kafka")[0][0] == "java"
+
+
+def test_route_ranks_only_the_callers_cvs(db_session_factory, monkeypatch):
+    monkeypatch.setattr(ranking, "cv_ranker", build())
+    for clerk_user_id in ("ranking_caller", "ranking_other"):
+        ranking.clerk_service.invalidate_user(clerk_user_id)
+
+    async def scenario():
+        async with db_session_factory() as session:
+            session.add_all([
+                User(id=1, clerk_user_id="ranking_caller", email="caller@example.com"),
+                User(id=2, clerk_user_id="ranking_other", email="other@example.com"),
+                CVFile(user_id=1, filename="mine.pdf", content_hash="cpp"),
+                CVFile(user_id=1, filename="java.pdf", content_hash="java"),
+                # The best match for the query, but someone else's
+                CVFile(user_id=2, filename="theirs.pdf", content_hash="python"),
+            ])
+            await session.commit()
+            return await ranking.rank_cvs(
+                CVRankingRequest(job_description="python developer"), clerk_user_id="ranking_caller", session=session
+            )
+
+    response = asyncio.run(scenario())
+    assert [(candidate["cv_hash"], candidate["filename"]) for candidate in response["candidates"]] == [
+        ("cpp", "mine.pdf"), ("java", "java.pdf")
+    ]
+    assert {candidate["user_id"] for candidate in response["candidates"]} == {1}
+    assert response["corpus_size"] == 2
+
+
+def test_route_requires_a_known_caller(db_session_factory):
+    async def scenario():
+        async with db_session_factory() as session:
+            await ranking.rank_cvs(
+                CVRankingRequest(job_description="python"), clerk_user_id="ranking_unknown", session=session
+            )
+
+    with pytest.raises(HTTPException) as unknown:
+        asyncio.run(scenario())
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(ranking.verify_clerk_token(None))
+    assert unknown.value.status_code == 404 and missing.value.status_code == 401
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from database.model import CVContent
+from services.embeddings import EmbeddingIndex, HashedNgramEmbedder
+
+PYTHON_CV = "Senior Python developer, FastAPI and PostgreSQL, built REST APIs"
+FRONTEND_CV = "Frontend engineer with React, TypeScript and CSS animations"
+DATA_CV = "Data analyst with Excel, Tableau dashboards and SQL reporting"
+
+
+def make_index(tmp_path, **kwargs):
+    return EmbeddingIndex(HashedNgramEmbedder(dim=256), path=str(tmp_path / "emb.f32"), **kwargs)
+
+
+def test_similar_texts_score_higher_and_variants_match():
+    embedder = HashedNgramEmbedder(dim=256)
+    query = embedder.embed("Python backend developer with PostgreSQL")
+    assert query @ embedder.embed(PYTHON_CV) > query @ embedder.embed(FRONTEND_CV)
+    assert embedder.match_terms(["postgres", "kubernetes"], ["postgresql", "react"]) == {"postgres": "postgresql"}
+
+
+def test_search_ranks_documents_and_survives_reopen(tmp_path):
+    index = make_index(tmp_path)
+    assert index.add_many([("py", PYTHON_CV), ("fe", FRONTEND_CV), ("data", DATA_CV)]) == 3
+    assert index.add("py", PYTHON_CV) is False
+    assert index.search("Python API developer", top_k=1)[0][0] == "py"
+
+    index.remove("py")
+    assert "py" not in [doc for doc, _ in index.search("Python API developer", top_k=3)]
+    assert index.vector("py") is None
+
+    reopened = make_index(tmp_path)
+    assert reopened.document_count == 3
+    assert np.allclose(reopened.vector("fe"), index.embedder.embed(FRONTEND_CV))
+
+
+def test_search_can_be_limited_to_given_documents(tmp_path):
+    index = make_index(tmp_path)
+    index.add_many([("py", PYTHON_CV), ("fe", FRONTEND_CV), ("data", DATA_CV)])
+    index.remove("data")
+
+    results = index.search("Python API developer", top_k=5, hashes=["fe", "data", "unknown"])
+    assert [doc for doc, _ in results] == ["fe"]
+    assert results[0][1] == pytest.approx(dict(index.search("Python API developer", top_k=3))["fe"])
+    assert index.search("Python API developer", hashes=[]) == []
+
+
+def test_matrix_without_ids_file_is_discarded(tmp_path):
+    index = make_index(tmp_path)
+    index.add_many([("py", PYTHON_CV), ("fe", FRONTEND_CV)])
+    (tmp_path / "emb.f32.ids").unlink()
+
+    reopened = make_index(tmp_path)
+    reopened.add("data", DATA_CV)
+    assert reopened.document_count == 1
+    assert np.allclose(reopened.vector("data"), reopened.embedder.embed(DATA_CV))
+
+
+def test_commit_hook_embeds_off_the_event_loop(tmp_path):
+    index = make_index(tmp_path)
+    batch = [
+        SimpleNamespace(cv_row=SimpleNamespace(content_hash=doc_hash), cv_text=text)
+        for doc_hash, text in (("py", PYTHON_CV), ("fe", FRONTEND_CV), ("py", PYTHON_CV))
+    ]
+
+    async def scenario():
+        await asyncio.gather(index.index_batch(batch[:2]), index.index_batch(batch[2:]))
+
+    asyncio.run(scenario())
+    assert index.document_count == 2
+    assert np.allclose(index.vector("fe"), index.embedder.embed(FRONTEND_CV))
+
+
+def test_startup_sync_embeds_missing_texts_and_masks_deleted_ones(tmp_path, db_session_factory):
+    index = make_index(tmp_path)
+    index.add("deleted", DATA_CV)
+
+    async def scenario():
+        async with db_session_factory() as session:
+            for doc_hash, text in (("py", PYTHON_CV), ("fe", FRONTEND_CV)):
+                session.add(CVContent(hash=doc_hash, content=text, char_count=len(text), ref_count=1))
+            await session.commit()
+        await index._sync(db_session_factory, batch_size=1)
+
+    asyncio.run(scenario())
+    assert index.ready and index.document_count == 2
+    assert index.vector("deleted") is None and index.vector("py") is not None
@@ -0,0 +1,56 @@
+import io
+import zipfile
+
+import pytest
+
+from services.file_validator import FileValidator
+
+PDF_HEAD = b"%PDF-1.4\n"
+DOC_HEAD = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+def zip_bytes(*names: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, "<w:document/>")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("content_type", [
+    "application/pdf",
+    "application/octet-stream",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    None,
+])
+def test_declared_mime_type_does_not_reject_an_allowed_extension(content_type):
+    assert FileValidator().is_valid_upload("cv.pdf", content_type)
+
+
+@pytest.mark.parametrize("filename", ["cv.exe", "cv", "", None])
+def test_disallowed_or_missing_extension_is_rejected(filename):
+    assert not FileValidator().is_valid_upload(filename, "application/pdf")
+
+
+def test_sniff_type_follows_the_signature():
+    validator = FileValidator()
+    assert validator.sniff_type(PDF_HEAD) == ".pdf"
+    assert validator.sniff_type(DOC_HEAD) == ".doc"
+    assert validator.sniff_type(b"PK\x03\x04rest") == ".docx"
+    assert validator.sniff_type(b"GIF89a..") is None
+
+
+def test_only_a_zip_listing_word_document_is_a_docx(tmp_path):
+    validator = FileValidator()
+    docx = tmp_path / "cv.docx"
+    docx.write_bytes(zip_bytes("[Content_Types].xml", "word/document.xml"))
+    plain = tmp_path / "plain.docx"
+    plain.write_bytes(zip_bytes("hello.txt"))
+    truncated = tmp_path / "truncated.docx"
+    truncated.write_bytes(zip_bytes("word/document.xml")[:-10])
+
+    assert validator.is_docx_archive(str(docx))
+    assert validator.is_docx_archive(io.BytesIO(docx.read_bytes()))
+    assert validator.sniff_file(str(docx)) == ".docx"
+    assert validator.sniff_file(str(plain)) is None
+    assert not validator.is_docx_archive(str(truncated))
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.clerk_service import ClerkService
+from services.http_client import HTTPClient
+
+
+def make_client(handler, **kwargs):
+    options = {"max_retries": 3, "backoff_base": 0.001, "transport": httpx.MockTransport(handler)}
+    options.update(kwargs)
+    return HTTPClient(**options)
+
+
+def test_retries_transient_statuses_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 3 else 200, json={"ok": True})
+
+    async def scenario():
+        client = make_client(handler)
+        response = await client.get("https://api.test/resource")
+        await client.stop()
+        return response, client
+
+    response, client = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_gives_up_after_max_retries_and_returns_last_response():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"Retry-After": "0"})
+
+    async def scenario():
+        client = make_client(handler, max_retries=2)
+        return await client.get("https://api.test/resource")
+
+    assert asyncio.run(scenario()).status_code == 429
+    assert len(calls) == 3
+
+
+def test_connection_errors_are_retried_and_finally_raised():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async def scenario():
+        client = make_client(handler, max_retries=1)
+        await client.get("https://api.test/resource")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_post_is_not_retried_unless_requested():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    async def scenario():
+        client = make_client(handler)
+        await client.post("https://api.test/resource", json={})
+        await client.post("https://api.test/resource", json={}, retry=True)
+
+    asyncio.run(scenario())
+    assert len(calls) == 1 + 4
+
+
+def test_concurrency_is_capped():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200)
+
+    async def scenario():
+        client = make_client(handler, max_concurrency=3)
+        await asyncio.gather(*(client.get("https://api.test/resource") for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert peak == 3
+
+
+def test_clerk_service_fetches_users_from_fake_clerk():
+    def fake_clerk(request):
+        assert request.headers["Authorization"] == "Bearer sk_test"
+        if request.url.path == "/v1/users/user_123":
+            return httpx.Response(200, json={"id": "user_123", "first_name": "Ada"})
+        return httpx.Response(404, json={"errors": [{"code": "resource_not_found"}]})
+
+    async def scenario():
+        service = ClerkService(http_client=make_client(fake_clerk))
+        service.secret_key = "sk_test"
+        return await service.fetch_user("user_123"), await service.fetch_user("missing")
+
+    found, missing = asyncio.run(scenario())
+    assert found["first_name"] == "Ada"
+    assert missing is None
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from services.auth_service import AuthService
+from services.revocation_store import (
+    MemoryRevocationBackend, RevocationBackend, RevocationStore, SQLiteRevocationBackend
+)
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        RevocationBackend()
+
+
+def test_store_opens_its_backend_lazily(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("REVOCATION_BACKEND", raising=False)
+    monkeypatch.delenv("REVOCATION_DB_PATH", raising=False)
+    store = RevocationStore()
+    assert store.backend is None and not (tmp_path / "revoked_tokens.db").exists()
+
+    asyncio.run(store.start())
+    assert isinstance(store.backend, SQLiteRevocationBackend)
+    assert (tmp_path / "revoked_tokens.db").exists()
+    store.close()
+
+
+def test_revocations_expire_with_their_token():
+    store = RevocationStore(MemoryRevocationBackend())
+    now = int(time.time())
+
+    async def scenario():
+        await store.revoke("live", now + 60)
+        await store.revoke("expired", now - 1)
+        return await store.is_revoked("live"), await store.is_revoked("expired"), await store.is_revoked("unknown")
+
+    assert asyncio.run(scenario()) == (True, False, False)
+    assert len(store) == 1
+
+
+def test_revocations_are_shared_through_the_sqlite_backend(tmp_path):
+    path = str(tmp_path / "revoked.db")
+    first = RevocationStore(SQLiteRevocationBackend(path), sync_interval=0)
+    second = RevocationStore(SQLiteRevocationBackend(path), sync_interval=0)
+
+    async def scenario():
+        await second.start()
+        await first.revoke("token-1", int(time.time()) + 60)
+        return await second.is_revoked("token-1")
+
+    assert asyncio.run(scenario()) is True
+    first.close()
+    second.close()
+
+
+def test_logged_out_token_no_longer_verifies(monkeypatch):
+    monkeypatch.setenv("REVOCATION_BACKEND", "memory")
+    auth_service = AuthService()
+    token = auth_service.create_access_token({"sub": "user@example.com"})
+
+    async def scenario():
+        before = await auth_service.verify_token(token)
+        revoked = await auth_service.invalidate_token(token)
+        return before, revoked, await auth_service.verify_token(token), await auth_service.refresh_token(token)
+
+    before, revoked, after, refreshed = asyncio.run(scenario())
+    assert before["sub"] == "user@example.com" and revoked
+    assert after is None and refreshed is None
+    auth_service.password_hasher.shutdown()
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from sqlmodel import select
+
+import routes.cv_analysis as cv_analysis
+from database.model import SectionFinding, User
+from fake_openai import FakeOpenAI
+from services.ai_analyzer import AIAnalyzer
+from services.cv_sections import split_sections
+from services.section_cache import SectionFindingCache
+from services.usage_tracker import AnalysisUsage
+
+CV_TEXT = """Jane Doe
+SUMMARY
+Backend developer with eight years of Python.
+EXPERIENCE
+Built payment APIs with FastAPI, cutting latency by 40%.
+SKILLS
+Python, FastAPI, PostgreSQL, Docker"""
+
+REVISED_CV_TEXT = CV_TEXT.replace("Docker", "Docker, Kubernetes")
+JD_TEXT = "Senior Python developer with FastAPI and Kubernetes"
+
+
+def make_analyzer(client):
+    analyzer = AIAnalyzer()
+    analyzer.openai_client = client
+    return analyzer
+
+
+def test_only_model_findings_are_returned_for_caching():
+    sections = split_sections(CV_TEXT)
+    analyzer = make_analyzer(FakeOpenAI(skip_sections={"s1"}))
+    usage = AnalysisUsage()
+
+    result, new_findings = asyncio.run(analyzer.analyze_sections(CV_TEXT, sections, JD_TEXT, {}, usage))
+    assert sections[1].hash not in new_findings
+    assert len(new_findings) == len(sections) - 1
+    assert usage.fallback is False
+    assert result["overall_score"] == 85 and "sections" not in result
+
+
+def test_failed_section_call_caches_nothing():
+    sections = split_sections(CV_TEXT)
+    usage = AnalysisUsage()
+
+    result, new_findings = asyncio.run(
+        make_analyzer(FakeOpenAI(fail=True)).analyze_sections(CV_TEXT, sections, JD_TEXT, {}, usage)
+    )
+    assert new_findings == {}
+    assert usage.fallback is True
+    assert result["summary"]
+
+
+def test_save_leaves_the_commit_to_the_caller(db_session_factory):
+    cache = SectionFindingCache()
+
+    async def scenario():
+        async with db_session_factory() as session:
+            session.add(User(id=1, clerk_user_id="user_1", email="user1@example.com"))
+            await session.commit()
+            await cache.save(session, 1, "jd", {"section": {"score": 70}})
+            await session.rollback()
+            rolled_back = await cache.load(session, 1, "jd", ["section"])
+            await cache.save(session, 1, "jd", {"section": {"score": 70}})
+            await session.commit()
+            return rolled_back, await cache.load(session, 1, "jd", ["section"])
+
+    rolled_back, saved = asyncio.run(scenario())
+    assert rolled_back == {}
+    assert saved == {"section": {"score": 70}}
+
+
+@pytest.fixture
+def pipeline(db_session_factory, monkeypatch):
+    """run_analysis against a temp database with a fake model and no write-behind"""
+    submitted = []
+
+    async def submit(cv_row, analysis_row, cv_text=None, jd_text=None, before_write=None):
+        before_write()
+        submitted.append(analysis_row)
+
+    async def seed_user():
+        async with db_session_factory() as session:
+            session.add(User(id=1, clerk_user_id="user_1", email="user1@example.com"))
+            await session.commit()
+
+    asyncio.run(seed_user())
+    monkeypatch.setattr(cv_analysis.write_buffer, "submit", submit)
+    monkeypatch.setattr(cv_analysis.section_cache, "enabled", True)
+
+    def analyze(client, cv_text):
+        monkeypatch.setattr(cv_analysis, "ai_analyzer", make_analyzer(client))
+
+        async def scenario():
+            async with db_session_factory() as session:
+                return await cv_analysis.run_analysis(
+                    session, cv_text, JD_TEXT, "1", AnalysisUsage(), "cv.pdf", 1000, "application/pdf", None
+                )
+        return asyncio.run(scenario())
+
+    async def stored_findings():
+        async with db_session_factory() as session:
+            return (await session.exec(select(SectionFinding))).all()
+
+    analyze.stored_findings = lambda: asyncio.run(stored_findings())
+    analyze.submitted = submitted
+    return analyze
+
+
+def test_first_upload_is_one_model_call_that_seeds_the_cache(pipeline):
+    client = FakeOpenAI()
+    result = pipeline(client, CV_TEXT)
+
+    assert result["overall_score"] == 85 and result["summary"] == "Strong match"
+    assert "incremental" not in result["metadata"]
+    assert len(client.prompts) == 1 and len(client.section_calls) == 1
+    assert len(pipeline.stored_findings()) == len(split_sections(CV_TEXT))
+    assert result["metadata"]["usage"]["prompt_tokens"] == 100
+    # The write stage is included in the stored row and the response
+    row = pipeline.submitted[-1]
+    assert row.db_write_ms is not None and "db_write" in result["metadata"]["usage"]["timings_ms"]
+    assert round(row.total_ms, 2) == result["metadata"]["usage"]["total_ms"]
+    assert row.analysis["metadata"]["usage"]["total_ms"] == result["metadata"]["usage"]["total_ms"]
+
+
+def test_revision_is_scored_by_the_model_from_all_findings(pipeline):
+    first = pipeline(FakeOpenAI(), CV_TEXT)
+
+    client = FakeOpenAI()
+    revised = pipeline(client, REVISED_CV_TEXT)
+    [prompt] = client.prompts
+    assert revised["metadata"]["incremental"]["changed"] == ["SKILLS"]
+    assert "Kubernetes" in prompt and "FastAPI, cutting" not in prompt
+    # Unchanged sections are re-scored from their cached findings
+    assert "[reviewed] EXPERIENCE" in prompt and '"summary": "s2 ok"' in prompt
+    assert revised["overall_score"] == first["overall_score"]
+    assert revised["keyword_match"] == first["keyword_match"]
+    assert revised["summary"] == first["summary"]
+
+
+def test_fallback_findings_never_poison_the_cache(pipeline):
+    failing = pipeline(FakeOpenAI(fail=True), CV_TEXT)
+    assert failing["metadata"]["usage"]["fallback"] is True
+    assert pipeline.submitted[-1].fallback is True
+    assert pipeline.stored_findings() == []
+
+    # Once the model answers again, the CV is analyzed in full and cached from the model
+    client = FakeOpenAI()
+    recovered = pipeline(client, CV_TEXT)
+    assert recovered["overall_score"] == 85 and len(client.prompts) == 1
+    assert all(finding.findings["summary"].endswith(" ok") for finding in pipeline.stored_findings())
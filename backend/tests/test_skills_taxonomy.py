@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from services.skills_taxonomy import SkillTaxonomy
+
+SKILLS = [
+    {"name": "Java", "category": "Languages"},
+    {"name": "JavaScript", "category": "Languages", "aliases": ["js", "es6"]},
+    {"name": "C", "category": "Languages", "case_sensitive": True},
+    {"name": "C++", "category": "Languages", "aliases": ["cpp"]},
+    {"name": "Go", "category": "Languages", "case_sensitive": True},
+    {"name": "React", "category": "Frontend", "aliases": ["react.js"]},
+    {"name": "Machine Learning", "category": "Data", "aliases": ["ml"]},
+    {"name": "Kubernetes", "aliases": ["k8s"]},
+]
+
+
+@pytest.fixture
+def taxonomy(tmp_path):
+    path = tmp_path / "skills.json"
+    path.write_text(json.dumps({"skills": SKILLS}))
+    return SkillTaxonomy(path=str(path), cache_size=2)
+
+
+def test_aliases_resolve_to_canonical_skills(taxonomy):
+    found = taxonomy.extract("Built   machine\nlearning services on K8S with ES6")
+    assert found == {"Machine Learning": "Data", "Kubernetes": "Other", "JavaScript": "Languages"}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("JavaScript and TypeScript", {"JavaScript"}),
+    ("Java, C++ and C", {"Java", "C++", "C"}),
+    ("React.js front end", {"React"}),
+    ("Objective-C only", set()),
+    ("Go and Rust", {"Go"}),
+    ("Happy to go the extra mile", set()),
+    ("plain c code", set()),
+])
+def test_matches_respect_token_boundaries_and_case(taxonomy, text, expected):
+    assert set(taxonomy.extract(text)) == expected
+
+
+def test_compare_splits_required_skills(taxonomy):
+    matched, missing, required = taxonomy.compare(
+        "Java and React developer", "Looking for Java, React and Kubernetes"
+    )
+    assert matched == ["Java", "React"]
+    assert missing == ["Kubernetes"]
+    assert set(required) == {"Java", "React", "Kubernetes"}
+
+
+def test_results_are_cached_per_document(taxonomy):
+    first = taxonomy.extract("Java developer")
+    assert taxonomy.extract("Java developer") is first
+    taxonomy.extract("Go developer")
+    taxonomy.extract("React developer")
+    # The oldest entry was evicted at cache_size=2
+    assert taxonomy.extract("Java developer") is not first
+
+
+def test_bundled_taxonomy_loads():
+    taxonomy = SkillTaxonomy()
+    assert len(taxonomy.categories) > 100
+    assert {"Python", "Kubernetes"} <= set(taxonomy.extract("Python services on k8s"))
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import tempfile
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import routes.cv_analysis as cv_analysis
+from services.upload_stream import UploadReceiver, UploadRejected
+
+BOUNDARY = b"abc"
+PDF = b"%PDF-1.4\n" + b"0" * 300
+
+
+def multipart(file_bytes: bytes, filename: str = "cv.pdf", content_type: str = "application/pdf", **fields):
+    parts = b""
+    for name, value in fields.items():
+        parts += b"--abc\r\nContent-Disposition: form-data; name=\"%s\"\r\n\r\n%s\r\n" % (name.encode(), value.encode())
+    parts += (
+        b"--abc\r\nContent-Disposition: form-data; name=\"cv_file\"; filename=\"%s\"\r\n"
+        b"Content-Type: %s\r\n\r\n" % (filename.encode(), content_type.encode())
+    )
+    return parts + file_bytes + b"\r\n--abc--\r\n"
+
+
+def streaming_request(body: bytes, chunk_size: int = 64):
+    """A Request whose body arrives in small chunks; counts what was read"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    state = {"read": 0}
+
+    async def receive():
+        chunk = chunks.pop(0)
+        state["read"] += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/analyze-cv",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)],
+    }
+    return Request(scope, receive), state
+
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+def test_upload_is_streamed_to_a_hashed_temp_file(temp_dir):
+    request, _ = streaming_request(multipart(PDF, job_description="Python developer"))
+
+    upload = asyncio.run(UploadReceiver().receive(request))
+    assert upload.detected_type == ".pdf"
+    assert upload.size == len(PDF)
+    assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+    assert upload.fields == {"job_description": "Python developer"}
+    with open(upload.path, "rb") as f:
+        assert f.read() == PDF
+
+    upload.cleanup()
+    assert not list(temp_dir.iterdir())
+
+
+def test_generic_declared_type_is_accepted_for_real_content(temp_dir):
+    request, _ = streaming_request(multipart(PDF, content_type="application/octet-stream", job_description="x"))
+
+    upload = asyncio.run(UploadReceiver().receive(request))
+    assert upload.detected_type == ".pdf"
+    assert upload.content_type == "application/octet-stream"
+    upload.cleanup()
+
+
+def test_unknown_content_is_rejected_after_its_first_bytes(temp_dir):
+    body = multipart(b"GIF89a.." + b"0" * 100_000)
+    request, state = streaming_request(body)
+
+    with pytest.raises(UploadRejected) as rejected:
+        asyncio.run(UploadReceiver().receive(request))
+    assert rejected.value.status_code == 400
+    assert state["read"] < 1024
+    assert not list(temp_dir.iterdir())
+
+
+def test_oversized_upload_is_rejected_at_the_limit(temp_dir):
+    receiver = UploadReceiver()
+    receiver.validator.max_file_size = 4096
+    request, state = streaming_request(multipart(b"%PDF-1.4\n" + b"0" * 100_000), chunk_size=1024)
+
+    with pytest.raises(UploadRejected) as rejected:
+        asyncio.run(receiver.receive(request))
+    assert rejected.value.status_code == 413
+    assert state["read"] < 8192
+    assert not list(temp_dir.iterdir())
+
+
+def test_disallowed_extension_is_rejected_before_the_body(temp_dir):
+    request, _ = streaming_request(multipart(b"MZ" * 200, filename="cv.exe", content_type="application/octet-stream"))
+
+    with pytest.raises(UploadRejected) as rejected:
+        asyncio.run(UploadReceiver().receive(request))
+    assert rejected.value.status_code == 400
+    assert not list(temp_dir.iterdir())
+
+
+def test_missing_job_description_does_not_leak_the_temp_file(temp_dir):
+    request, _ = streaming_request(multipart(PDF))
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(cv_analysis.analyze_cv(request, session=None))
+    assert rejected.value.status_code == 422
+    assert not list(temp_dir.iterdir())
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+import routes.ranking as ranking
+import routes.usage as usage_routes
+from database.model import AnalysisResult, CVContent, CVFile, RerankUsage, User
+from fake_openai import FakeOpenAI
+from models.ranking import CVRankingRequest
+from services.ai_analyzer import AIAnalyzer
+from services.cv_ranker import CVRanker
+from services.usage_tracker import AnalysisUsage
+
+DAY = datetime(2024, 3, 1, 12)
+CV_TEXT = "Python developer with FastAPI and PostgreSQL"
+
+
+def completion(prompt_tokens, completion_tokens, model="gpt-4o-mini-2024-07-18"):
+    return SimpleNamespace(
+        model=model, usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    )
+
+
+def test_columns_carry_tokens_cost_and_every_stage():
+    usage = AnalysisUsage()
+    usage.record_completion("gpt-4o-mini", completion(1_000_000, 500_000))
+    usage.add_timing("llm", 120.0)
+    usage.add_timing("llm", 30.0)
+    usage.finish()
+
+    columns = usage.to_columns()
+    assert columns["model"] == "gpt-4o-mini-2024-07-18"
+    assert columns["cost_usd"] == 0.45  # dated snapshot priced like its base model
+    assert columns["llm_ms"] == 150.0 and columns["extraction_ms"] is None
+    assert columns["total_ms"] is not None
+    assert set(usage.to_columns(RerankUsage)) == {
+        "model", "prompt_tokens", "completion_tokens", "cost_usd", "prompt_chars", "llm_ms", "parse_ms", "total_ms"
+    }
+
+
+@pytest.fixture
+def usage_db(db_session_factory):
+    async def seed():
+        async with db_session_factory() as session:
+            session.add_all([
+                User(id=1, clerk_user_id="usage_caller", email="caller@example.com"),
+                User(id=2, clerk_user_id="usage_other", email="other@example.com"),
+            ])
+            session.add_all([
+                AnalysisResult(user_id=1, created_at=DAY, model="gpt-4o-mini", prompt_tokens=100,
+                               completion_tokens=20, cost_usd=0.001, llm_ms=100.0, total_ms=200.0),
+                AnalysisResult(user_id=1, created_at=DAY, model="gpt-4o-mini", prompt_tokens=300,
+                               completion_tokens=40, cost_usd=0.002, llm_ms=300.0, total_ms=400.0, cache_hit=True),
+                AnalysisResult(user_id=2, created_at=DAY, model="gpt-4o-mini", prompt_tokens=999,
+                               completion_tokens=999, cost_usd=1.0, llm_ms=999.0, total_ms=999.0),
+                RerankUsage(user_id=1, created_at=DAY, model="gpt-4o-mini", candidates=5, prompt_tokens=50,
+                            completion_tokens=10, cost_usd=0.0005, llm_ms=900.0, total_ms=950.0),
+            ])
+            await session.commit()
+
+    asyncio.run(seed())
+    for clerk_user_id in ("usage_caller", "usage_other"):
+        usage_routes.clerk_service.invalidate_user(clerk_user_id)
+    return db_session_factory
+
+
+def summary(session_factory, clerk_user_id, group_by=("day", "model")):
+    async def scenario():
+        async with session_factory() as session:
+            return await usage_routes.get_usage_summary(
+                group_by=list(group_by), start=None, end=None, clerk_user_id=clerk_user_id, session=session
+            )
+    return asyncio.run(scenario())
+
+
+def test_summary_covers_only_the_caller_and_counts_reranks(usage_db):
+    result = summary(usage_db, "usage_caller")
+
+    assert result["user_id"] == 1
+    [group] = result["groups"]
+    assert group["day"] == "2024-03-01" and group["model"] == "gpt-4o-mini"
+    assert group["analyses"] == 2 and group["reranks"] == 1 and group["cache_hits"] == 1
+    assert group["prompt_tokens"] == 450 and group["total_tokens"] == 520
+    assert group["cost_usd"] == 0.0035
+    # Stage averages are over analyses only; re-ranking latency is reported on its own
+    assert group["avg_llm_ms"] == 200.0 and group["avg_total_ms"] == 300.0
+    assert group["avg_rerank_ms"] == 950.0
+
+
+def test_summary_rejects_unknown_groups_and_unknown_callers(usage_db):
+    with pytest.raises(HTTPException) as invalid:
+        summary(usage_db, "usage_caller", group_by=("week",))
+    with pytest.raises(HTTPException) as unknown:
+        summary(usage_db, "user_unknown")
+    assert invalid.value.status_code == 400
+    assert unknown.value.status_code == 404
+
+
+def test_summary_requires_a_token():
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(usage_routes.verify_clerk_token(None))
+    assert missing.value.status_code == 401
+
+
+def test_rerank_calls_are_recorded_for_the_caller(db_session_factory, monkeypatch):
+    ranker = CVRanker()
+    ranker.add_document("cvpython", CV_TEXT)
+    analyzer = AIAnalyzer()
+    analyzer.openai_client = FakeOpenAI()
+    monkeypatch.setattr(ranking, "cv_ranker", ranker)
+    monkeypatch.setattr(ranking, "ai_analyzer", analyzer)
+    ranking.clerk_service.invalidate_user("rerank_caller")
+
+    async def scenario():
+        async with db_session_factory() as session:
+            session.add(User(id=1, clerk_user_id="rerank_caller", email="rerank@example.com"))
+            session.add(CVContent(hash="cvpython", content=CV_TEXT))
+            session.add(CVFile(user_id=1, filename="cv.pdf", content_hash="cvpython"))
+            await session.commit()
+            response = await ranking.rank_cvs(
+                CVRankingRequest(job_description="Python developer", rerank=True),
+                clerk_user_id="rerank_caller", session=session
+            )
+            return response, (await session.exec(select(RerankUsage))).all()
+
+    response, [recorded] = asyncio.run(scenario())
+    assert response["reranked"] is True
+    assert recorded.user_id == 1 and recorded.candidates == 1
+    assert recorded.prompt_tokens == 100 and recorded.llm_ms is not None
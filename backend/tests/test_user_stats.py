@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from database.model import AnalysisResult, CVFile, User
+from services.user_stats import UserStatsService
+from services.write_behind import PendingAnalysis
+
+START = datetime(2024, 1, 1)
+
+
+def pending(user_id, score, minutes):
+    cv_row = CVFile(user_id=user_id, filename="cv.pdf", uploaded_at=START + timedelta(minutes=minutes))
+    analysis_row = AnalysisResult(
+        user_id=user_id, cv_id=cv_row.id, overall_score=score, created_at=START + timedelta(minutes=minutes)
+    )
+    return PendingAnalysis(cv_row, analysis_row)
+
+
+async def add_user(session_factory):
+    async with session_factory() as session:
+        session.add(User(id=1, clerk_user_id="user_1", email="user1@example.com"))
+        await session.commit()
+
+
+async def flush(session_factory, batch):
+    """What the write-behind flush does: insert the rows, then run the hook"""
+    async with session_factory() as session:
+        for item in batch:
+            session.add(item.cv_row)
+            session.add(item.analysis_row)
+        await session.flush()
+        await UserStatsService().record_batch(session, batch)
+        await session.commit()
+
+
+async def stats(session_factory):
+    async with session_factory() as session:
+        return UserStatsService.to_response(await UserStatsService().get_stats(session, 1))
+
+
+def test_first_batch_initializes_from_existing_rows_then_increments(db_session_factory):
+    async def scenario():
+        await add_user(db_session_factory)
+        # Analyses written before the counters existed
+        async with db_session_factory() as session:
+            for item in [pending(1, 60, 0), pending(1, None, 1)]:
+                session.add_all([item.cv_row, item.analysis_row])
+            await session.commit()
+        await flush(db_session_factory, [pending(1, 70, 2)])
+        await flush(db_session_factory, [pending(1, 90, 4), pending(1, 80, 3)])
+        await flush(db_session_factory, [pending(1, None, 5)])
+        return await stats(db_session_factory)
+
+    result = asyncio.run(scenario())
+    assert result["cv_uploads"] == 6
+    assert result["analyses_completed"] == 6
+    assert result["average_score"] == 75.0
+    assert result["last_score"] == 90 and result["score_trend"] == 10
+    assert result["last_analysis_at"] == START + timedelta(minutes=5)
+
+
+def test_stats_are_built_on_first_read(db_session_factory):
+    async def scenario():
+        await add_user(db_session_factory)
+        async with db_session_factory() as session:
+            for item in [pending(1, 50, 0), pending(1, 65, 1)]:
+                session.add_all([item.cv_row, item.analysis_row])
+            await session.commit()
+        return await stats(db_session_factory)
+
+    result = asyncio.run(scenario())
+    assert result["analyses_completed"] == 2
+    assert result["average_score"] == 57.5
+    assert result["score_trend"] == 15
+
+
+def test_anonymous_analyses_are_not_counted(db_session_factory):
+    async def scenario():
+        await add_user(db_session_factory)
+        await flush(db_session_factory, [pending(None, 99, 0)])
+        return await stats(db_session_factory)
+
+    result = asyncio.run(scenario())
+    assert result["analyses_completed"] == 0
+    assert result["average_score"] is None and result["score_trend"] is None
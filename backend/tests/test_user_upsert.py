@@ -0,0 +1,94 @@
+import asyncio
+
+from sqlmodel import select
+
+import services.clerk_service as clerk_module
+from database.model import User
+from services.clerk_service import ClerkService
+
+
+def clerk_user(clerk_user_id, first_name="Jane", email=None):
+    return {
+        "id": clerk_user_id,
+        "first_name": first_name,
+        "last_name": "Doe",
+        "primary_email_address_id": "email_2",
+        "email_addresses": [
+            {"id": "email_1", "email_address": "old@example.com"},
+            {"id": "email_2", "email_address": email or f"{clerk_user_id}@example.com"},
+        ],
+    }
+
+
+async def upsert(session_factory, users_data):
+    async with session_factory() as session:
+        written = await ClerkService().upsert_users(session, users_data)
+        await session.commit()
+        return written
+
+
+async def stored_users(session_factory):
+    async with session_factory() as session:
+        return {user.clerk_user_id: user for user in (await session.exec(select(User))).all()}
+
+
+def test_upsert_inserts_then_updates_in_place(db_session_factory):
+    async def scenario():
+        created = await upsert(db_session_factory, [clerk_user("user_a"), clerk_user("user_b")])
+        first = await stored_users(db_session_factory)
+        async with db_session_factory() as session:
+            await ClerkService().deactivate_users(session, ["user_b"])
+            await session.commit()
+        updated = await upsert(db_session_factory, [clerk_user("user_b", "Renamed")])
+        return created, first, updated, await stored_users(db_session_factory)
+
+    created, first, updated, rows = asyncio.run(scenario())
+    assert len(created) == 2 and len(rows) == 2
+    assert rows["user_a"].email == "user_a@example.com"  # the primary address
+    assert updated[0].first_name == "Renamed"
+    assert rows["user_b"].id == first["user_b"].id
+    assert rows["user_b"].created_at == first["user_b"].created_at
+    assert rows["user_b"].is_active is False  # an update does not undo a deletion
+
+
+def test_batch_keeps_the_last_snapshot_and_skips_users_without_email(db_session_factory):
+    no_email = {"id": "user_c", "email_addresses": []}
+
+    written = asyncio.run(upsert(db_session_factory, [
+        clerk_user("user_a", "First"), no_email, clerk_user("user_a", "Last"), {"first_name": "no id"},
+    ]))
+    rows = asyncio.run(stored_users(db_session_factory))
+    assert [user.first_name for user in written] == ["Last"]
+    assert set(rows) == {"user_a"}
+
+
+def test_large_batches_are_chunked(db_session_factory, monkeypatch):
+    monkeypatch.setattr(clerk_module, "UPSERT_CHUNK_SIZE", 3)
+
+    written = asyncio.run(upsert(db_session_factory, [clerk_user(f"user_{i}") for i in range(8)]))
+    assert len(written) == 8
+    assert len(asyncio.run(stored_users(db_session_factory))) == 8
+
+
+def test_concurrent_upserts_of_one_user_do_not_conflict(db_session_factory):
+    async def scenario():
+        return await asyncio.gather(*[
+            upsert(db_session_factory, [clerk_user("user_a", f"Name {i}")]) for i in range(5)
+        ])
+
+    results = asyncio.run(scenario())
+    rows = asyncio.run(stored_users(db_session_factory))
+    assert all(len(written) == 1 for written in results)
+    assert list(rows) == ["user_a"]
+    assert rows["user_a"].first_name in {f"Name {i}" for i in range(5)}
+
+
+def test_deactivate_unknown_users_is_a_no_op(db_session_factory):
+    async def scenario():
+        clerk_service = ClerkService()
+        async with db_session_factory() as session:
+            nothing = await clerk_service.deactivate_users(session, [])
+            missing = await clerk_service.deactivate_users(session, ["user_missing"])
+            return nothing, missing
+
+    assert asyncio.run(scenario()) == (0, 0)
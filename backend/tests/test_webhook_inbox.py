@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+
+from sqlmodel import select
+
+from database.model import User, WebhookEvent
+from services.clerk_service import ClerkService
+from services.ttl_cache import TTLCache
+from services.webhook_inbox import WebhookInbox
+
+
+def clerk_event(clerk_user_id, event_type="user.updated", timestamp=1000, first_name="Jane"):
+    return {
+        "type": event_type,
+        "timestamp": timestamp,
+        "data": {
+            "id": clerk_user_id,
+            "first_name": first_name,
+            "primary_email_address_id": "email_1",
+            "email_addresses": [{"id": "email_1", "email_address": f"{clerk_user_id}@example.com"}],
+        },
+    }
+
+
+def make_inbox(session_factory, **kwargs):
+    clerk_service = ClerkService()
+    # A cache of its own, as in a separate worker process
+    clerk_service.user_cache = TTLCache(max_entries=100, ttl=60)
+    return WebhookInbox(clerk_service, session_factory=session_factory, **kwargs)
+
+
+async def deliver(inbox, session_factory, deliveries):
+    async with session_factory() as session:
+        return [await inbox.receive(session, delivery_id, event) for delivery_id, event in deliveries]
+
+
+async def users(session_factory):
+    async with session_factory() as session:
+        return {user.clerk_user_id: user for user in (await session.exec(select(User))).all()}
+
+
+def test_batch_applies_each_users_latest_state_once(db_session_factory):
+    inbox = make_inbox(db_session_factory)
+
+    async def scenario():
+        stored = await deliver(inbox, db_session_factory, [
+            ("msg_1", clerk_event("user_a", "user.created", 1000, "First")),
+            ("msg_2", clerk_event("user_a", "user.updated", 2000, "Latest")),
+            ("msg_1", clerk_event("user_a", "user.created", 1000, "First")),
+            ("msg_3", clerk_event("user_b", "user.created", 1500)),
+            ("msg_4", clerk_event("user_b", "user.deleted", 2500)),
+        ])
+        return stored, await inbox.process_pending(), await users(db_session_factory)
+
+    stored, processed, rows = asyncio.run(scenario())
+    assert stored == [True, True, False, True, True]
+    assert processed == 4 and inbox.duplicates == 1
+    assert rows["user_a"].first_name == "Latest"
+    assert "user_b" not in rows  # deleted before it was ever written
+
+
+def test_older_event_is_stale_but_parked_events_are_not_applied_state(db_session_factory):
+    inbox = make_inbox(db_session_factory)
+
+    async def scenario():
+        await deliver(inbox, db_session_factory, [("msg_1", clerk_event("user_a", timestamp=2000, first_name="Applied"))])
+        await inbox.process_pending()
+        async with db_session_factory() as session:
+            session.add(WebhookEvent(
+                delivery_id="msg_parked", event_type="user.updated", clerk_user_id="user_a",
+                event_timestamp=5000, payload=clerk_event("user_a", timestamp=5000),
+                processed_at=datetime.utcnow(), attempts=5, error="boom",
+            ))
+            await session.commit()
+        await deliver(inbox, db_session_factory, [
+            ("msg_2", clerk_event("user_a", timestamp=1000, first_name="Stale")),
+        ])
+        await inbox.process_pending()
+        stale_name = (await users(db_session_factory))["user_a"].first_name
+        await deliver(inbox, db_session_factory, [
+            ("msg_3", clerk_event("user_a", timestamp=3000, first_name="Newer")),
+        ])
+        await inbox.process_pending()
+        return stale_name, (await users(db_session_factory))["user_a"].first_name
+
+    assert asyncio.run(scenario()) == ("Applied", "Newer")
+    assert inbox.stale == 1
+
+
+def test_only_the_lease_holder_consumes(db_session_factory):
+    first = make_inbox(db_session_factory, lease_seconds=60)
+    second = make_inbox(db_session_factory, lease_seconds=60)
+
+    async def scenario():
+        await deliver(first, db_session_factory, [("msg_1", clerk_event("user_a"))])
+        taken = await first.process_pending()
+        await deliver(second, db_session_factory, [("msg_2", clerk_event("user_b"))])
+        blocked = await second.process_pending()
+        return taken, blocked, await first.process_pending()
+
+    assert asyncio.run(scenario()) == (1, 0, 1)
+
+
+def test_expired_lease_is_taken_over(db_session_factory):
+    first = make_inbox(db_session_factory, lease_seconds=0.01)
+    second = make_inbox(db_session_factory, lease_seconds=0.01)
+
+    async def scenario():
+        await first.process_pending()
+        await deliver(second, db_session_factory, [("msg_1", clerk_event("user_a"))])
+        await asyncio.sleep(0.05)
+        return await second.process_pending(), await first.process_pending()
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_other_workers_drop_applied_users_from_their_cache(db_session_factory):
+    consumer = make_inbox(db_session_factory)
+    follower = make_inbox(db_session_factory)
+    follower.clerk_service.user_cache.set("user_a", {"first_name": "Cached"})
+
+    async def scenario():
+        await deliver(consumer, db_session_factory, [("msg_1", clerk_event("user_a"))])
+        await consumer.process_pending()
+        await follower.invalidate_processed()
+
+    asyncio.run(scenario())
+    assert follower.clerk_service.user_cache.get("user_a") is None
+
+
+def test_failing_user_is_parked_without_blocking_others(db_session_factory):
+    inbox = make_inbox(db_session_factory, max_attempts=1)
+    upsert_users = inbox.clerk_service.upsert_users
+
+    async def failing_upsert(session, users_data):
+        if any(user.get("id") == "user_bad" for user in users_data):
+            raise ValueError("cannot store user_bad")
+        return await upsert_users(session, users_data)
+
+    inbox.clerk_service.upsert_users = failing_upsert
+
+    async def scenario():
+        await deliver(inbox, db_session_factory, [
+            ("msg_1", clerk_event("user_bad")),
+            ("msg_2", clerk_event("user_ok")),
+        ])
+        await inbox.process_pending()
+        async with db_session_factory() as session:
+            parked = await session.get(WebhookEvent, "msg_1")
+        return parked, await users(db_session_factory), await inbox.process_pending()
+
+    parked, rows, remaining = asyncio.run(scenario())
+    assert "user_ok" in rows and "user_bad" not in rows
+    assert parked.processed_at is not None and "cannot store user_bad" in parked.error
+    assert remaining == 0 and inbox.failed == 1
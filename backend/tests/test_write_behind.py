@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import event, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.model import AnalysisResult, CVFile, User
+from services.write_behind import AnalysisWriteBuffer, PendingAnalysis
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'analyses.db'}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def enable_foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with async_sessionmaker(engine, class_=AsyncSession)() as session:
+            session.add(User(id=1, clerk_user_id="user_1", email="user1@example.com"))
+            await session.commit()
+
+    asyncio.run(create_tables())
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def make_buffer(session_factory, tmp_path, **kwargs):
+    buffer = AnalysisWriteBuffer(
+        session_factory=session_factory,
+        spill_path=str(tmp_path / "spill.jsonl"),
+        parked_path=str(tmp_path / "parked.jsonl"),
+        **kwargs
+    )
+    buffer.max_retries = 1
+    return buffer
+
+
+def make_rows(user_id, filename="cv.pdf"):
+    cv_row = CVFile(user_id=user_id, filename=filename)
+    return cv_row, AnalysisResult(user_id=user_id, cv_id=cv_row.id, overall_score=70)
+
+
+async def count_rows(session_factory):
+    async with session_factory() as session:
+        return (await session.exec(select(func.count()).select_from(AnalysisResult))).one()
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_queued_rows_are_written_in_batches(session_factory, tmp_path):
+    buffer = make_buffer(session_factory, tmp_path, max_batch_size=10)
+
+    async def scenario():
+        await buffer.start()
+        for _ in range(25):
+            await buffer.submit(*make_rows(1))
+        await buffer.stop()
+        return await count_rows(session_factory)
+
+    assert asyncio.run(scenario()) == 25
+    assert buffer.rows_written == 25 and buffer.batches_written >= 3
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_rejected_row_is_parked_without_failing_its_batch(session_factory, tmp_path):
+    buffer = make_buffer(session_factory, tmp_path)
+
+    async def scenario():
+        await buffer.start()
+        for user_id in (1, 999, 1):  # user 999 breaks the foreign key
+            await buffer.submit(*make_rows(user_id))
+        await buffer.stop()
+        return await count_rows(session_factory)
+
+    assert asyncio.run(scenario()) == 2
+    parked = read_jsonl(tmp_path / "parked.jsonl")
+    assert len(parked) == 1 and parked[0]["cv_row"]["user_id"] == 999
+    assert "FOREIGN KEY" in parked[0]["error"]
+    assert buffer.parked_rows == 1 and buffer.spilled_rows == 0
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_transient_failures_are_spilled_and_replayed(session_factory, tmp_path):
+    buffer = make_buffer(session_factory, tmp_path)
+
+    async def flaky_storage(session, batch):
+        if any(item.cv_row.filename == "flaky.pdf" for item in batch):
+            raise ConnectionError("storage unavailable")
+
+    buffer.add_flush_hook(flaky_storage, before_insert=True)
+
+    async def first_run():
+        await buffer.start()
+        await buffer.submit(*make_rows(1))
+        await buffer.submit(*make_rows(1, "flaky.pdf"))
+        await buffer.stop()
+        return await count_rows(session_factory)
+
+    assert asyncio.run(first_run()) == 1
+    spilled = read_jsonl(tmp_path / "spill.jsonl")
+    assert len(spilled) == 1 and spilled[0]["error"] == "storage unavailable"
+
+    async def restart():
+        replaying = make_buffer(session_factory, tmp_path)
+        await replaying.start()
+        await replaying.stop()
+        return await count_rows(session_factory)
+
+    assert asyncio.run(restart()) == 2
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_commit_hooks_run_after_commit_and_only_for_written_rows(session_factory, tmp_path):
+    buffer = make_buffer(session_factory, tmp_path)
+    seen = []
+
+    async def record(batch):
+        # The transaction is over: the rows are visible to another session
+        seen.append((len(batch), await count_rows(session_factory)))
+
+    async def broken(batch):
+        raise RuntimeError("index unavailable")
+
+    buffer.add_commit_hook(broken)
+    buffer.add_commit_hook(record)
+
+    async def scenario():
+        await buffer.submit(*make_rows(1))
+        with pytest.raises(Exception):
+            await buffer.submit(*make_rows(999))
+        return await count_rows(session_factory)
+
+    assert asyncio.run(scenario()) == 1
+    assert seen == [(1, 1)]
+
+
+def test_before_write_sets_fields_before_the_rows_are_serialized(session_factory, tmp_path):
+    buffer = make_buffer(session_factory, tmp_path)
+    calls = []
+
+    def stamp(analysis_row):
+        def before_write():
+            calls.append(analysis_row.id)
+            analysis_row.db_write_ms = 12.5
+        return before_write
+
+    async def scenario():
+        written_through = make_rows(1)
+        await buffer.submit(*written_through, before_write=stamp(written_through[1]))
+        await buffer.start()
+        queued = make_rows(1)
+        await buffer.submit(*queued, before_write=stamp(queued[1]))
+        assert calls == [written_through[1].id, queued[1].id]  # ran once queued, not at flush
+        await buffer.stop()
+        async with session_factory() as session:
+            return (await session.exec(select(AnalysisResult.db_write_ms))).all()
+
+    assert asyncio.run(scenario()) == [12.5, 12.5]
+    assert len(calls) == 2
+
+
+def test_interrupted_replay_is_restored_without_duplicates(session_factory, tmp_path):
+    buffer = make_buffer(session_factory, tmp_path)
+    written, unwritten, spilled = make_rows(1), make_rows(1), make_rows(1)
+
+    async def scenario():
+        # A crash mid-replay: the first row of the replay file was already written
+        await buffer.submit(*written)
+        with open(tmp_path / "spill.jsonl.replaying", "w") as replay:
+            for rows in (written, unwritten):
+                replay.write(json.dumps(PendingAnalysis(*rows).to_dict(), default=str) + "\n")
+        with open(tmp_path / "spill.jsonl", "w") as spill:
+            spill.write(json.dumps(PendingAnalysis(*spilled).to_dict("storage unavailable"), default=str) + "\n")
+
+        await buffer.start()
+        await buffer.stop()
+        async with session_factory() as session:
+            return set((await session.exec(select(AnalysisResult.id))).all())
+
+    assert asyncio.run(scenario()) == {written[1].id, unwritten[1].id, spilled[1].id}
+    assert buffer.parked_rows == 0
+    assert not (tmp_path / "spill.jsonl").exists() and not (tmp_path / "spill.jsonl.replaying").exists()